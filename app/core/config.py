@@ -1,3 +1,4 @@
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings
 from typing import Optional
 
@@ -14,6 +15,20 @@ DEFAULT_FRONTEND_ORIGINS = [
 ]
 
 
+class ISPNodeConfig(BaseModel):
+    """Узел ISPmanager в isp_nodes (в .env — JSON-список)."""
+
+    name: str
+    base_url: str
+    token: str | None = None
+    admin_login: str | None = None
+    admin_password: str | None = None
+    weight: float = 1.0  # доля новых аккаунтов относительно других узлов
+    max_accounts: int = 0  # 0 — без ограничения
+    disk_capacity_gb: float = 0  # 0 — занятость диска при размещении не учитывается
+    accepts_new: bool = True  # False — узел обслуживает существующие аккаунты, новые не получает
+
+
 class Settings(BaseSettings):
     # Database settings
     db_host: str = "localhost"
@@ -44,12 +59,143 @@ class Settings(BaseSettings):
     frontend_allow_all_origins: bool = True
     isp_enable_sync: bool = True
     isp_verify_ssl: bool = True
+    isp_max_concurrency: int = 8
+    isp_batch_size: int = 50
+    isp_reconcile_interval: int = 0  # секунды, 0 — сверка выключена
+    isp_reconcile_page_size: int = 500
+    isp_global_concurrency: int = 16  # лимит параллельных вызовов одного узла панели на воркер
+    isp_tenant_queue_limit: int = 100  # вызовов в очереди одного пользователя
+    isp_tenant_weights: dict[str, int] = {}  # id пользователя -> вес в round-robin (по умолчанию 1)
+    # Несколько узлов панели; пусто — единственный узел из isp_api_base_url и isp_admin_*
+    isp_nodes: list[ISPNodeConfig] = []
+    isp_default_node: str = "default"  # узел пользователей без сохранённого isp_node
+    isp_placement: str = "least_loaded"  # least_loaded | weighted
+    isp_node_stats_ttl: int = 300  # период фонового обновления занятости диска узлов, секунды
+
+    # Resource usage collector settings
+    usage_collect_interval: int = 0  # секунды между замерами одного аккаунта, 0 — сбор выключен
+    usage_collect_concurrency: int = 4  # одновременных опросов панели
+    usage_collect_batch_size: int = 200  # замеров в одной вставке
+    usage_retention_samples_days: int = 2
+    usage_retention_hourly_days: int = 35  # не меньше 7 дней: из часов строится диапазон 7d
+    usage_retention_daily_days: int = 400
+    # Local disk usage of home directories (нужен доступ к ftp_root_path)
+    usage_disk_scan_interval: int = 0  # секунды между проверками изменений, 0 — подсчёт выключен
+    usage_disk_full_scan_interval: int = 86400  # полный пересчёт аккаунта: учитывает дозапись в файлы
+    usage_disk_scan_workers: int = 8  # потоков обхода каталогов
+    hosting_disk_quota_mb: int = 0  # квота на домашний каталог, 0 — без ограничения
+
+    # Site deploy settings
+    deploy_upload_dir: str = "/var/tmp/hosting-deploys"  # принятые части архивов
+    deploy_max_archive_mb: int = 1024
+    deploy_max_extracted_mb: int = 4096
+    deploy_max_files: int = 200_000
+    deploy_workers: int = 2  # процессов распаковки на воркер
+    deploy_sweep_interval: int = 600  # поиск брошенных загрузок, секунды; 0 — отключён
+    deploy_upload_stale_hours: int = 24  # загрузка без новых частей дольше этого считается брошенной
+    deploy_extract_stale_minutes: int = 60  # распаковка дольше этого считается прерванной
+
+    # Site logs settings
+    site_logs_dir: str = "logs"  # каталог логов сайтов относительно home_directory
+    site_logs_max_lines: int = 1000  # строк в одном ответе
+    site_logs_scan_mb: int = 64  # просматривается за один запрос; дальше — по курсору
+    site_logs_workers: int = 2  # процессов поиска на воркер
+    site_logs_follow_seconds: int = 300  # длительность SSE-потока, затем переподключение с Last-Event-ID
+    site_logs_poll_interval: float = 1.0
+
+    # DNS zone import settings
+    dns_import_max_records: int = 10_000
+
+    # Export settings
+    export_batch_size: int = 1000
+
+    # POST /batch settings
+    batch_max_items: int = 50
+    batch_max_concurrency: int = 8
+    batch_max_response_bytes: int = 1024 * 1024  # тело ответа одного подзапроса
+
+    # Logging settings
+    log_async: bool = True  # запись в файлы из отдельного потока через очередь
+    log_queue_size: int = 10_000
+    log_sample_per_second: int = 50  # лимит DEBUG/INFO на шаблон сообщения, 0 — без сэмплирования
+
+    # Server settings (run.py)
+    server_host: str = "0.0.0.0"
+    server_port: int = 8009
+    server_workers: int = 0  # 0 — по числу доступных ядер
+    server_backlog: int = 2048
+    server_keepalive: int = 5
+    server_graceful_timeout: int = 30  # ожидание текущих запросов при остановке, секунды
+    server_drain_delay: float = 5.0  # /health/ready отвечает draining, пока сокет ещё принимает, секунды
+    server_worker_start_timeout: int = 60  # ожидание startup нового воркера при SIGHUP
+    server_forwarded_allow_ips: str = "127.0.0.1"
+
+    # Startup warm-up and readiness settings
+    warmup_db_connections: int = 5  # соединений пула, открываемых при старте (не больше размера пула)
+    warmup_isp: bool = True  # открыть соединение к панели при старте
+    readiness_interval: float = 5.0  # период фоновых проверок /health/ready, секунды
+    readiness_timeout: float = 2.0
+    readiness_isp_critical: bool = False  # недоступная панель снимает воркер с балансировки
+
+    # Metrics settings
+    metrics_multiproc_dir: str | None = None  # каталог mmap-файлов prometheus_client для нескольких воркеров
+
+    # Event loop monitor settings
+    loop_monitor_enabled: bool = True
+    loop_monitor_interval: float = 0.1
+    loop_block_threshold: float = 0.5  # секунды без пробуждения цикла, после которых снимается стек
+
+    # Admission control settings
+    admission_enabled: bool = True
+    # stream — SSE логов, потоковые выгрузки и загрузки частями: держат слот минутами
+    admission_max_in_flight: dict[str, int] = {"auth": 64, "read": 256, "provisioning": 32, "stream": 32}
+    admission_lag_threshold: float = 0.25  # lag event loop, с которого отбрасывается provisioning
+    admission_pool_wait_threshold: float = 0.5  # среднее ожидание соединения из пула, секунды
+    admission_retry_after: int = 5
+
+    # Request deadline settings
+    request_timeouts: dict[str, float] = {
+        "health": 5.0,
+        "read": 10.0,
+        "auth": 10.0,
+        "provisioning": 60.0,
+        "upload": 3600.0,  # приём тела: части архива сайта, импорт зоны
+    }
+    request_timeout_max: float = 120.0  # верхняя граница для заголовка X-Request-Timeout
+
+    # Tracing settings
+    tracing_sample_rate: float = 0.01  # доля запросов со спанами; traceparent с флагом sampled пишется всегда
+    tracing_exporters: list[str] = ["ring", "jsonl"]
+    tracing_ring_size: int = 200
+    tracing_jsonl_path: str = "logs/traces/traces_%Y-%m-%d.jsonl"
+
+    # Profiling settings
+    profiling_dir: str = "logs/profiles"
+    profiler_interval: float = 0.005  # период сэмплирования стека, секунды
+    profiler_max_seconds: int = 300
+
+    # Administration
+    admin_emails: list[str] = []  # пользователи с доступом к /admin/*
+
+    # Idempotency-Key settings
+    idempotency_paths: list[str] = ["/auth/register", "/domains", "/hosting/sites"]
+    idempotency_ttl: int = 86400  # секунды хранения ответа
+    idempotency_lock_timeout: int = 60  # через сколько зависший in_progress можно перехватить
+    idempotency_wait_timeout: float = 30.0
+    idempotency_poll_interval: float = 0.1
+    idempotency_cache_size: int = 1024
     
     # RabbitMQ settings (optional)
     rabbitmq_host: str | None = None
     rabbitmq_port: int = 5672
     rabbitmq_user: str | None = None
     rabbitmq_password: str | None = None
+    rabbitmq_exchange: str = "hosting.events"
+    outbox_batch_size: int = 200
+    outbox_poll_interval: float = 1.0
+    outbox_max_attempts: int = 20  # после стольких неудачных публикаций событие уходит в dead-letter
+    outbox_retention_hours: int = 72  # опубликованные события удаляются через столько часов
+    outbox_failed_retention_days: int = 30  # dead-letter события хранятся для разбора столько дней
     
     @property
     def database_url(self) -> str:
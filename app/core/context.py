@@ -0,0 +1,15 @@
+"""Контекстные переменные, общие для обработки одного HTTP-запроса."""
+
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Заполняются обработчиком POST /batch: пользователь аутентифицирован один раз,
+# а сессия (если запрошена) общая для всех подзапросов пакета.
+batch_user: ContextVar[Optional[Any]] = ContextVar("batch_user", default=None)
+batch_session: ContextVar[Optional[AsyncSession]] = ContextVar("batch_session", default=None)
+
+# Id пользователя текущего запроса — ключ очереди в планировщике вызовов ISPmanager.
+# Выставляется зависимостями аутентификации; None — фоновые задачи и регистрация.
+current_tenant: ContextVar[Optional[int]] = ContextVar("current_tenant", default=None)
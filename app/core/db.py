@@ -1,29 +1,242 @@
+import asyncio
 import logging
+import math
+import re
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Any, AsyncIterator, Iterable, Sequence
 
-from sqlalchemy import text
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 
+from app.core import deadline, tracing
 from app.core.config import settings
+from app.core.context import batch_session
+from app.core.metrics import (
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_OPEN,
+    DB_POOL_SIZE,
+    DB_POOL_WAIT,
+    DB_QUERY_DURATION,
+)
 
 
 logger = logging.getLogger("app.core.db")
 
 
+class PoolWaitStats:
+    """Ожидание соединения из пула: текущие ожидающие и затухающее среднее."""
+
+    DECAY_SECONDS = 5.0
+
+    def __init__(self) -> None:
+        self.waiters = 0
+        self._average = 0.0
+        self._updated = time.monotonic()
+
+    def _decayed(self, now: float) -> float:
+        return self._average * math.exp(-(now - self._updated) / self.DECAY_SECONDS)
+
+    def record(self, wait: float) -> None:
+        now = time.monotonic()
+        self._average = self._decayed(now) * 0.8 + wait * 0.2
+        self._updated = now
+
+    def average(self) -> float:
+        """Среднее время ожидания; без новых выдач соединений плавно падает к нулю."""
+
+        return self._decayed(time.monotonic())
+
+
+pool_wait = PoolWaitStats()
+
+
+class TimedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """Пул, который меряет ожидание выдачи соединения (включая открытие нового)."""
+
+    def _do_get(self):
+        pool_wait.waiters += 1
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait.waiters -= 1
+            waited = time.perf_counter() - started
+            pool_wait.record(waited)
+            DB_POOL_WAIT.observe(waited)
+
+
 # Создание асинхронного движка БД
-engine = create_async_engine(settings.database_url, echo=settings.database_echo)
+engine = create_async_engine(
+    settings.database_url,
+    echo=settings.database_echo,
+    poolclass=TimedAsyncAdaptedQueuePool,
+)
+
+# Соединения под advisory lock держатся весь цикл фоновой задачи, поэтому
+# открываются вне пула и не отнимают его слоты у запросов
+_lock_engine = create_async_engine(settings.database_url, poolclass=NullPool)
 
 # Создание асинхронного сеанса
 async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
+_QUERY_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+
+def _statement_operation(statement: str) -> str:
+    head = statement[:32].split(None, 1)
+    keyword = head[0].upper() if head else ""
+    return keyword if keyword in _QUERY_OPERATIONS else "OTHER"
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    query_span = tracing.start_span("db.query", statement=statement[:200])
+    conn.info.setdefault("query_started", []).append((time.perf_counter(), query_span))
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started, query_span = conn.info["query_started"].pop()
+    DB_QUERY_DURATION.labels(_statement_operation(statement)).observe(time.perf_counter() - started)
+    tracing.finish_span(query_span)
+
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        _, query_span = connection.info["query_started"].pop()
+        tracing.finish_span(query_span, exception_context.original_exception)
+
+
+# flush и commit сессии — отдельные спаны: в них видно, сколько заняли
+# INSERT/UPDATE при flush и сам COMMIT
+@event.listens_for(Session, "before_flush")
+def _before_flush(session, flush_context, instances):
+    session.info["flush_span"] = tracing.start_span("db.flush")
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _after_flush(session, flush_context):
+    tracing.finish_span(session.info.pop("flush_span", None))
+
+
+@event.listens_for(Session, "after_begin")
+def _apply_request_deadline(session, transaction, connection):
+    # SET LOCAL действует до конца транзакции, поэтому выставляется при каждом BEGIN
+    budget_ms = deadline.remaining_ms()
+    if budget_ms is not None:
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {budget_ms}")
+
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session):
+    session.info["commit_span"] = tracing.start_span("db.commit")
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    tracing.finish_span(session.info.pop("commit_span", None))
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    for key in ("flush_span", "commit_span"):
+        tracing.finish_span(session.info.pop(key, None), RuntimeError("rolled back"))
+
+
+@event.listens_for(engine.sync_engine.pool, "connect")
+def _pool_connect(dbapi_connection, connection_record):
+    DB_POOL_OPEN.inc()
+
+
+@event.listens_for(engine.sync_engine.pool, "close")
+def _pool_close(dbapi_connection, connection_record):
+    DB_POOL_OPEN.dec()
+
+
+@event.listens_for(engine.sync_engine.pool, "checkout")
+def _pool_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_CHECKED_OUT.inc()
+
+
+@event.listens_for(engine.sync_engine.pool, "checkin")
+def _pool_checkin(dbapi_connection, connection_record):
+    DB_POOL_CHECKED_OUT.dec()
+
+
+if hasattr(engine.pool, "size"):
+    DB_POOL_SIZE.set(engine.pool.size())
+
+
 class Base(DeclarativeBase):
     pass
 
 
+async def ping() -> None:
+    """Проверка готовности: соединение из пула отвечает на запрос."""
+
+    async with engine.connect() as connection:
+        await connection.exec_driver_sql("SELECT 1")
+
+
+async def warm_up_pool(connections: int, statements: Sequence[Any] = ()) -> int:
+    """Открыть соединения пула заранее и подготовить на каждом частые запросы.
+
+    Соединения держатся одновременно, иначе пул выдал бы одно и то же.
+    Запросы выполняются с заведомо пустым результатом: это заполняет кэш
+    компиляции SQLAlchemy и кэш prepared statements asyncpg соединения.
+    """
+
+    if hasattr(engine.pool, "size"):
+        connections = min(connections, engine.pool.size())
+    if connections <= 0:
+        return 0
+    opened = asyncio.Barrier(connections)
+
+    async def warm_connection() -> None:
+        async with engine.connect() as connection:
+            await opened.wait()
+            for statement in statements:
+                await connection.execute(statement)
+            await connection.rollback()
+
+    await asyncio.gather(*(warm_connection() for _ in range(connections)))
+    return connections
+
+
+@asynccontextmanager
+async def try_advisory_lock(key: int) -> AsyncIterator[bool]:
+    """Взять pg_advisory_lock без ожидания; False — им владеет другой процесс.
+
+    Блокировка держится на отдельном соединении вне пула (закрывается на
+    выходе) в autocommit, чтобы долгая работа под ней не занимала слот пула
+    и не оставляла соединение idle in transaction.
+    """
+
+    async with _lock_engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        locked = bool(await connection.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": key}))
+        try:
+            yield locked
+        finally:
+            if locked:
+                await connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+
+
 async def get_db():
     """Dependency для получения сессии БД"""
+    shared_session = batch_session.get()
+    if shared_session is not None:
+        # Сессией владеет POST /batch, закрывать её здесь нельзя
+        yield shared_session
+        return
+
     async with async_session_maker() as session:
         try:
             yield session
@@ -31,6 +244,73 @@ async def get_db():
             await session.close()
 
 
+async def copy_records(
+    session: AsyncSession,
+    table: str,
+    columns: Sequence[str],
+    records: Iterable[tuple[Any, ...]],
+) -> int:
+    """Bulk insert rows with COPY inside the session's current transaction."""
+
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    driver_connection = raw_connection.driver_connection
+
+    status = await driver_connection.copy_records_to_table(
+        table,
+        records=records,
+        columns=list(columns),
+    )
+    # asyncpg returns the command tag, e.g. "COPY 2000"
+    return int(status.rsplit(" ", 1)[-1]) if status else 0
+
+
+_DOLLAR_QUOTE_RE = re.compile(r"\$[A-Za-z_]*\$")
+
+
+def split_sql_statements(sql: str) -> list[str]:
+    """Split a migration on top-level semicolons.
+
+    Semicolons inside quotes, comments and dollar-quoted bodies (plpgsql
+    functions) do not end a statement.
+    """
+
+    statements: list[str] = []
+    start = 0
+    index = 0
+    length = len(sql)
+
+    while index < length:
+        char = sql[index]
+        if char in ("'", '"'):
+            index = sql.find(char, index + 1)
+            while index != -1 and sql[index + 1 : index + 2] == char:
+                index = sql.find(char, index + 2)
+            index = length if index == -1 else index + 1
+        elif sql.startswith("--", index):
+            newline = sql.find("\n", index)
+            index = length if newline == -1 else newline + 1
+        elif sql.startswith("/*", index):
+            end = sql.find("*/", index + 2)
+            index = length if end == -1 else end + 2
+        elif char == "$" and (match := _DOLLAR_QUOTE_RE.match(sql, index)):
+            end = sql.find(match.group(), match.end())
+            index = length if end == -1 else end + len(match.group())
+        elif char == ";":
+            statements.append(sql[start:index])
+            index += 1
+            start = index
+        else:
+            index += 1
+
+    statements.append(sql[start:])
+    return [statement.strip() for statement in statements if statement.strip()]
+
+
+# pg_advisory_xact_lock key serializing migrations across workers
+MIGRATIONS_LOCK_KEY = 0x6D696772
+
+
 async def run_migrations() -> None:
     """Apply raw SQL migrations located in app/migrations/sql."""
 
@@ -41,6 +321,9 @@ async def run_migrations() -> None:
         return
 
     async with engine.begin() as conn:
+        # Pre-fork workers start together: the others wait here and then see
+        # the versions applied by the first one
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATIONS_LOCK_KEY})
         await conn.exec_driver_sql(
             """
             CREATE TABLE IF NOT EXISTS schema_migrations (
@@ -61,7 +344,7 @@ async def run_migrations() -> None:
                 continue
 
             sql = migration_file.read_text(encoding="utf-8")
-            statements = [stmt.strip() for stmt in sql.split(";") if stmt.strip()]
+            statements = split_sql_statements(sql)
 
             logger.info("Applying migration %s", migration_file.name)
 
@@ -0,0 +1,28 @@
+"""Срок выполнения текущего запроса.
+
+DeadlineMiddleware кладёт сюда абсолютный срок (time.monotonic()), а слои
+ниже берут из него свой бюджет: SET LOCAL statement_timeout для каждой
+транзакции и таймаут httpx для вызовов ISPmanager.
+"""
+
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+def remaining() -> Optional[float]:
+    """Сколько секунд осталось до срока; None — срок не задан."""
+
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def remaining_ms() -> Optional[int]:
+    budget = remaining()
+    if budget is None:
+        return None
+    return max(1, int(budget * 1000))
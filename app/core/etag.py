@@ -0,0 +1,57 @@
+"""ETag и условные GET на основе счётчиков изменений tenant_versions.
+
+Счётчики обновляются триггерами БД (миграция 004), поэтому для ответа
+304 Not Modified достаточно одного чтения по первичному ключу — без
+загрузки и сериализации самих строк.
+"""
+
+import zlib
+from typing import Optional
+
+from fastapi import Request, Response, status
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+USER_RESOURCE = "user"
+DOMAINS_RESOURCE = "domains"
+DNS_RESOURCE = "dns"
+SITES_RESOURCE = "sites"
+
+_VERSION_QUERY = text("SELECT version FROM tenant_versions WHERE user_id = :user_id AND resource = :resource")
+
+
+async def get_tenant_version(db: AsyncSession, user_id: int, resource: str) -> int:
+    result = await db.execute(_VERSION_QUERY, {"user_id": user_id, "resource": resource})
+    return result.scalar_one_or_none() or 0
+
+
+def build_etag(request: Request, user_id: int, resource: str, version: int) -> str:
+    # Путь и параметры (skip/limit) входят в тег, чтобы разные страницы не совпадали
+    variant = zlib.crc32(f"{request.url.path}?{request.url.query}".encode("utf-8"))
+    return f'W/"{resource}-{user_id}-{version}-{variant:08x}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Сравнение слабое: префикс W/ не учитывается
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in header.split(","))
+
+
+async def conditional_get(
+    db: AsyncSession,
+    request: Request,
+    user_id: int,
+    resource: str,
+) -> tuple[str, Optional[Response]]:
+    """Вернуть ETag ресурса и готовый ответ 304, если клиентская копия актуальна."""
+
+    version = await get_tenant_version(db, user_id, resource)
+    etag = build_etag(request, user_id, resource, version)
+    if etag_matches(request, etag):
+        return etag, Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return etag, None
@@ -1,21 +1,36 @@
 """
 Конфигурация логирования для приложения
+
+Обработчики из LOGGING_CONFIG не вызываются в потоке event loop: после
+dictConfig они переносятся за QueueHandler, а запись в файлы и форматирование
+выполняет отдельный поток QueueListener.
 """
 
+import atexit
+import copy
+import json
 import logging
 import logging.config
-from datetime import datetime
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import LOG_QUEUE_CAPACITY, LOG_QUEUE_DEPTH, LOG_RECORDS_DROPPED, LOG_RECORDS_SAMPLED_OUT
+from app.core.tracing import TraceIdFilter
 
 
 LOG_DIR = Path("logs")
 LOG_DIR.mkdir(exist_ok=True)
 
-for subdir in ("app", "auth", "database", "errors", "integrations"):
+for subdir in ("app", "auth", "database", "errors", "integrations", "traces"):
     (LOG_DIR / subdir).mkdir(exist_ok=True)
 
-current_date = datetime.now().strftime("%Y-%m-%d")
-
 LOGGING_CONFIG = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -30,6 +45,9 @@ LOGGING_CONFIG = {
             "style": "{",
             "datefmt": "%H:%M:%S",
         },
+        "json": {
+            "()": "app.core.logging_config.JsonFormatter",
+        },
     },
     "handlers": {
         "console": {
@@ -39,46 +57,46 @@ LOGGING_CONFIG = {
             "stream": "ext://sys.stdout",
         },
         "app_file": {
-            "class": "logging.handlers.RotatingFileHandler",
+            "class": "app.core.logging_config.DailyRotatingFileHandler",
             "level": "INFO",
-            "formatter": "detailed",
-            "filename": f"logs/app/app_{current_date}.log",
+            "formatter": "json",
+            "filename": "logs/app/app_%Y-%m-%d.log",
             "maxBytes": 10_485_760,
             "backupCount": 5,
             "encoding": "utf8",
         },
         "auth_file": {
-            "class": "logging.handlers.RotatingFileHandler",
+            "class": "app.core.logging_config.DailyRotatingFileHandler",
             "level": "INFO",
-            "formatter": "detailed",
-            "filename": f"logs/auth/auth_{current_date}.log",
+            "formatter": "json",
+            "filename": "logs/auth/auth_%Y-%m-%d.log",
             "maxBytes": 5_242_880,
             "backupCount": 5,
             "encoding": "utf8",
         },
         "database_file": {
-            "class": "logging.handlers.RotatingFileHandler",
+            "class": "app.core.logging_config.DailyRotatingFileHandler",
             "level": "WARNING",
-            "formatter": "detailed",
-            "filename": f"logs/database/database_{current_date}.log",
+            "formatter": "json",
+            "filename": "logs/database/database_%Y-%m-%d.log",
             "maxBytes": 5_242_880,
             "backupCount": 3,
             "encoding": "utf8",
         },
         "integrations_file": {
-            "class": "logging.handlers.RotatingFileHandler",
+            "class": "app.core.logging_config.DailyRotatingFileHandler",
             "level": "INFO",
-            "formatter": "detailed",
-            "filename": f"logs/integrations/ispmanager_{current_date}.log",
+            "formatter": "json",
+            "filename": "logs/integrations/ispmanager_%Y-%m-%d.log",
             "maxBytes": 5_242_880,
             "backupCount": 3,
             "encoding": "utf8",
         },
         "error_file": {
-            "class": "logging.handlers.RotatingFileHandler",
+            "class": "app.core.logging_config.DailyRotatingFileHandler",
             "level": "ERROR",
-            "formatter": "detailed",
-            "filename": f"logs/errors/errors_{current_date}.log",
+            "formatter": "json",
+            "filename": "logs/errors/errors_%Y-%m-%d.log",
             "maxBytes": 10_485_760,
             "backupCount": 10,
             "encoding": "utf8",
@@ -128,5 +146,259 @@ LOGGING_CONFIG = {
 }
 
 
+# Атрибуты, которые есть у любой LogRecord; всё остальное пришло через extra=
+_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись; поля из extra= попадают в объект как есть."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        # exc_text — уже отформатированное исключение из NonBlockingQueueHandler.prepare
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        if record.stack_info:
+            payload["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class DailyRotatingFileHandler(RotatingFileHandler):
+    """Файл с датой в имени (strftime-шаблон) и ротацией по размеру внутри суток.
+
+    Дата вычисляется по времени записи, а не при импорте модуля, поэтому
+    долго живущий процесс после полуночи пишет уже в новый файл.
+    """
+
+    def __init__(self, filename, mode="a", maxBytes=0, backupCount=0, encoding=None, delay=False):
+        self.pattern = str(filename)
+        self.current_date = date.today()
+        super().__init__(self._path_for(self.current_date), mode, maxBytes, backupCount, encoding, delay)
+
+    def _path_for(self, day: date) -> str:
+        return os.path.abspath(day.strftime(self.pattern))
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if date.fromtimestamp(record.created) != self.current_date:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self) -> None:
+        today = date.today()
+        if today == self.current_date:
+            super().doRollover()
+            return
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        self.current_date = today
+        self.baseFilename = self._path_for(today)
+        if not self.delay:
+            self.stream = self._open()
+
+
+class LoggingStats:
+    """Счётчики очереди логирования; в /metrics — log_queue_* и log_records_*.
+
+    Счётчики увеличиваются из разных потоков, поэтому под блокировкой.
+    Глубина очереди публикуется в gauge слушателем (не чаще раза в
+    секунду) и перед каждой отдачей /metrics.
+    """
+
+    def __init__(self) -> None:
+        self.dropped = 0
+        self.sampled_out = 0
+        self.queue: Optional[queue.Queue] = None
+        self._lock = threading.Lock()
+
+    def record_dropped(self) -> None:
+        with self._lock:
+            self.dropped += 1
+        LOG_RECORDS_DROPPED.inc()
+
+    def record_sampled_out(self) -> None:
+        with self._lock:
+            self.sampled_out += 1
+        LOG_RECORDS_SAMPLED_OUT.inc()
+
+    def publish(self) -> None:
+        if self.queue is not None:
+            LOG_QUEUE_DEPTH.set(self.queue.qsize())
+            LOG_QUEUE_CAPACITY.set(self.queue.maxsize)
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "queue_capacity": self.queue.maxsize if self.queue is not None else 0,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+        }
+
+
+stats = LoggingStats()
+
+
+class HotPathSampler(logging.Filter):
+    """Не более N записей в секунду на шаблон сообщения для DEBUG/INFO.
+
+    Ключом служит шаблон (record.msg) до подстановки аргументов, поэтому
+    сообщения должны использовать %-форматирование, а не f-строки.
+    Счётчики хранятся только для текущей секунды и сбрасываются при её
+    смене, так что их число ограничено шаблонами, записанными за секунду.
+    """
+
+    def __init__(self, per_second: int):
+        super().__init__()
+        self.per_second = per_second
+        self._second = 0
+        self._counts: Dict[Tuple[str, str], int] = {}
+        # Фильтр вызывается из потоков пулов так же, как из event loop
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.per_second <= 0 or record.levelno > logging.INFO:
+            return True
+        key = (record.name, str(record.msg))
+        second = int(record.created)
+        with self._lock:
+            if second > self._second:
+                self._second = second
+                self._counts.clear()
+            count = self._counts.get(key, 0) + 1
+            self._counts[key] = count
+        if count <= self.per_second:
+            return True
+        stats.record_sampled_out()
+        return False
+
+
+_EXC_FORMATTER = logging.Formatter()
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Кладёт запись в ограниченную очередь вместе с целевыми обработчиками логгера.
+
+    При переполнении запись отбрасывается и учитывается в stats.dropped —
+    event loop никогда не ждёт диск.
+    """
+
+    def __init__(self, log_queue: queue.Queue, targets: Tuple[logging.Handler, ...]):
+        super().__init__(log_queue)
+        self.targets = targets
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Как QueueHandler.prepare, но без форматирования всей строки: поля
+        # extra= остаются отдельными для JsonFormatter. Аргументы и исключение
+        # подставляются сразу, пока изменяемые объекты не изменились, а
+        # запись в очереди не держит traceback с кадрами стека.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _EXC_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait((record, self.targets))
+        except queue.Full:
+            stats.record_dropped()
+
+
+class DispatchingQueueListener(QueueListener):
+    """Передаёт запись обработчикам того логгера, из которого она пришла."""
+
+    DROP_REPORT_INTERVAL = 60.0
+    DEPTH_PUBLISH_INTERVAL = 1.0
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self._reported_dropped = 0
+        self._next_report = 0.0
+        self._next_publish = 0.0
+
+    def handle(self, item) -> None:
+        record, targets = item
+        for handler in targets:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        now = time.monotonic()
+        if now >= self._next_publish:
+            self._next_publish = now + self.DEPTH_PUBLISH_INTERVAL
+            stats.publish()
+        self._report_drops()
+
+    def _report_drops(self) -> None:
+        now = time.monotonic()
+        if stats.dropped == self._reported_dropped or now < self._next_report:
+            return
+        self._next_report = now + self.DROP_REPORT_INTERVAL
+        lost = stats.dropped - self._reported_dropped
+        self._reported_dropped = stats.dropped
+        logging.getLogger(__name__).warning("Log queue overflow: %d records dropped", lost)
+
+    def enqueue_sentinel(self) -> None:
+        # Сигнал остановки должен дойти даже при заполненной очереди
+        self.queue.put(self._sentinel)
+
+
+_listener: Optional[DispatchingQueueListener] = None
+_listener_lock = threading.Lock()
+
+
+def stop_logging() -> None:
+    """Дописать очередь и остановить поток слушателя."""
+
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
 def setup_logging() -> None:
-    logging.config.dictConfig(LOGGING_CONFIG)
\ No newline at end of file
+    global _listener
+
+    stop_logging()
+    logging.config.dictConfig(LOGGING_CONFIG)
+    configured = [logging.getLogger(name) for name in LOGGING_CONFIG["loggers"]] + [logging.getLogger()]
+    # trace_id читается из contextvars, поэтому фильтр должен работать в потоке вызова
+    trace_filter = TraceIdFilter()
+    if not settings.log_async:
+        for configured_logger in configured:
+            for target in configured_logger.handlers:
+                target.addFilter(trace_filter)
+        return
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.log_queue_size)
+    sampler = HotPathSampler(settings.log_sample_per_second)
+    for configured_logger in configured:
+        targets = tuple(configured_logger.handlers)
+        if not targets:
+            continue
+        handler = NonBlockingQueueHandler(log_queue, targets)
+        handler.setLevel(min(target.level for target in targets))
+        handler.addFilter(sampler)
+        handler.addFilter(trace_filter)
+        configured_logger.handlers = [handler]
+
+    with _listener_lock:
+        stats.queue = log_queue
+        _listener = DispatchingQueueListener(log_queue)
+        _listener.start()
+
+
+atexit.register(stop_logging)
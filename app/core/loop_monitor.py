@@ -0,0 +1,134 @@
+"""Мониторинг задержки event loop и сторожевой поток для блокировок.
+
+Задача run_loop_monitor каждые loop_monitor_interval секунд засыпает и
+меряет, на сколько позже её разбудили: это и есть lag цикла. Если цикл
+не просыпается дольше loop_block_threshold, сторожевой поток снимает стек
+потока event loop и пишет его в лог вместе с маршрутом и trace id запроса,
+который сейчас выполняется.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import EVENT_LOOP_BLOCKS, EVENT_LOOP_LAG, EVENT_LOOP_LAG_CURRENT
+
+logger = logging.getLogger("app.core.loop_monitor")
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Задача запроса -> (маршрут, trace id); заполняет TracingMiddleware
+_active_requests: Dict[asyncio.Task, Tuple[str, str]] = {}
+
+_current_lag = 0.0
+
+
+def current_lag() -> float:
+    """Последнее измеренное отставание event loop, секунды."""
+
+    return _current_lag
+
+
+def track_request(label: str, trace_id: str) -> Optional[asyncio.Task]:
+    task = asyncio.current_task()
+    if task is not None:
+        _active_requests[task] = (label, trace_id)
+    return task
+
+
+def untrack_request(task: Optional[asyncio.Task]) -> None:
+    if task is not None:
+        _active_requests.pop(task, None)
+
+
+def _blocking_location(frame) -> str:
+    """Самый глубокий кадр кода приложения — по нему ранжируются виновники."""
+
+    innermost = None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if innermost is None:
+            innermost = frame
+        if filename.startswith(APP_ROOT):
+            return f"{os.path.relpath(filename, os.path.dirname(APP_ROOT))}:{frame.f_lineno}"
+        frame = frame.f_back
+    if innermost is None:
+        return "unknown"
+    return f"{os.path.basename(innermost.f_code.co_filename)}:{innermost.f_lineno}"
+
+
+class _Watchdog(threading.Thread):
+    def __init__(self, loop: asyncio.AbstractEventLoop, loop_thread_id: int):
+        super().__init__(name="event-loop-watchdog", daemon=True)
+        self.loop = loop
+        self.loop_thread_id = loop_thread_id
+        self.last_beat = time.monotonic()
+        self.beats = 0
+        self._reported_beat = -1
+        self._stop_event = threading.Event()
+
+    def beat(self) -> None:
+        self.last_beat = time.monotonic()
+        self.beats += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def run(self) -> None:
+        threshold = settings.loop_block_threshold
+        expected = settings.loop_monitor_interval
+        while not self._stop_event.wait(threshold / 4):
+            stalled = time.monotonic() - self.last_beat - expected
+            if stalled < threshold or self._reported_beat == self.beats:
+                continue
+            self._reported_beat = self.beats
+            self._report(stalled)
+
+    def _report(self, stalled: float) -> None:
+        frame = sys._current_frames().get(self.loop_thread_id)
+        if frame is None:
+            return
+        try:
+            task = asyncio.current_task(self.loop)
+        except RuntimeError:
+            task = None
+        route, trace_id = _active_requests.get(task, ("-", "-")) if task is not None else ("-", "-")
+        location = _blocking_location(frame)
+        EVENT_LOOP_BLOCKS.labels(location).inc()
+        logger.warning(
+            "Event loop blocked for %.0f ms at %s (route %s, trace %s)\n%s",
+            stalled * 1000,
+            location,
+            route,
+            trace_id,
+            "".join(traceback.format_stack(frame)),
+            extra={"route": route, "trace_id": trace_id, "blocked_ms": round(stalled * 1000), "location": location},
+        )
+
+
+async def run_loop_monitor() -> None:
+    """Фоновая задача lifespan: замер lag и запуск сторожевого потока."""
+
+    global _current_lag
+
+    loop = asyncio.get_running_loop()
+    watchdog = _Watchdog(loop, threading.get_ident())
+    watchdog.start()
+    interval = settings.loop_monitor_interval
+    try:
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - started - interval)
+            watchdog.beat()
+            _current_lag = lag
+            EVENT_LOOP_LAG.observe(lag)
+            EVENT_LOOP_LAG_CURRENT.set(lag)
+    finally:
+        watchdog.stop()
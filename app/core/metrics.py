@@ -0,0 +1,170 @@
+"""Метрики Prometheus для HTTP, БД и ISPmanager.
+
+При нескольких воркерах задайте metrics_multiproc_dir: значения пишутся в
+mmap-файлы этого каталога, а /metrics любого воркера агрегирует их все.
+Каталог должен быть пустым при старте мастер-процесса.
+"""
+
+import os
+
+from app.core.config import settings
+
+# prometheus_client выбирает хранилище значений при импорте
+if settings.metrics_multiproc_dir:
+    os.makedirs(settings.metrics_multiproc_dir, exist_ok=True)
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", settings.metrics_multiproc_dir)
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template and status code",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "SQL statement latency by statement type",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting for a connection from the pool",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "Connections currently checked out of the pool",
+    multiprocess_mode="livesum",
+)
+DB_POOL_OPEN = Gauge(
+    "db_pool_open_connections",
+    "Connections currently open (idle and checked out)",
+    multiprocess_mode="livesum",
+)
+DB_POOL_SIZE = Gauge(
+    "db_pool_size",
+    "Configured pool size",
+    multiprocess_mode="livesum",
+)
+
+ISP_REQUEST_DURATION = Histogram(
+    "isp_request_duration_seconds",
+    "ISPmanager API call latency by func",
+    ["func"],
+    buckets=LATENCY_BUCKETS,
+)
+ISP_REQUEST_ERRORS = Counter(
+    "isp_request_errors_total",
+    "ISPmanager API call failures by func and kind",
+    ["func", "kind"],
+)
+
+ISP_SCHEDULER_QUEUE_WAIT = Histogram(
+    "isp_scheduler_queue_wait_seconds",
+    "Time an ISPmanager call waited for a slot in the fair scheduler",
+    buckets=(0.0, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+ISP_SCHEDULER_QUEUED = Gauge(
+    "isp_scheduler_queued_calls",
+    "ISPmanager calls waiting in tenant queues",
+    multiprocess_mode="livesum",
+)
+ISP_SCHEDULER_REJECTED = Counter(
+    "isp_scheduler_rejected_total",
+    "ISPmanager calls rejected because the tenant queue was full",
+)
+
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Delay between the scheduled and actual wake-up of the loop monitor",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+EVENT_LOOP_LAG_CURRENT = Gauge(
+    "event_loop_lag_current_seconds",
+    "Most recent event loop lag measurement",
+    multiprocess_mode="livemax",
+)
+EVENT_LOOP_BLOCKS = Counter(
+    "event_loop_blocked_total",
+    "Event loop stalls longer than loop_block_threshold by blocking code location",
+    ["location"],
+)
+
+
+ADMISSION_IN_FLIGHT = Gauge(
+    "admission_in_flight_requests",
+    "Admitted requests currently in progress by route class",
+    ["route_class"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total",
+    "Requests rejected with 503 by admission control",
+    ["route_class", "reason"],
+)
+
+DISK_SCAN_DURATION = Histogram(
+    "disk_usage_scan_seconds",
+    "Duration of a home directory disk usage scan by kind",
+    ["kind"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+
+LOG_QUEUE_DEPTH = Gauge(
+    "log_queue_depth",
+    "Records waiting in the logging queue",
+    multiprocess_mode="livesum",
+)
+LOG_QUEUE_CAPACITY = Gauge(
+    "log_queue_capacity",
+    "Capacity of the logging queue",
+    multiprocess_mode="livesum",
+)
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total",
+    "Log records dropped because the logging queue was full",
+)
+LOG_RECORDS_SAMPLED_OUT = Counter(
+    "log_records_sampled_out_total",
+    "DEBUG/INFO log records suppressed by hot-path sampling",
+)
+
+STARTUP_PHASE_DURATION = Gauge(
+    "app_startup_phase_seconds",
+    "Duration of worker startup phases",
+    ["phase"],
+    multiprocess_mode="liveall",
+)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Тело и Content-Type ответа /metrics."""
+
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    """Убрать live-gauge завершившегося воркера (вызывается мастер-процессом)."""
+
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
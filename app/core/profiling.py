@@ -0,0 +1,226 @@
+"""Профилирование воркера по запросу администратора.
+
+- SamplingProfiler: поток, который раз в profiler_interval снимает стек
+  потока event loop и пишет collapsed stacks (формат flamegraph.pl /
+  speedscope) в profiling_dir.
+- Профиль одного запроса: cProfile (.prof для pstats/snakeviz) и сэмплы
+  за время запроса. Включается заголовком X-Profile с подписанным токеном.
+- Снимки tracemalloc с разницей относительно предыдущего снимка.
+"""
+
+import cProfile
+import hashlib
+import hmac
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger("app.core.profiling")
+
+PROFILE_HEADER = b"x-profile"
+# Имя файла попадает в заголовок ответа X-Profile-File, поэтому только ASCII
+_UNSAFE_LABEL_RE = re.compile(r"[^A-Za-z0-9_-]+")
+MAX_LABEL_LENGTH = 80
+
+
+def profiles_dir() -> Path:
+    path = Path(settings.profiling_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _output_path(label: str, suffix: str) -> Path:
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    safe_label = _UNSAFE_LABEL_RE.sub("_", label).strip("_")[:MAX_LABEL_LENGTH]
+    return profiles_dir() / f"{stamp}_{os.getpid()}_{safe_label}{suffix}"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+class SamplingProfiler:
+    """Сэмплирующий профилировщик одного потока (по умолчанию — потока event loop)."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack: List[str] = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write_collapsed(self, path: Path) -> None:
+        with path.open("w", encoding="utf-8") as output:
+            for stack, count in self.stacks.most_common():
+                output.write(f"{stack} {count}\n")
+
+
+# Одновременно в воркере работает только один профилировщик
+_busy_lock = threading.Lock()
+_busy = False
+
+
+def acquire_profiler() -> bool:
+    global _busy
+    with _busy_lock:
+        if _busy:
+            return False
+        _busy = True
+        return True
+
+
+def release_profiler() -> None:
+    global _busy
+    with _busy_lock:
+        _busy = False
+
+
+def profiling_active() -> bool:
+    return _busy
+
+
+def start_sampling(seconds: float, label: str = "worker") -> Path:
+    """Запустить сэмплирование вызывающего потока на seconds секунд.
+
+    Вызывается из event loop; результат пишется в фоне по окончании.
+    """
+
+    if not acquire_profiler():
+        raise RuntimeError("Профилировщик уже запущен в этом воркере")
+    sampler = SamplingProfiler(threading.get_ident(), settings.profiler_interval)
+    path = _output_path(label, ".collapsed")
+
+    def finish() -> None:
+        time.sleep(seconds)
+        sampler.stop()
+        try:
+            sampler.write_collapsed(path)
+        finally:
+            release_profiler()
+        logger.info("Sampling profile written to %s (%d samples)", path, sampler.samples)
+
+    sampler.start()
+    threading.Thread(target=finish, name="sampling-profiler-finish", daemon=True).start()
+    return path
+
+
+# Подписанный токен для X-Profile: "<unix-время истечения>.<hmac-sha256>"
+def sign_profile_token(ttl: int) -> str:
+    expires = str(int(time.time()) + ttl)
+    signature = hmac.new(settings.secret_key.encode(), expires.encode(), hashlib.sha256).hexdigest()
+    return f"{expires}.{signature}"
+
+
+def verify_profile_token(token: str) -> bool:
+    expires, _, signature = token.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    expected = hmac.new(settings.secret_key.encode(), expires.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+class RequestProfile:
+    """cProfile и сэмплы на время одного запроса.
+
+    cProfile видит весь поток, поэтому в профиль попадают и конкурентные
+    корутины; одновременно профилируется не больше одного запроса.
+    """
+
+    def __init__(self, label: str):
+        self.path = _output_path(label, ".prof")
+        self.profile = cProfile.Profile()
+        self.sampler = SamplingProfiler(threading.get_ident(), settings.profiler_interval)
+
+    def __enter__(self) -> "RequestProfile":
+        self.sampler.start()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.profile.disable()
+        self.sampler.stop()
+
+    def write(self) -> Path:
+        self.profile.dump_stats(str(self.path))
+        self.sampler.write_collapsed(self.path.with_suffix(".collapsed"))
+        return self.path
+
+
+# tracemalloc
+_last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+
+def start_tracemalloc(frames: int) -> None:
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def stop_tracemalloc() -> None:
+    global _last_snapshot
+    tracemalloc.stop()
+    _last_snapshot = None
+
+
+def take_tracemalloc_snapshot(limit: int) -> Dict[str, Any]:
+    """Снять снимок, сохранить его и вернуть top по росту с прошлого снимка."""
+
+    global _last_snapshot
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc не запущен")
+
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        )
+    )
+    path = _output_path("tracemalloc", ".snapshot")
+    snapshot.dump(str(path))
+
+    if _last_snapshot is not None:
+        stats = snapshot.compare_to(_last_snapshot, "lineno")
+        top = [
+            {"location": str(stat.traceback), "size": stat.size, "size_diff": stat.size_diff, "count": stat.count}
+            for stat in stats[:limit]
+        ]
+    else:
+        top = [
+            {"location": str(stat.traceback), "size": stat.size, "size_diff": None, "count": stat.count}
+            for stat in snapshot.statistics("lineno")[:limit]
+        ]
+    _last_snapshot = snapshot
+
+    current, peak = tracemalloc.get_traced_memory()
+    return {"path": str(path), "current": current, "peak": peak, "top": top}
@@ -0,0 +1,147 @@
+"""Прогрев при старте и проверки готовности для /health/ready.
+
+Проверки (БД, ISPmanager) выполняет фоновая задача раз в readiness_interval
+секунд; /health/ready только читает последний результат, поэтому частые
+пробы балансировщика ничего не стоят. Воркер не готов, пока не закончился
+прогрев, если упала критичная проверка, если результаты устарели (завис
+цикл проверок) и после начала остановки.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import STARTUP_PHASE_DURATION
+
+logger = logging.getLogger("app.core.readiness")
+
+Check = Callable[[], Awaitable[None]]
+
+
+def process_uptime() -> Optional[float]:
+    """Секунды с запуска процесса (Linux): запуск интерпретатора и импорты."""
+
+    try:
+        with open("/proc/self/stat", encoding="ascii") as stat_file:
+            # Имя процесса в скобках может содержать пробелы
+            fields = stat_file.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime", encoding="ascii") as uptime_file:
+            system_uptime = float(uptime_file.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+    started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    return max(0.0, system_uptime - started)
+
+
+class StartupTimer:
+    """Длительность фаз старта: пишется в лог одной строкой и в метрику."""
+
+    def __init__(self) -> None:
+        self.phases: List[Tuple[str, float]] = []
+        uptime = process_uptime()
+        if uptime is not None:
+            self.phases.append(("imports", uptime))
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def report(self) -> None:
+        for name, duration in self.phases:
+            STARTUP_PHASE_DURATION.labels(name).set(duration)
+        logger.info(
+            "Startup completed in %.2fs: %s",
+            sum(duration for _, duration in self.phases),
+            " ".join(f"{name}={duration:.3f}s" for name, duration in self.phases),
+        )
+
+
+@dataclass
+class CheckResult:
+    ok: bool
+    latency: float
+    checked_at: float
+    error: Optional[str] = None
+
+
+class ReadinessMonitor:
+    def __init__(self) -> None:
+        self._checks: Dict[str, Tuple[Check, bool]] = {}
+        self.results: Dict[str, CheckResult] = {}
+        self.started = False
+        self.draining = False
+
+    def add_check(self, name: str, check: Check, *, critical: bool = True) -> None:
+        """Некритичная проверка видна в ответе, но не снимает воркер с балансировки."""
+
+        self._checks[name] = (check, critical)
+
+    async def _run_check(self, name: str, check: Check) -> None:
+        started = time.perf_counter()
+        error: Optional[str] = None
+        try:
+            await asyncio.wait_for(check(), settings.readiness_timeout)
+        except asyncio.TimeoutError:
+            error = "timeout"
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+        result = CheckResult(error is None, time.perf_counter() - started, time.monotonic(), error)
+        previous = self.results.get(name)
+        if previous is not None and previous.ok != result.ok:
+            log = logger.info if result.ok else logger.warning
+            log("Readiness check %s is now %s%s", name, "ok" if result.ok else "failing", f": {error}" if error else "")
+        self.results[name] = result
+
+    async def run_checks(self) -> None:
+        await asyncio.gather(*(self._run_check(name, check) for name, (check, _) in self._checks.items()))
+
+    async def run(self) -> None:
+        """Фоновая задача lifespan; первый прогон делает сам lifespan."""
+
+        while True:
+            await asyncio.sleep(settings.readiness_interval)
+            await self.run_checks()
+
+    def snapshot(self) -> Tuple[bool, Dict[str, Any]]:
+        now = time.monotonic()
+        stale_after = settings.readiness_interval * 3 + settings.readiness_timeout
+        ready = self.started and not self.draining
+        checks: Dict[str, Any] = {}
+        for name, (_, critical) in self._checks.items():
+            result = self.results.get(name)
+            if result is None:
+                checks[name] = {"ok": False, "critical": critical, "error": "not checked yet"}
+                ready = ready and not critical
+                continue
+            stale = now - result.checked_at > stale_after
+            ok = result.ok and not stale
+            checks[name] = {
+                "ok": ok,
+                "critical": critical,
+                "latency_ms": round(result.latency * 1000, 1),
+                "age_s": round(now - result.checked_at, 1),
+            }
+            if result.error or stale:
+                checks[name]["error"] = "stale" if stale else result.error
+            if critical and not ok:
+                ready = False
+
+        if self.draining:
+            status = "draining"
+        elif not self.started:
+            status = "starting"
+        else:
+            status = "ready" if ready else "not_ready"
+        return ready, {"status": status, "checks": checks}
+
+
+readiness = ReadinessMonitor()
@@ -0,0 +1,56 @@
+"""Быстрая сериализация ответов без повторной валидации FastAPI."""
+
+from functools import lru_cache
+from typing import Any, Iterable, List, Mapping, Sequence, Type, TypeVar
+
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+
+try:  # orjson необязателен: без него используется стандартный JSONResponse
+    from fastapi.responses import ORJSONResponse as DefaultJSONResponse
+    import orjson  # noqa: F401
+except ImportError:  # pragma: no cover - зависит от окружения
+    from fastapi.responses import JSONResponse as DefaultJSONResponse
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+JSON_MEDIA_TYPE = "application/json"
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+
+def model_columns(model: Type[BaseModel], entity: Any) -> list:
+    """Колонки ORM-модели, соответствующие полям схемы ответа, в том же порядке."""
+
+    return [getattr(entity, name) for name in model.model_fields]
+
+
+def rows_to_models(model: Type[ModelT], rows: Iterable[Mapping[str, Any]]) -> List[ModelT]:
+    """Провалидировать строки выборки (mappings) одним вызовом TypeAdapter."""
+
+    return _list_adapter(model).validate_python(list(rows))
+
+
+def model_response(value: BaseModel, *, status_code: int = 200) -> Response:
+    """Отдать уже провалидированную модель, сериализовав её сразу в JSON-байты."""
+
+    return Response(content=value.model_dump_json(), status_code=status_code, media_type=JSON_MEDIA_TYPE)
+
+
+def models_response(model: Type[ModelT], values: Sequence[ModelT], *, status_code: int = 200) -> Response:
+    """Отдать список моделей одним проходом сериализатора pydantic-core."""
+
+    return Response(
+        content=_list_adapter(model).dump_json(list(values)),
+        status_code=status_code,
+        media_type=JSON_MEDIA_TYPE,
+    )
+
+
+def rows_response(model: Type[ModelT], rows: Iterable[Mapping[str, Any]]) -> Response:
+    """Строки выборки -> одна валидация -> JSON без промежуточных ORM-объектов."""
+
+    return models_response(model, rows_to_models(model, rows))
@@ -0,0 +1,229 @@
+"""Лёгкая внутрипроцессная трассировка запросов.
+
+Трасса живёт в contextvars и поэтому видна во всех корутинах и задачах
+запроса (включая синхронные события SQLAlchemy внутри greenlet_spawn).
+Идентификатор трассы есть у каждого запроса, а спаны пишутся только для
+выбранных сэмплированием трасс: для остальных span() ничего не делает.
+"""
+
+import atexit
+import json
+import logging
+import queue
+import random
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from logging.handlers import QueueListener
+from typing import Any, Dict, Iterator, List, Optional, Protocol
+
+from app.core.config import settings
+
+logger = logging.getLogger("app.core.tracing")
+
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    name: str
+    start_time: float
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    duration_ms: Optional[float] = None
+    error: Optional[str] = None
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+@dataclass
+class Trace:
+    trace_id: str
+    sampled: bool
+    spans: List[Span] = field(default_factory=list)
+
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def new_trace_id() -> str:
+    return secrets.token_hex(16)
+
+
+def get_trace_id() -> Optional[str]:
+    trace = current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+def should_sample() -> bool:
+    rate = settings.tracing_sample_rate
+    return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+
+def start_span(name: str, **attributes: Any) -> Optional[Span]:
+    """Открыть спан внутри сэмплированной трассы (без смены текущего спана)."""
+
+    trace = current_trace.get()
+    if trace is None or not trace.sampled:
+        return None
+    parent = current_span.get()
+    span = Span(
+        trace_id=trace.trace_id,
+        span_id=secrets.token_hex(8),
+        parent_id=parent.span_id if parent is not None else None,
+        name=name,
+        start_time=time.time(),
+        attributes=attributes,
+    )
+    trace.spans.append(span)
+    return span
+
+
+def finish_span(span: Optional[Span], error: Optional[BaseException] = None) -> None:
+    if span is None or span.duration_ms is not None:
+        return
+    span.duration_ms = round((time.perf_counter() - span._started) * 1000, 3)
+    if error is not None:
+        span.error = f"{type(error).__name__}: {error}"
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Спан вокруг блока кода; вложенные спаны становятся его потомками."""
+
+    opened = start_span(name, **attributes)
+    if opened is None:
+        yield None
+        return
+    token = current_span.set(opened)
+    try:
+        yield opened
+    except BaseException as exc:
+        finish_span(opened, exc)
+        raise
+    finally:
+        current_span.reset(token)
+        finish_span(opened)
+
+
+class SpanExporter(Protocol):
+    def export(self, spans: List[Span]) -> None:
+        ...
+
+
+class RingBufferExporter:
+    """Последние N трасс в памяти процесса — для просмотра через /admin/traces."""
+
+    def __init__(self, capacity: int):
+        self.traces: deque = deque(maxlen=capacity)
+
+    def export(self, spans: List[Span]) -> None:
+        self.traces.append([item.to_dict() for item in spans])
+
+    def recent(self, limit: int) -> List[List[Dict[str, Any]]]:
+        return list(self.traces)[-limit:][::-1]
+
+    def find(self, trace_id: str) -> Optional[List[Dict[str, Any]]]:
+        for spans in reversed(self.traces):
+            if spans and spans[0]["trace_id"] == trace_id:
+                return spans
+        return None
+
+
+class JsonlFileExporter:
+    """Спаны построчно в JSONL; запись на диск идёт в отдельном потоке."""
+
+    def __init__(self, filename: str):
+        # logging_config сам импортирует этот модуль ради TraceIdFilter
+        from app.core.logging_config import DailyRotatingFileHandler
+
+        handler = DailyRotatingFileHandler(filename, maxBytes=52_428_800, backupCount=5, encoding="utf8")
+        handler.setFormatter(_SpanFormatter())
+        self._queue: queue.Queue = queue.Queue(maxsize=settings.log_queue_size)
+        self._listener = QueueListener(self._queue, handler)
+        self._listener.start()
+        self.dropped = 0
+
+    def export(self, spans: List[Span]) -> None:
+        for item in spans:
+            record = logging.makeLogRecord({"msg": "span", "span": item.to_dict()})
+            try:
+                self._queue.put_nowait(record)
+            except queue.Full:
+                self.dropped += 1
+
+    def close(self) -> None:
+        self._listener.stop()
+
+
+class _SpanFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.span, ensure_ascii=False, default=str)
+
+
+_exporters: List[SpanExporter] = []
+_exporters_lock = threading.Lock()
+ring_buffer: Optional[RingBufferExporter] = None
+
+
+def configure_exporters() -> None:
+    """Создать экспортёры из settings.tracing_exporters (вызывается один раз на процесс)."""
+
+    global ring_buffer
+    with _exporters_lock:
+        if _exporters:
+            return
+        for name in settings.tracing_exporters:
+            if name == "ring":
+                ring_buffer = RingBufferExporter(settings.tracing_ring_size)
+                _exporters.append(ring_buffer)
+            elif name == "jsonl":
+                exporter = JsonlFileExporter(settings.tracing_jsonl_path)
+                atexit.register(exporter.close)
+                _exporters.append(exporter)
+            else:
+                logger.warning("Unknown trace exporter %s, skipping", name)
+
+
+def add_exporter(exporter: SpanExporter) -> None:
+    with _exporters_lock:
+        _exporters.append(exporter)
+
+
+def export_trace(trace: Trace) -> None:
+    if not trace.sampled or not trace.spans:
+        return
+    for exporter in _exporters:
+        try:
+            exporter.export(trace.spans)
+        except Exception:
+            logger.exception("Trace exporter %s failed", type(exporter).__name__)
+
+
+class TraceIdFilter(logging.Filter):
+    """Добавляет trace_id в записи, сделанные внутри запроса."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace = current_trace.get()
+        if trace is not None:
+            record.trace_id = trace.trace_id
+        return True
@@ -1,6 +1,6 @@
 """Integration clients for external systems."""
 
-from .ispmanager import ISPManagerClient, ISPManagerError, extract_identifier, get_isp_client
-
-__all__ = ["ISPManagerClient", "ISPManagerError", "get_isp_client", "extract_identifier"]
+from .ispmanager import ISPManagerClient, ISPManagerError, extract_identifier
+from .nodes import NoNodeAvailable, get_isp_client, registry as isp_nodes
 
+__all__ = ["ISPManagerClient", "ISPManagerError", "NoNodeAvailable", "get_isp_client", "extract_identifier", "isp_nodes"]
@@ -1,16 +1,63 @@
 from __future__ import annotations
 
 import logging
+import re
+import time
 from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from typing import Any, AsyncIterator, Dict, Optional
 
 import httpx
 
+from app.core import deadline, tracing
 from app.core.config import settings
+from app.core.context import current_tenant
+from app.core.metrics import ISP_REQUEST_DURATION, ISP_REQUEST_ERRORS
+from app.integrations.scheduler import FairScheduler, TenantQueueFull
 
 
 logger = logging.getLogger("app.integrations.ispmanager")
 
+# Планировщик на узел панели: общий лимит узла и очереди по пользователям
+_schedulers: Dict[str, FairScheduler] = {}
+
+
+def scheduler_for(node: str) -> FairScheduler:
+    scheduler = _schedulers.get(node)
+    if scheduler is None:
+        scheduler = _schedulers[node] = FairScheduler(
+            settings.isp_global_concurrency,
+            queue_limit=settings.isp_tenant_queue_limit,
+            weights=settings.isp_tenant_weights,
+        )
+    return scheduler
+
+
+# Общий транспорт воркера: keep-alive соединения к панели переиспользуются между вызовами
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            follow_redirects=True,
+            verify=settings.isp_verify_ssl,
+            limits=httpx.Limits(
+                max_connections=settings.isp_global_concurrency,
+                max_keepalive_connections=settings.isp_global_concurrency,
+            ),
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Закрыть соединения к ISPmanager (shutdown-фаза lifespan)."""
+
+    global _http_client
+    if _http_client is not None:
+        client, _http_client = _http_client, None
+        await client.aclose()
+
 
 class ISPManagerError(Exception):
     """Исключение, возникающее при ошибках взаимодействия с ISPmanager."""
@@ -28,6 +75,9 @@ class ISPManagerClient:
     base_url: str = settings.isp_api_base_url.rstrip("/")
     token: Optional[str] = settings.isp_api_token
     timeout: float = 10.0
+    node: str = settings.isp_default_node
+    admin_login: Optional[str] = settings.isp_admin_login
+    admin_password: Optional[str] = settings.isp_admin_password
 
     def __post_init__(self) -> None:
         if not self.base_url.lower().endswith("/ispmgr"):
@@ -57,25 +107,42 @@ class ISPManagerClient:
         if self.token:
             headers["Authorization"] = f"Bearer {self.token}"
         else:
-            if not settings.isp_admin_login or not settings.isp_admin_password:
-                raise ISPManagerError("Не заданы параметры isp_admin_login / isp_admin_password для authinfo")
+            if not self.admin_login or not self.admin_password:
+                raise ISPManagerError(f"Для узла {self.node} не заданы логин и пароль администратора для authinfo")
             request_params.setdefault(
                 "authinfo",
-                f"{settings.isp_admin_login}:{settings.isp_admin_password}",
+                f"{self.admin_login}:{self.admin_password}",
             )
 
+        func = str(request_params.get("func") or path or "unknown")
+
+        # Вызовы одного пользователя не занимают весь лимит к панели: очередь на тенанта
+        tenant = current_tenant.get()
+        scheduler = scheduler_for(self.node)
+        try:
+            await scheduler.acquire("system" if tenant is None else tenant)
+        except TenantQueueFull as exc:
+            ISP_REQUEST_ERRORS.labels(func, "throttled").inc()
+            raise ISPManagerError("Слишком много запросов к ISPmanager, повторите позже", status_code=429) from exc
         try:
-            async with httpx.AsyncClient(
-                timeout=self.timeout,
-                follow_redirects=True,
-                verify=settings.isp_verify_ssl,
-            ) as client:
-                response = await client.request(
+            # Таймаут вызова не больше оставшегося бюджета запроса
+            timeout = self.timeout
+            budget = deadline.remaining()
+            if budget is not None:
+                if budget <= 0:
+                    raise ISPManagerError("Истёк срок выполнения запроса", status_code=504)
+                timeout = min(timeout, budget)
+
+            request_span = tracing.start_span("isp.request", func=func, node=self.node)
+            started = time.perf_counter()
+            try:
+                response = await _get_http_client().request(
                     method,
                     url,
                     headers=headers,
                     params=request_params,
                     data=data,
+                    timeout=timeout,
                 )
                 logger.debug(
                     "ISPmanager request",
@@ -85,11 +152,22 @@ class ISPManagerClient:
                         "status": response.status_code,
                     },
                 )
-        except httpx.HTTPError as exc:  # pragma: no cover - network errors
-            logger.error("ISPmanager request failed: %s", exc)
-            raise ISPManagerError("Недоступен ISPmanager API") from exc
+            except httpx.HTTPError as exc:  # pragma: no cover - network errors
+                ISP_REQUEST_DURATION.labels(func).observe(time.perf_counter() - started)
+                tracing.finish_span(request_span, exc)
+                ISP_REQUEST_ERRORS.labels(func, "transport").inc()
+                logger.error("ISPmanager request failed: %s", exc)
+                raise ISPManagerError("Недоступен ISPmanager API") from exc
+        finally:
+            scheduler.release()
+
+        ISP_REQUEST_DURATION.labels(func).observe(time.perf_counter() - started)
+        if request_span is not None:
+            request_span.set(status=response.status_code)
+        tracing.finish_span(request_span)
 
         if response.status_code >= 400:
+            ISP_REQUEST_ERRORS.labels(func, "http").inc()
             logger.warning(
                 "ISPmanager responded with error",
                 extra={"status_code": response.status_code, "body": response.text},
@@ -109,12 +187,22 @@ class ISPManagerClient:
             return {}
 
         if "application/json" in response.headers.get("content-type", ""):
-            return response.json()
+            payload = response.json()
+        else:
+            try:
+                payload = response.json()
+            except ValueError:
+                return {"raw": response.text}
 
-        try:
-            return response.json()
-        except ValueError:
-            return {"raw": response.text}
+        # Ошибку панели разбирает _ensure_success, здесь она только учитывается
+        if isinstance(payload, dict) and isinstance(payload.get("doc"), dict) and payload["doc"].get("error"):
+            ISP_REQUEST_ERRORS.labels(func, "panel").inc()
+        return payload
+
+    async def ping(self) -> None:
+        """Дешёвый вызов панели: проверка готовности и прогрев соединения."""
+
+        self._ensure_success(await self._request("GET", params={"func": "whoami"}))
 
     @staticmethod
     def _ensure_success(payload: Dict[str, Any]) -> Dict[str, Any]:
@@ -133,6 +221,38 @@ class ISPManagerClient:
 
         return doc
 
+    @staticmethod
+    def _elements(doc: Dict[str, Any]) -> list[Dict[str, Any]]:
+        """Привести список elem из ответа ISPmanager к плоским словарям."""
+
+        elements = doc.get("elem") or []
+        if isinstance(elements, dict):
+            elements = [elements]
+        return [
+            {key: value.get("$") if isinstance(value, dict) else value for key, value in element.items()}
+            for element in elements
+        ]
+
+    async def list_page(self, func: str, *, page: int = 1, page_size: int = 500, **params: Any) -> list[Dict[str, Any]]:
+        """Одна страница списка ISPmanager (p_num нумеруется с 1)."""
+
+        request_params: Dict[str, Any] = {"func": func, "p_num": page, "p_cnt": page_size}
+        request_params.update(params)
+        doc = self._ensure_success(await self._request("GET", params=request_params))
+        return self._elements(doc)
+
+    async def iter_list(self, func: str, *, page_size: int = 500, **params: Any) -> AsyncIterator[list[Dict[str, Any]]]:
+        """Постранично обойти список, пока страница не окажется неполной."""
+
+        page = 1
+        while True:
+            elements = await self.list_page(func, page=page, page_size=page_size, **params)
+            if elements:
+                yield elements
+            if len(elements) < page_size:
+                return
+            page += 1
+
     async def create_account(
         self,
         *,
@@ -152,7 +272,7 @@ class ISPManagerClient:
             "email": email,
         }
 
-        owner_login = settings.isp_admin_login or ""
+        owner_login = self.admin_login or ""
         if owner_login and owner_login.lower() != "root":
             params.setdefault("owner", owner_login)
         else:
@@ -204,7 +324,24 @@ class ISPManagerClient:
         raise ISPManagerError("Создание домена через классический API ISPmanager пока не реализовано")
 
     async def create_dns_record(self, *, domain_id: str, record_type: str, name: str, value: str, ttl: int = 3600, priority: Optional[int] = None) -> Dict[str, Any]:
-        raise ISPManagerError("Создание DNS-записи через классический API ISPmanager пока не реализовано")
+        params: Dict[str, Any] = {
+            "func": "domain.record.edit",
+            "sok": "ok",
+            "plid": domain_id,
+            "name": name,
+            "ttl": ttl,
+            "rtype": record_type.lower(),
+        }
+        params.update(_dns_record_value_params(record_type, value, priority))
+
+        doc = self._ensure_success(await self._request("GET", params=params))
+        rkey = doc.get("elid") or doc.get("rkey")
+        # Без rkey в ответе запись хранится без идентификатора: выдуманный
+        # ключ панель не примет при изменении и удалении
+        return {
+            "identifier": str(rkey) if rkey else None,
+            "doc": doc,
+        }
 
     async def create_site(self, *, account_id: str, root_path: str, domain: Optional[str] = None) -> Dict[str, Any]:
         raise ISPManagerError("Создание сайта через классический API ISPmanager пока не реализовано")
@@ -212,12 +349,97 @@ class ISPManagerClient:
     async def delete_domain(self, *, domain_id: str) -> Dict[str, Any]:
         raise ISPManagerError("Удаление домена через классический API ISPmanager пока не реализовано")
 
-    async def delete_dns_record(self, *, record_id: str) -> Dict[str, Any]:
-        raise ISPManagerError("Удаление DNS-записи через классический API ISPmanager пока не реализовано")
+    async def update_dns_record(self, *, domain_id: str, record_id: str, record_type: str, name: str, value: str, ttl: int = 3600, priority: Optional[int] = None) -> Dict[str, Any]:
+        params: Dict[str, Any] = {
+            "func": "domain.record.edit",
+            "sok": "ok",
+            "plid": domain_id,
+            "elid": record_id,
+            "name": name,
+            "ttl": ttl,
+            "rtype": record_type.lower(),
+        }
+        params.update(_dns_record_value_params(record_type, value, priority))
+
+        doc = self._ensure_success(await self._request("GET", params=params))
+        return {
+            "identifier": str(doc.get("elid") or doc.get("rkey") or record_id),
+            "doc": doc,
+        }
+
+    async def list_dns_records(self, *, domain_id: str) -> list[Dict[str, Any]]:
+        doc = self._ensure_success(await self._request("GET", params={"func": "domain.record", "elid": domain_id}))
+        return self._elements(doc)
+
+    async def delete_dns_record(self, *, record_id: str, domain_id: Optional[str] = None) -> Dict[str, Any]:
+        return await self.delete_dns_records(record_ids=[record_id], domain_id=domain_id)
+
+    async def delete_dns_records(self, *, record_ids: list[str], domain_id: Optional[str] = None) -> Dict[str, Any]:
+        # ISPmanager принимает несколько elid через ", " в одном вызове
+        params: Dict[str, Any] = {"func": "domain.record.delete", "elid": ", ".join(record_ids)}
+        if domain_id:
+            params["plid"] = domain_id
+        return self._ensure_success(await self._request("GET", params=params))
 
     async def delete_site(self, *, site_id: str) -> Dict[str, Any]:
         raise ISPManagerError("Удаление сайта через классический API ISPmanager пока не реализовано")
 
+    async def account_usage(self, *, account_id: str) -> Dict[str, float]:
+        """Диск, трафик и запросы аккаунта из статистики панели.
+
+        Вызовы выполняются от имени пользователя (su). Трафик и запросы —
+        накопительные счётчики текущего периода статистики панели.
+        """
+
+        async def elements(func: str) -> list[Dict[str, Any]]:
+            return self._elements(self._ensure_success(await self._request("GET", params={"func": func, "su": account_id})))
+
+        disk = await elements("diskusage")
+        traffic = await elements("user_traff_stat")
+        web = await elements("webdomain.stat")
+        return {
+            "disk_mb": sum(parse_size_mb(element.get("size")) or 0.0 for element in disk),
+            "traffic_mb": sum(parse_size_mb(element.get("traffic") or element.get("total")) or 0.0 for element in traffic),
+            "hits": float(sum(_parse_count(element.get("hits") or element.get("requests")) for element in web)),
+        }
+
+
+_SIZE_RE = re.compile(r"^\s*([0-9]+(?:[.,][0-9]+)?)\s*([KMGT]i?B?)?\s*$", re.IGNORECASE)
+_SIZE_UNITS_MB = {"K": 1 / 1024, "M": 1.0, "G": 1024.0, "T": 1024.0 * 1024}
+
+
+def parse_size_mb(value: object) -> Optional[float]:
+    """Размер из панели («512», «1.5 GiB», «300 MiB») в мегабайтах; без единиц — МБ."""
+
+    if value is None:
+        return None
+    match = _SIZE_RE.match(str(value))
+    if match is None:
+        return None
+    number = float(match.group(1).replace(",", "."))
+    unit = (match.group(2) or "M")[0].upper()
+    return number * _SIZE_UNITS_MB[unit]
+
+
+def _parse_count(value: object) -> int:
+    try:
+        return int(float(str(value).replace(" ", "").replace(",", ".")))
+    except ValueError:
+        return 0
+
+
+def _dns_record_value_params(record_type: str, value: str, priority: Optional[int]) -> Dict[str, Any]:
+    """Разложить значение записи по полям формы domain.record.edit."""
+
+    rtype = record_type.upper()
+    if rtype in {"A", "AAAA"}:
+        return {"ip": value}
+    if rtype == "MX":
+        return {"domain": value, "priority": priority if priority is not None else 10}
+    if rtype in {"CNAME", "NS", "PTR"}:
+        return {"domain": value}
+    return {"value": value}
+
 
 def extract_identifier(payload: Dict[str, Any], *candidate_keys: str) -> str:
     if not payload:
@@ -238,8 +460,3 @@ def extract_identifier(payload: Dict[str, Any], *candidate_keys: str) -> str:
             return str(payload[key])
 
     raise ISPManagerError("В ответе ISPmanager нет идентификатора", payload=payload)
-
-
-def get_isp_client() -> ISPManagerClient:
-    return ISPManagerClient()
-
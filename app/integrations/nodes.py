@@ -0,0 +1,163 @@
+"""Реестр узлов ISPmanager и выбор узла для нового аккаунта.
+
+Узлы описываются в isp_nodes; без них реестр состоит из одного узла
+isp_default_node с параметрами isp_api_base_url / isp_admin_*. Узел
+пользователя хранится в auth_users.isp_node (NULL — узел по умолчанию),
+и все вызовы по его объектам идут на этот узел.
+
+Размещение учитывает число аккаунтов на узле (считается по БД вызывающим
+кодом) и занятость диска, которую реестр берёт из списка пользователей
+панели. Список обходится постранично и на больших узлах стоит сотни
+вызовов, поэтому его обновляет фоновая задача run_node_stats_refresher
+раз в isp_node_stats_ttl секунд, а регистрация читает только кэш.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional
+
+from app.core.config import ISPNodeConfig, settings
+from app.integrations.ispmanager import ISPManagerClient, ISPManagerError, parse_size_mb
+
+logger = logging.getLogger("app.integrations.nodes")
+
+LEAST_LOADED = "least_loaded"
+WEIGHTED = "weighted"
+
+
+class NoNodeAvailable(ISPManagerError):
+    """Все узлы заполнены или закрыты для новых аккаунтов."""
+
+
+@dataclass
+class _DiskUsage:
+    used_gb: float
+    fetched_at: float
+
+
+class NodeRegistry:
+    def __init__(self, nodes: List[ISPNodeConfig], default: str):
+        if not nodes:
+            nodes = [
+                ISPNodeConfig(
+                    name=default,
+                    base_url=settings.isp_api_base_url,
+                    token=settings.isp_api_token,
+                    admin_login=settings.isp_admin_login,
+                    admin_password=settings.isp_admin_password,
+                )
+            ]
+        self.nodes: Dict[str, ISPNodeConfig] = {node.name: node for node in nodes}
+        self.default = default if default in self.nodes else nodes[0].name
+        self._disk: Dict[str, _DiskUsage] = {}
+        self._refresh_lock = asyncio.Lock()
+
+    def names(self) -> List[str]:
+        return list(self.nodes)
+
+    def tracks_disk(self) -> bool:
+        return any(config.disk_capacity_gb > 0 for config in self.nodes.values())
+
+    def resolve(self, node: Optional[str]) -> str:
+        return node or self.default
+
+    def client(self, node: Optional[str] = None) -> ISPManagerClient:
+        name = self.resolve(node)
+        config = self.nodes.get(name)
+        if config is None:
+            raise ISPManagerError(f"Узел ISPmanager {name} не настроен")
+        return ISPManagerClient(
+            base_url=config.base_url.rstrip("/"),
+            token=config.token,
+            node=name,
+            admin_login=config.admin_login,
+            admin_password=config.admin_password,
+        )
+
+    async def _fetch_disk_usage(self, name: str) -> float:
+        used_mb = 0.0
+        async for page in self.client(name).iter_list("user", page_size=settings.isp_reconcile_page_size):
+            for element in page:
+                used_mb += parse_size_mb(element.get("quota_used")) or 0.0
+        return used_mb / 1024
+
+    async def refresh_disk_usage(self) -> None:
+        """Обновить занятость диска узлов с заданной ёмкостью, если кэш устарел."""
+
+        async with self._refresh_lock:
+            now = time.monotonic()
+            stale = [
+                name
+                for name, config in self.nodes.items()
+                if config.disk_capacity_gb > 0
+                and (name not in self._disk or now - self._disk[name].fetched_at > settings.isp_node_stats_ttl)
+            ]
+            if not stale:
+                return
+            results = await asyncio.gather(*(self._fetch_disk_usage(name) for name in stale), return_exceptions=True)
+            for name, result in zip(stale, results):
+                if isinstance(result, BaseException):
+                    # Остаётся прежнее значение: узел не исключается из-за сбоя статистики
+                    logger.warning("Failed to refresh disk usage of ISP node %s: %s", name, result)
+                    continue
+                self._disk[name] = _DiskUsage(result, now)
+
+    def utilization(self, name: str, accounts: int) -> float:
+        """Доля заполнения узла по самому узкому ресурсу; 0 — ограничения не заданы."""
+
+        config = self.nodes[name]
+        load = 0.0
+        if config.max_accounts > 0:
+            load = accounts / config.max_accounts
+        disk = self._disk.get(name)
+        if config.disk_capacity_gb > 0 and disk is not None:
+            load = max(load, disk.used_gb / config.disk_capacity_gb)
+        return load
+
+    def choose(self, accounts: Mapping[str, int], strategy: Optional[str] = None) -> str:
+        """Выбрать узел для нового аккаунта по числу аккаунтов на узлах."""
+
+        candidates = []
+        for name, config in self.nodes.items():
+            if not config.accepts_new or config.weight <= 0:
+                continue
+            count = accounts.get(name, 0)
+            load = self.utilization(name, count)
+            if load >= 1.0:
+                continue
+            candidates.append((name, config.weight, count, load))
+        if not candidates:
+            raise NoNodeAvailable("Нет узлов ISPmanager со свободной ёмкостью", status_code=503)
+
+        if (strategy or settings.isp_placement) == WEIGHTED:
+            weights = [weight * (1.0 - load) for _, weight, _, load in candidates]
+            return random.choices([name for name, *_ in candidates], weights=weights)[0]
+        # Сначала по заполнению ёмкости, при равном — по аккаунтам на единицу веса
+        return min(candidates, key=lambda item: (item[3], item[2] / item[1]))[0]
+
+
+registry = NodeRegistry(settings.isp_nodes, settings.isp_default_node)
+
+
+async def run_node_stats_refresher() -> None:
+    """Фоновое обновление занятости дисков; запускается из lifespan, если у узлов задана ёмкость."""
+
+    while True:
+        try:
+            await registry.refresh_disk_usage()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("ISP node stats refresh failed")
+        await asyncio.sleep(max(1, settings.isp_node_stats_ttl))
+
+
+def get_isp_client(node: Optional[str] = None) -> ISPManagerClient:
+    """Клиент узла панели; None — узел по умолчанию (пользователи без isp_node)."""
+
+    return registry.client(node)
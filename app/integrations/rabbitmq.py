@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Sequence
+
+from app.core.config import settings
+
+
+logger = logging.getLogger("app.integrations.rabbitmq")
+
+
+class RabbitMQError(Exception):
+    """Исключение при публикации сообщений в RabbitMQ."""
+
+
+@dataclass(frozen=True)
+class OutgoingMessage:
+    message_id: str
+    routing_key: str
+    body: Dict[str, Any]
+    headers: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class RabbitMQPublisher:
+    """Публикатор с подтверждениями брокера (publisher confirms).
+
+    aio-pika импортируется лениво: без настроенного rabbitmq_host приложение
+    работает и без установленной библиотеки.
+    """
+
+    host: Optional[str] = settings.rabbitmq_host
+    port: int = settings.rabbitmq_port
+    user: Optional[str] = settings.rabbitmq_user
+    password: Optional[str] = settings.rabbitmq_password
+    exchange_name: str = settings.rabbitmq_exchange
+
+    def __post_init__(self) -> None:
+        self._connection = None
+        self._channel = None
+        self._exchange = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.host)
+
+    async def connect(self) -> None:
+        if self._exchange is not None:
+            return
+        if not self.configured:
+            raise RabbitMQError("Не задан rabbitmq_host")
+
+        try:
+            import aio_pika
+        except ImportError as exc:  # pragma: no cover - зависит от окружения
+            raise RabbitMQError("Для публикации событий установите aio-pika") from exc
+
+        self._connection = await aio_pika.connect_robust(
+            host=self.host,
+            port=self.port,
+            login=self.user or "guest",
+            password=self.password or "guest",
+        )
+        self._channel = await self._connection.channel(publisher_confirms=True)
+        self._exchange = await self._channel.declare_exchange(
+            self.exchange_name,
+            aio_pika.ExchangeType.TOPIC,
+            durable=True,
+        )
+        logger.info("Connected to RabbitMQ %s:%s, exchange %s", self.host, self.port, self.exchange_name)
+
+    async def publish_batch(self, messages: Sequence[OutgoingMessage]) -> None:
+        """Опубликовать пачку и дождаться подтверждения брокера для каждого сообщения."""
+
+        await self.connect()
+
+        import aio_pika
+
+        publishes = [
+            self._exchange.publish(
+                aio_pika.Message(
+                    body=json.dumps(message.body, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+                    message_id=message.message_id,
+                    content_type="application/json",
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                    headers=message.headers,
+                ),
+                routing_key=message.routing_key,
+            )
+            for message in messages
+        ]
+        # Публикации идут конвейером, подтверждения собираются все разом
+        results = await asyncio.gather(*publishes, return_exceptions=True)
+        failures = [result for result in results if isinstance(result, BaseException)]
+        if failures:
+            raise RabbitMQError(f"Брокер не подтвердил {len(failures)} из {len(messages)} сообщений") from failures[0]
+
+    async def close(self) -> None:
+        if self._connection is not None:
+            await self._connection.close()
+        self._connection = self._channel = self._exchange = None
@@ -0,0 +1,117 @@
+"""Справедливое распределение ёмкости ISPmanager между клиентами.
+
+У каждого тенанта (id пользователя) своя очередь; свободные слоты под
+общим лимитом раздаются по deficit round-robin с весами. Тенант, поставивший
+в очередь сотни вызовов, получает свою долю, но не задерживает вызовы
+остальных дольше одного круга.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Hashable, Mapping, Optional
+
+from app.core.metrics import ISP_SCHEDULER_QUEUED, ISP_SCHEDULER_QUEUE_WAIT, ISP_SCHEDULER_REJECTED
+
+
+class TenantQueueFull(Exception):
+    """Очередь тенанта заполнена — вызов отклонён без ожидания."""
+
+    def __init__(self, tenant: Hashable):
+        super().__init__(f"ISPmanager queue is full for tenant {tenant}")
+        self.tenant = tenant
+
+
+class FairScheduler:
+    """Deficit round-robin по тенантам под общим лимитом параллельных вызовов."""
+
+    def __init__(
+        self,
+        capacity: int,
+        *,
+        queue_limit: int,
+        weights: Optional[Mapping[str, int]] = None,
+    ):
+        self.capacity = max(1, capacity)
+        self.queue_limit = queue_limit
+        self.weights = dict(weights or {})
+        self.active = 0
+        self._queues: Dict[Hashable, Deque[asyncio.Future]] = {}
+        self._deficit: Dict[Hashable, float] = {}
+        self._ring: Deque[Hashable] = deque()
+
+    def queued(self, tenant: Optional[Hashable] = None) -> int:
+        if tenant is not None:
+            return len(self._queues.get(tenant, ()))
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _weight(self, tenant: Hashable) -> int:
+        return max(1, self.weights.get(str(tenant), 1))
+
+    async def acquire(self, tenant: Hashable) -> None:
+        started = time.perf_counter()
+        if self.active < self.capacity and not self._ring:
+            self.active += 1
+            ISP_SCHEDULER_QUEUE_WAIT.observe(0.0)
+            return
+
+        queue = self._queues.get(tenant)
+        if queue is None:
+            queue = self._queues[tenant] = deque()
+            self._deficit[tenant] = 0.0
+            self._ring.append(tenant)
+        if len(queue) >= self.queue_limit:
+            ISP_SCHEDULER_REJECTED.inc()
+            raise TenantQueueFull(tenant)
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        ISP_SCHEDULER_QUEUED.inc()
+        # Свободный слот мог остаться, если очереди в кольце состояли из отменённых ожиданий
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Слот уже выдан, но вызывающий отменён — вернуть его
+                self.release()
+            raise
+        finally:
+            ISP_SCHEDULER_QUEUED.dec()
+        ISP_SCHEDULER_QUEUE_WAIT.observe(time.perf_counter() - started)
+
+    def release(self) -> None:
+        self.active -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self.active < self.capacity and self._ring:
+            tenant = self._ring[0]
+            queue = self._queues[tenant]
+            while queue and queue[0].done():
+                queue.popleft()
+            if not queue:
+                self._ring.popleft()
+                del self._queues[tenant]
+                del self._deficit[tenant]
+                continue
+
+            if self._deficit[tenant] < 1:
+                self._deficit[tenant] += self._weight(tenant)
+            queue.popleft().set_result(None)
+            self.active += 1
+            self._deficit[tenant] -= 1
+            if self._deficit[tenant] < 1:
+                # Квант тенанта исчерпан — очередь следующего
+                self._ring.rotate(-1)
+
+    @asynccontextmanager
+    async def slot(self, tenant: Hashable) -> AsyncIterator[None]:
+        await self.acquire(tenant)
+        try:
+            yield
+        finally:
+            self.release()
@@ -1,39 +1,147 @@
+import asyncio
+import contextlib
 import logging
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import select
+from sqlalchemy.orm import configure_mappers, selectinload
 
 from app.core.config import settings
-from app.core.db import init_db
-from app.core.logging_config import setup_logging
+from app.core import db
+from app.core.logging_config import setup_logging, stats as logging_stats
+from app.core.loop_monitor import run_loop_monitor
+from app.core.metrics import render_metrics
+from app.core.readiness import StartupTimer, readiness
+from app.core.responses import DefaultJSONResponse
+from app.integrations import get_isp_client, isp_nodes
+from app.integrations.ispmanager import close_http_client
+from app.integrations.nodes import run_node_stats_refresher
+from app.middleware import (
+    AdmissionControlMiddleware,
+    DeadlineMiddleware,
+    HandlerSpanMiddleware,
+    IdempotencyMiddleware,
+    MetricsMiddleware,
+    ProfilingMiddleware,
+    TracingMiddleware,
+)
+from app.modules.admin.routes import router as admin_router
+from app.modules.auth.models import AuthUsers
 from app.modules.auth.routes import router as auth_router
+from app.modules.batch.routes import router as batch_router
+from app.modules.dashboard.routes import router as dashboard_router
+from app.modules.domains.models import Domain
 from app.modules.domains.routes import router as domains_router
+from app.modules.hosting.models import HostingSite
+from app.modules.hosting.deploy import close_deploy_pool, run_deploy_sweeper
 from app.modules.hosting.routes import router as hosting_router
+from app.modules.hosting.site_logs import close_site_logs_pool
+from app.modules.outbox.publisher import run_outbox_publisher
+from app.modules.reconciliation.worker import run_reconciliation_loop
+from app.modules.usage.collector import run_usage_collector
+from app.modules.usage.disk import run_disk_usage_scanner
+from app.modules.usage.routes import router as usage_router
 from app.modules.users.routes import router as users_router
 
 setup_logging()
 logger = logging.getLogger(__name__)
 
 
+# Запросы аутентификации и страниц ресурсов — готовятся на соединениях при прогреве
+WARMUP_STATEMENTS = (
+    select(AuthUsers).where(AuthUsers.id == 0),
+    select(AuthUsers).options(selectinload(AuthUsers.hosting_account)).where(AuthUsers.id == 0),
+    select(Domain).where(Domain.id == 0, Domain.user_id == 0),
+    select(HostingSite).where(HostingSite.id == 0, HostingSite.user_id == 0),
+)
+
+
+async def warm_up_isp(node: str) -> None:
+    try:
+        await get_isp_client(node).ping()
+    except Exception as exc:
+        logger.warning("ISPmanager warm-up of node %s failed: %s", node, exc)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Run lightweight startup tasks."""
-
-    logger.info("Running pending database migrations")
-    await init_db()
-    logger.info("Migrations completed")
+    """Startup tasks and graceful shutdown of background work and connections."""
+
+    timer = StartupTimer()
+    with timer.phase("migrations"):
+        logger.info("Running pending database migrations")
+        await db.init_db()
+        logger.info("Migrations completed")
+
+    with timer.phase("mappers"):
+        configure_mappers()
+    with timer.phase("db_pool"):
+        await db.warm_up_pool(settings.warmup_db_connections, WARMUP_STATEMENTS)
+    if settings.isp_enable_sync and settings.warmup_isp:
+        with timer.phase("isp"):
+            await asyncio.gather(*(warm_up_isp(node) for node in isp_nodes.names()))
+
+    readiness.add_check("db", db.ping)
+    if settings.isp_enable_sync:
+        for node in isp_nodes.names():
+            readiness.add_check(f"isp:{node}", get_isp_client(node).ping, critical=settings.readiness_isp_critical)
+    with timer.phase("readiness"):
+        await readiness.run_checks()
+    readiness.started = True
+
+    background_tasks: list[asyncio.Task] = [asyncio.create_task(readiness.run())]
+    if settings.loop_monitor_enabled:
+        background_tasks.append(asyncio.create_task(run_loop_monitor()))
+    if settings.isp_enable_sync and settings.isp_reconcile_interval > 0:
+        background_tasks.append(asyncio.create_task(run_reconciliation_loop()))
+    if settings.isp_enable_sync and isp_nodes.tracks_disk():
+        background_tasks.append(asyncio.create_task(run_node_stats_refresher()))
+    if settings.isp_enable_sync and settings.usage_collect_interval > 0:
+        background_tasks.append(asyncio.create_task(run_usage_collector()))
+    if settings.usage_disk_scan_interval > 0:
+        background_tasks.append(asyncio.create_task(run_disk_usage_scanner()))
+    if settings.rabbitmq_host:
+        background_tasks.append(asyncio.create_task(run_outbox_publisher()))
+    if settings.deploy_sweep_interval > 0:
+        background_tasks.append(asyncio.create_task(run_deploy_sweeper()))
+    timer.report()
 
     yield
 
+    # Сюда uvicorn приходит после того, как текущие запросы завершились; draining
+    # выставлен ещё при сигнале (server._WorkerServer.handle_exit)
+    logger.info("Shutting down")
+    readiness.draining = True
+    for task in background_tasks:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    await close_deploy_pool(settings.server_graceful_timeout)
+    close_site_logs_pool()
+    await close_http_client()
+    await db.engine.dispose()
+    logger.info("Shutdown complete")
+
 
 app = FastAPI(
     title=settings.api_title,
     version=settings.api_version,
     lifespan=lifespan,
+    default_response_class=DefaultJSONResponse,
 )
 
 
+# Добавляются раньше CORS, чтобы повторно отданные ответы, 503 и 504 тоже
+# получали CORS-заголовки; допуск проверяется до создания задачи обработчика
+# и захвата Idempotency-Key
+app.add_middleware(HandlerSpanMiddleware)
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(AdmissionControlMiddleware)
+
+
 origins = ["*"] if settings.frontend_allow_all_origins else settings.frontend_origins
 
 app.add_middleware(
@@ -41,16 +149,25 @@ app.add_middleware(
     allow_origins=origins,
     allow_credentials=not settings.frontend_allow_all_origins,
     allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
-    allow_headers=["Authorization", "Content-Type", "Accept", "Origin", "X-Requested-With"],
-    expose_headers=["X-Total-Count"],
+    allow_headers=["Authorization", "Content-Type", "Accept", "Origin", "X-Requested-With", "If-None-Match", "Idempotency-Key", "traceparent", "X-Profile", "X-Request-Timeout"],
+    expose_headers=["X-Total-Count", "ETag", "Idempotent-Replayed", "X-Trace-Id"],
     max_age=86400,
 )
 
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(TracingMiddleware)
+# Самый внешний слой: время считается с учётом всех остальных middleware
+app.add_middleware(MetricsMiddleware)
+
 
 app.include_router(auth_router, tags=["Авторизация"])
 app.include_router(users_router, tags=["Пользователи"])
 app.include_router(domains_router, tags=["Домены"])
 app.include_router(hosting_router, tags=["Хостинг"])
+app.include_router(usage_router, tags=["Хостинг"])
+app.include_router(dashboard_router, tags=["Дашборд"])
+app.include_router(batch_router, tags=["Пакетные запросы"])
+app.include_router(admin_router, tags=["Администрирование"])
 
 
 @app.get("/")
@@ -68,4 +185,19 @@ async def health_check() -> dict[str, str]:
     return {
         "status": "ok",
         "api_version": settings.api_version,
-    }
\ No newline at end of file
+    }
+
+
+@app.get("/health/ready")
+async def readiness_check() -> Response:
+    """Готовность воркера для балансировщика: последний результат фоновых проверок."""
+
+    ready, body = readiness.snapshot()
+    return DefaultJSONResponse(body, status_code=200 if ready else 503)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    logging_stats.publish()
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -2,6 +2,11 @@
 Middleware для приложения
 """
 
-from .security import SecurityMiddleware, InputSanitizationMiddleware, SecurityLogger
+from .admission import AdmissionControlMiddleware
+from .deadline import DeadlineMiddleware
+from .idempotency import IdempotencyMiddleware
+from .metrics import MetricsMiddleware
+from .profiling import ProfilingMiddleware
+from .tracing import HandlerSpanMiddleware, TracingMiddleware
 
-__all__ = ['SecurityMiddleware', 'InputSanitizationMiddleware', 'SecurityLogger'] 
\ No newline at end of file
+__all__ = ['AdmissionControlMiddleware', 'DeadlineMiddleware', 'HandlerSpanMiddleware', 'IdempotencyMiddleware', 'MetricsMiddleware', 'ProfilingMiddleware', 'TracingMiddleware']
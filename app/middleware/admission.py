@@ -0,0 +1,165 @@
+"""Контроль допуска запросов при перегрузке.
+
+Запрос относится к классу маршрута (health, read, auth, provisioning).
+Долгие потоки и загрузки — SSE логов сайта, потоковые выгрузки и загрузки
+тела частями — считаются в отдельном классе stream: иначе несколько
+подписчиков на минуты занимали бы все слоты read или provisioning.
+Отказ 503 с Retry-After выдаётся сразу, до аутентификации и обращения к
+БД, если:
+
+- в классе уже admission_max_in_flight[класс] выполняющихся запросов;
+- давление (lag event loop или ожидание соединения из пула относительно
+  порогов) достигло уровня, при котором класс отбрасывается:
+  provisioning — с 1, auth и stream — с 2, read — с 4. Health не
+  отбрасывается.
+
+Слоты общие для воркера: подзапросы POST /batch занимают их через admit и
+release так же, как отдельные запросы, а сам пакет слот не занимает.
+"""
+
+import json
+import math
+import re
+from typing import Dict, Tuple
+from urllib.parse import parse_qs
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.db import pool_wait
+from app.core.loop_monitor import current_lag
+from app.core.metrics import ADMISSION_IN_FLIGHT, ADMISSION_REJECTED
+
+HEALTH = "health"
+READ = "read"
+AUTH = "auth"
+PROVISIONING = "provisioning"
+STREAM = "stream"
+
+HEALTH_PATHS = {"/", "/health", "/health/ready", "/metrics"}
+# Пакет не занимает слот: его занимает каждый подзапрос
+BATCH_PATHS = {"/batch"}
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Маршруты, читающие большое тело потоком
+UPLOAD_ROUTES = (
+    ("PATCH", re.compile(r"^/hosting/sites/[^/]+/deploy/[^/]+$")),
+    ("POST", re.compile(r"^/domains/[^/]+/dns/import$")),
+)
+# Потоковые ответы: выгрузки целиком и SSE логов сайта (с follow=true)
+EXPORT_ROUTES = (
+    ("GET", re.compile(r"^/domains/export$")),
+    ("GET", re.compile(r"^/domains/[^/]+/dns/export$")),
+)
+_SITE_LOGS_RE = re.compile(r"^/hosting/sites/[^/]+/logs$")
+
+# Уровень давления, начиная с которого класс отбрасывается
+SHED_PRESSURE: Dict[str, float] = {PROVISIONING: 1.0, AUTH: 2.0, STREAM: 2.0, READ: 4.0}
+
+_REJECT_BODY = json.dumps({"detail": "Сервис перегружен, повторите запрос позже"}, ensure_ascii=False).encode("utf-8")
+
+
+def route_class(method: str, path: str) -> str:
+    if path in HEALTH_PATHS:
+        return HEALTH
+    if path.startswith("/auth/"):
+        return AUTH
+    if method in READ_METHODS:
+        return READ
+    return PROVISIONING
+
+
+def _matches(routes, method: str, path: str) -> bool:
+    return any(method == route_method and pattern.match(path) for route_method, pattern in routes)
+
+
+def admission_class(method: str, path: str, query_string: bytes = b"") -> str:
+    """Класс для лимита параллельности: как route_class, но долгие потоки — в stream."""
+
+    if _matches(UPLOAD_ROUTES, method, path) or _matches(EXPORT_ROUTES, method, path):
+        return STREAM
+    if method == "GET" and _SITE_LOGS_RE.match(path):
+        follow = parse_qs(query_string.decode("latin-1")).get("follow", [""])[-1]
+        if follow.lower() in ("1", "true", "yes", "on"):
+            return STREAM
+    return route_class(method, path)
+
+
+def current_pressure() -> float:
+    """Нагрузка относительно порогов: 1.0 — порог достигнут."""
+
+    lag_pressure = current_lag() / settings.admission_lag_threshold if settings.admission_lag_threshold > 0 else 0.0
+    pool_pressure = (
+        pool_wait.average() / settings.admission_pool_wait_threshold
+        if settings.admission_pool_wait_threshold > 0
+        else 0.0
+    )
+    return max(lag_pressure, pool_pressure)
+
+
+_in_flight: Dict[str, int] = {READ: 0, AUTH: 0, PROVISIONING: 0, STREAM: 0}
+
+
+def admit(request_class: str, *, count: bool = True) -> Tuple[bool, str, float]:
+    """Решение о допуске; при допуске с count занимает слот класса до release."""
+
+    limit = settings.admission_max_in_flight.get(request_class)
+    if count and limit is not None and _in_flight[request_class] >= limit:
+        return False, "concurrency", 1.0
+    pressure = current_pressure()
+    if pressure >= SHED_PRESSURE[request_class]:
+        return False, "overload", pressure
+    if count:
+        _in_flight[request_class] += 1
+        ADMISSION_IN_FLIGHT.labels(request_class).inc()
+    return True, "", pressure
+
+
+def release(request_class: str) -> None:
+    _in_flight[request_class] -= 1
+    ADMISSION_IN_FLIGHT.labels(request_class).dec()
+
+
+def retry_after(pressure: float) -> int:
+    return min(60, settings.admission_retry_after * max(1, math.ceil(pressure)))
+
+
+class AdmissionControlMiddleware:
+    """Чистое ASGI-middleware; счётчики живут в памяти воркера."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.admission_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        request_class = admission_class(scope["method"], scope["path"], scope.get("query_string", b""))
+        if request_class == HEALTH:
+            await self.app(scope, receive, send)
+            return
+
+        counted = scope["path"] not in BATCH_PATHS
+        admitted, reason, pressure = admit(request_class, count=counted)
+        if not admitted:
+            ADMISSION_REJECTED.labels(request_class, reason).inc()
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 503,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"content-length", str(len(_REJECT_BODY)).encode("latin-1")),
+                        (b"retry-after", str(retry_after(pressure)).encode("latin-1")),
+                    ],
+                }
+            )
+            await send({"type": "http.response.body", "body": _REJECT_BODY})
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if counted:
+                release(request_class)
@@ -0,0 +1,165 @@
+"""Срок выполнения запроса и отмена обработчика при отключении клиента."""
+
+import asyncio
+import json
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import deadline, loop_monitor, tracing
+from app.core.config import settings
+from app.middleware.admission import UPLOAD_ROUTES, route_class
+
+TIMEOUT_HEADER = b"x-request-timeout"
+
+# Загрузки (admission.UPLOAD_ROUTES): медленный, но живой канал не должен получать 504
+UPLOAD = "upload"
+
+_TIMEOUT_BODY = json.dumps({"detail": "Превышено время выполнения запроса"}, ensure_ascii=False).encode("utf-8")
+
+
+def deadline_class(method: str, path: str) -> str:
+    """Класс срока: загрузки выделены из provisioning, остальное — как у допуска."""
+
+    for upload_method, pattern in UPLOAD_ROUTES:
+        if method == upload_method and pattern.match(path):
+            return UPLOAD
+    return route_class(method, path)
+
+
+def _request_timeout(scope: Scope) -> float:
+    request_class = deadline_class(scope["method"], scope["path"])
+    timeout = settings.request_timeouts.get(request_class, settings.request_timeout_max)
+    # Для загрузок верхняя граница заголовка — их собственный срок, если он больше request_timeout_max
+    limit = max(timeout, settings.request_timeout_max) if request_class == UPLOAD else settings.request_timeout_max
+    for name, value in scope["headers"]:
+        if name == TIMEOUT_HEADER:
+            try:
+                timeout = float(value)
+            except ValueError:
+                pass
+            break
+    return min(max(timeout, 0.1), limit)
+
+
+def _has_body(scope: Scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"transfer-encoding":
+            return True
+        if name == b"content-length":
+            return value.strip() not in (b"", b"0")
+    return False
+
+
+class _ReceiveProxy:
+    """Единственный читатель receive после окончания тела запроса.
+
+    Пока обработчик читает тело, сообщения идут напрямую. Затем receive
+    слушает фоновая задача: http.disconnect отменяет обработчик, а сам
+    обработчик получает сообщения из очереди — два конкурентных вызова
+    receive сервера никогда не происходят.
+    """
+
+    def __init__(self, receive: Receive, body_pending: bool):
+        self._receive = receive
+        self.body_done = asyncio.Event()
+        if not body_pending:
+            self.body_done.set()
+        self.inbox: asyncio.Queue = asyncio.Queue()
+
+    async def receive(self) -> Message:
+        if self.body_done.is_set():
+            return await self.inbox.get()
+        message = await self._receive()
+        if message["type"] != "http.request" or not message.get("more_body", False):
+            self.body_done.set()
+        return message
+
+    async def wait_for_disconnect(self) -> None:
+        await self.body_done.wait()
+        while True:
+            message = await self._receive()
+            self.inbox.put_nowait(message)
+            if message["type"] == "http.disconnect":
+                return
+
+
+class DeadlineMiddleware:
+    """Срок по классу маршрута (или заголовку X-Request-Timeout) в contextvar.
+
+    Срок ограничивает работу до начала ответа: если он истёк раньше, обработчик
+    отменяется и клиент получает 504. После начала ответа (потоковый экспорт)
+    срок снимается, и отменить обработчик может только отключение клиента.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timeout = _request_timeout(scope)
+        proxy = _ReceiveProxy(receive, _has_body(scope))
+        response_started = False
+        response_complete = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started, response_complete
+            if message["type"] == "http.response.start":
+                response_started = True
+                # Выполняется в контексте обработчика: дальше срок не действует
+                deadline.request_deadline.set(None)
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_complete = True
+            await send(message)
+
+        async def run_handler() -> None:
+            deadline.request_deadline.set(time.monotonic() + timeout)
+            tracked = loop_monitor.track_request(f"{scope['method']} {scope['path']}", tracing.get_trace_id() or "-")
+            try:
+                await self.app(scope, proxy.receive, send_wrapper)
+            finally:
+                loop_monitor.untrack_request(tracked)
+
+        handler = asyncio.create_task(run_handler())
+        watcher = asyncio.create_task(proxy.wait_for_disconnect())
+        try:
+            done, _ = await asyncio.wait({handler, watcher}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done and response_started:
+                # Потоковый ответ уже идёт: ждём его окончания или отключения
+                done, _ = await asyncio.wait({handler, watcher}, return_when=asyncio.FIRST_COMPLETED)
+
+            if handler in done:
+                handler.result()
+                return
+            if response_complete:
+                # Ответ отдан целиком, дальше выполняются фоновые задачи — их не прерываем
+                await handler
+                return
+
+            timed_out = watcher not in done
+            handler.cancel()
+            await asyncio.gather(handler, return_exceptions=True)
+            if timed_out and not response_started:
+                await self._send_timeout(send)
+        finally:
+            watcher.cancel()
+            if not handler.done():
+                handler.cancel()
+
+    @staticmethod
+    async def _send_timeout(send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 504,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(_TIMEOUT_BODY)).encode("latin-1")),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": _TIMEOUT_BODY})
+
@@ -0,0 +1,344 @@
+"""Поддержка заголовка Idempotency-Key для POST-запросов, создающих ресурсы.
+
+Первый запрос с ключом захватывает строку idempotency_keys, выполняется и
+сохраняет итоговый ответ. Повтор с тем же ключом получает сохранённый ответ
+(из LRU-кеша процесса или одним поиском по первичному ключу), а дубликат,
+пришедший во время выполнения оригинала, дожидается его завершения.
+Ответы 5xx не сохраняются: ключ освобождается для повторной попытки.
+
+Ключи живут в пространстве пользователя из sub access-токена: повтор с
+обновлённым токеном находит тот же ключ. Запросы без токена (регистрация)
+разделяются по ключу вместе с отпечатком тела, а не делят одно общее
+пространство.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.db import engine
+from app.modules.security.security import verify_token
+
+logger = logging.getLogger(__name__)
+
+HEADER_NAME = b"idempotency-key"
+REPLAY_HEADER = (b"idempotent-replayed", b"true")
+MAX_KEY_LENGTH = 255
+
+_CLAIM_QUERY = text(
+    """
+    INSERT INTO idempotency_keys (scope, key, fingerprint, status, locked_until, expires_at)
+    VALUES (
+        :scope, :key, :fingerprint, 'in_progress',
+        NOW() + make_interval(secs => :lock_seconds),
+        NOW() + make_interval(secs => :ttl_seconds)
+    )
+    ON CONFLICT (scope, key) DO UPDATE SET
+        fingerprint = EXCLUDED.fingerprint,
+        status = 'in_progress',
+        response_status = NULL,
+        response_headers = NULL,
+        response_body = NULL,
+        created_at = NOW(),
+        locked_until = EXCLUDED.locked_until,
+        expires_at = EXCLUDED.expires_at
+    WHERE idempotency_keys.expires_at < NOW()
+       OR (idempotency_keys.status = 'in_progress' AND idempotency_keys.locked_until < NOW())
+    RETURNING key
+    """
+)
+_FETCH_QUERY = text(
+    """
+    SELECT fingerprint, status, response_status, response_headers, response_body,
+           EXTRACT(EPOCH FROM expires_at - NOW()) AS ttl_left
+    FROM idempotency_keys
+    WHERE scope = :scope AND key = :key
+    """
+)
+_COMPLETE_QUERY = text(
+    """
+    UPDATE idempotency_keys
+    SET status = 'completed', response_status = :status, response_headers = CAST(:headers AS JSONB), response_body = :body
+    WHERE scope = :scope AND key = :key
+    """
+)
+_RELEASE_QUERY = text("DELETE FROM idempotency_keys WHERE scope = :scope AND key = :key AND status = 'in_progress'")
+_PURGE_QUERY = text(
+    """
+    DELETE FROM idempotency_keys
+    WHERE ctid IN (SELECT ctid FROM idempotency_keys WHERE expires_at < NOW() LIMIT 1000)
+    """
+)
+PURGE_INTERVAL = 3600.0
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    fingerprint: str
+    status: int
+    headers: List[Tuple[str, str]]
+    body: bytes
+
+
+class _ResponseCache:
+    """Небольшой LRU завершённых ответов перед таблицей; запись живёт не дольше строки."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._items: "OrderedDict[Tuple[str, str], Tuple[float, StoredResponse]]" = OrderedDict()
+
+    def get(self, cache_key: Tuple[str, str]) -> Optional[StoredResponse]:
+        item = self._items.get(cache_key)
+        if item is None:
+            return None
+        expires_at, stored = item
+        if time.monotonic() >= expires_at:
+            del self._items[cache_key]
+            return None
+        self._items.move_to_end(cache_key)
+        return stored
+
+    def put(self, cache_key: Tuple[str, str], stored: StoredResponse, ttl: float) -> None:
+        if self.capacity <= 0 or ttl <= 0:
+            return
+        self._items[cache_key] = (time.monotonic() + ttl, stored)
+        self._items.move_to_end(cache_key)
+        while len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+
+
+def _plain_response(status: int, detail: str) -> StoredResponse:
+    body = json.dumps({"detail": detail}, ensure_ascii=False).encode("utf-8")
+    return StoredResponse("", status, [("content-type", "application/json")], body)
+
+
+def _client_scope(authorization: bytes, fingerprint: str) -> str:
+    """Пространство ключей клиента: id пользователя, а не сам токен, который истекает."""
+
+    if not authorization:
+        return f"anon:{fingerprint[:32]}"
+    scheme, _, token = authorization.decode("latin-1").partition(" ")
+    token_data = verify_token(token.strip(), "access") if scheme.lower() == "bearer" else None
+    if token_data is not None:
+        return f"user:{token_data['user_id']}"
+    # Недействительный токен получит 401, но и его ключи не смешиваются с чужими
+    return f"token:{hashlib.sha256(authorization).hexdigest()[:32]}"
+
+
+class IdempotencyMiddleware:
+    """Чистое ASGI-middleware; включается только для путей из idempotency_paths."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.paths = set(settings.idempotency_paths)
+        self.cache = _ResponseCache(settings.idempotency_cache_size)
+        self._inflight: Dict[Tuple[str, str], asyncio.Event] = {}
+        self._next_purge = 0.0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        raw_key = headers.get(HEADER_NAME)
+        if not raw_key:
+            await self.app(scope, receive, send)
+            return
+
+        key = raw_key.decode("latin-1").strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await self._send_stored(send, _plain_response(400, "Некорректный Idempotency-Key"), replayed=False)
+            return
+
+        messages: List[Message] = []
+        body_hash = hashlib.sha256()
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            body_hash.update(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+
+        fingerprint = hashlib.sha256(
+            b"\x1f".join((scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""), body_hash.digest()))
+        ).hexdigest()
+        cache_key = (_client_scope(headers.get(b"authorization", b""), fingerprint), key)
+
+        stored = await self._wait_for_result(cache_key, fingerprint)
+        if stored is not None:
+            await self._replay(send, stored, fingerprint)
+            return
+
+        await self._run_original(scope, messages, receive, send, cache_key, fingerprint)
+        await self._maybe_purge()
+
+    async def _wait_for_result(self, cache_key: Tuple[str, str], fingerprint: str) -> Optional[StoredResponse]:
+        """Захватить ключ (None) или дождаться и вернуть сохранённый ответ."""
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.idempotency_wait_timeout
+        scope_value, key = cache_key
+
+        while True:
+            stored = self.cache.get(cache_key)
+            if stored is not None:
+                return stored
+
+            event = self._inflight.get(cache_key)
+            if event is not None:
+                # Оригинал выполняется в этом же процессе — ждём без опроса БД
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return _plain_response(409, "Запрос с этим Idempotency-Key ещё выполняется")
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    return _plain_response(409, "Запрос с этим Idempotency-Key ещё выполняется")
+                continue
+
+            row = None
+            async with engine.begin() as conn:
+                result = await conn.execute(
+                    _CLAIM_QUERY,
+                    {
+                        "scope": scope_value,
+                        "key": key,
+                        "fingerprint": fingerprint,
+                        "lock_seconds": settings.idempotency_lock_timeout,
+                        "ttl_seconds": settings.idempotency_ttl,
+                    },
+                )
+                claimed = result.first() is not None
+                if not claimed:
+                    row = (await conn.execute(_FETCH_QUERY, {"scope": scope_value, "key": key})).first()
+
+            if claimed:
+                # Событие появляется только после фиксации захвата: при откате не остаётся
+                # события, которое никто не установит
+                self._inflight[cache_key] = asyncio.Event()
+                return None
+
+            if row is not None and row.status == "completed":
+                stored = StoredResponse(
+                    fingerprint=row.fingerprint,
+                    status=row.response_status,
+                    headers=[tuple(pair) for pair in row.response_headers or []],
+                    body=bytes(row.response_body or b""),
+                )
+                self.cache.put(cache_key, stored, float(row.ttl_left or 0))
+                return stored
+
+            # Оригинал выполняется в другом процессе (или строку только что освободили)
+            if loop.time() >= deadline:
+                return _plain_response(409, "Запрос с этим Idempotency-Key ещё выполняется")
+            await asyncio.sleep(settings.idempotency_poll_interval)
+
+    async def _maybe_purge(self) -> None:
+        """Просроченные ключи чистим попутно, небольшими порциями и отдельной транзакцией."""
+
+        loop = asyncio.get_running_loop()
+        if loop.time() < self._next_purge:
+            return
+        self._next_purge = loop.time() + PURGE_INTERVAL
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(_PURGE_QUERY)
+        except Exception:
+            logger.exception("Failed to purge expired idempotency keys")
+
+    async def _run_original(
+        self,
+        scope: Scope,
+        messages: List[Message],
+        receive: Receive,
+        send: Send,
+        cache_key: Tuple[str, str],
+        fingerprint: str,
+    ) -> None:
+        pending = list(messages)
+
+        async def replay_receive() -> Message:
+            if pending:
+                return pending.pop(0)
+            return await receive()
+
+        status = 500
+        response_headers: List[Tuple[str, str]] = []
+        chunks: List[bytes] = []
+
+        async def capture_send(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers.extend(
+                    (name.decode("latin-1"), value.decode("latin-1")) for name, value in message.get("headers", [])
+                )
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        scope_value, key = cache_key
+        # Строка живёт idempotency_ttl от захвата, сделанного перед вызовом
+        expires_at = time.monotonic() + settings.idempotency_ttl
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        finally:
+            stored = StoredResponse(fingerprint, status, response_headers, b"".join(chunks))
+            try:
+                async with engine.begin() as conn:
+                    if status < 500:
+                        await conn.execute(
+                            _COMPLETE_QUERY,
+                            {
+                                "scope": scope_value,
+                                "key": key,
+                                "status": status,
+                                "headers": json.dumps(response_headers),
+                                "body": stored.body,
+                            },
+                        )
+                    else:
+                        await conn.execute(_RELEASE_QUERY, {"scope": scope_value, "key": key})
+            except Exception:
+                logger.exception("Failed to persist idempotent response for key %s", key)
+            else:
+                if status < 500:
+                    self.cache.put(cache_key, stored, expires_at - time.monotonic())
+            event = self._inflight.pop(cache_key, None)
+            if event is not None:
+                event.set()
+
+    async def _replay(self, send: Send, stored: StoredResponse, fingerprint: str) -> None:
+        if stored.fingerprint and stored.fingerprint != fingerprint:
+            await self._send_stored(
+                send,
+                _plain_response(422, "Idempotency-Key уже использован с другим запросом"),
+                replayed=False,
+            )
+            return
+        await self._send_stored(send, stored, replayed=bool(stored.fingerprint))
+
+    @staticmethod
+    async def _send_stored(send: Send, stored: StoredResponse, *, replayed: bool) -> None:
+        headers = [
+            (name.encode("latin-1"), value.encode("latin-1"))
+            for name, value in stored.headers
+            if name.lower() != "content-length"
+        ]
+        headers.append((b"content-length", str(len(stored.body)).encode("latin-1")))
+        if replayed:
+            headers.append(REPLAY_HEADER)
+        await send({"type": "http.response.start", "status": stored.status, "headers": headers})
+        await send({"type": "http.response.body", "body": stored.body})
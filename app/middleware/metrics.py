@@ -0,0 +1,37 @@
+"""Гистограмма длительности HTTP-запросов по шаблону маршрута и статусу."""
+
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import HTTP_REQUEST_DURATION
+from app.middleware.routing import RouteTemplateResolver
+
+
+class MetricsMiddleware:
+    """Чистое ASGI-middleware: без BaseHTTPMiddleware и лишних задач на запрос."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.route_template = RouteTemplateResolver()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_DURATION.labels(scope["method"], self.route_template(scope), str(status_code)).observe(
+                time.perf_counter() - started
+            )
@@ -0,0 +1,54 @@
+"""Профиль одного запроса по заголовку X-Profile с подписанным токеном."""
+
+import asyncio
+import logging
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import profiling
+
+logger = logging.getLogger("app.core.profiling")
+
+PROFILE_FILE_HEADER = b"x-profile-file"
+
+
+class ProfilingMiddleware:
+    """Без заголовка стоит одного прохода по заголовкам запроса.
+
+    Токен выдаёт POST /admin/profiling/token; если в воркере уже работает
+    профилировщик, запрос выполняется без профилирования.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = None
+        for name, value in scope["headers"]:
+            if name == profiling.PROFILE_HEADER:
+                token = value.decode("latin-1")
+                break
+
+        if token is None or not profiling.verify_profile_token(token) or not profiling.acquire_profiler():
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            request_profile = profiling.RequestProfile(f"{scope['method']}_{scope['path']}")
+            file_name = request_profile.path.name.encode("latin-1")
+
+            async def send_wrapper(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    message["headers"] = list(message.get("headers", [])) + [(PROFILE_FILE_HEADER, file_name)]
+                await send(message)
+
+            with request_profile:
+                await self.app(scope, receive, send_wrapper)
+            path = await asyncio.to_thread(request_profile.write)
+            logger.info("Request profile written to %s", path)
+        finally:
+            profiling.release_profiler()
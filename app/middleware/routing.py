@@ -0,0 +1,37 @@
+"""Определение шаблона маршрута для меток метрик и имён спанов."""
+
+from typing import Dict
+
+from starlette.routing import BaseRoute
+from starlette.types import Scope
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+class RouteTemplateResolver:
+    """Шаблон маршрута по endpoint, который роутер Starlette кладёт в scope.
+
+    Метки не зависят от значений path-параметров; запросы без маршрута
+    сводятся к одной метке UNMATCHED_ROUTE.
+    """
+
+    def __init__(self) -> None:
+        self._templates: Dict[object, str] = {}
+
+    def __call__(self, scope: Scope) -> str:
+        route = scope.get("route")
+        if isinstance(route, BaseRoute):
+            return getattr(route, "path", UNMATCHED_ROUTE)
+
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        template = self._templates.get(endpoint)
+        if template is None:
+            template = UNMATCHED_ROUTE
+            for candidate in scope["app"].routes:
+                if getattr(candidate, "endpoint", None) is endpoint:
+                    template = getattr(candidate, "path", UNMATCHED_ROUTE)
+                    break
+            self._templates[endpoint] = template
+        return template
@@ -0,0 +1,101 @@
+"""Корневой спан запроса, спан обработчика и заголовок X-Trace-Id в ответе."""
+
+import re
+from typing import Optional, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import loop_monitor, tracing
+from app.middleware.routing import RouteTemplateResolver
+
+TRACE_HEADER = b"x-trace-id"
+# W3C traceparent: версия-trace_id-parent_id-флаги
+_TRACEPARENT_RE = re.compile(rb"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+def _parse_traceparent(value: Optional[bytes]) -> Tuple[Optional[str], Optional[str], bool]:
+    if not value:
+        return None, None, False
+    match = _TRACEPARENT_RE.match(value.strip().lower())
+    if match is None:
+        return None, None, False
+    trace_id, parent_id, flags = (group.decode("ascii") for group in match.groups())
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+class TracingMiddleware:
+    """Открывает трассу на каждый HTTP-запрос.
+
+    Решение о сэмплировании принимается здесь один раз: входящий traceparent
+    с флагом sampled принудительно включает запись спанов.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.route_template = RouteTemplateResolver()
+        tracing.configure_exporters()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value
+                break
+        trace_id, parent_id, parent_sampled = _parse_traceparent(traceparent)
+
+        trace = tracing.Trace(
+            trace_id=trace_id or tracing.new_trace_id(),
+            sampled=parent_sampled or tracing.should_sample(),
+        )
+        trace_token = tracing.current_trace.set(trace)
+        root = tracing.start_span("http.request", method=scope["method"], path=scope["path"])
+        if root is not None:
+            root.parent_id = parent_id
+        span_token = tracing.current_span.set(root)
+        header_value = trace.trace_id.encode("ascii")
+        tracked_task = loop_monitor.track_request(f"{scope['method']} {scope['path']}", trace.trace_id)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(TRACE_HEADER, header_value)]
+                if root is not None:
+                    root.set(status=message["status"])
+            await send(message)
+
+        error: Optional[BaseException] = None
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            loop_monitor.untrack_request(tracked_task)
+            tracing.current_span.reset(span_token)
+            tracing.current_trace.reset(trace_token)
+            if root is not None:
+                root.name = f"{scope['method']} {self.route_template(scope)}"
+                tracing.finish_span(root, error)
+                tracing.export_trace(trace)
+
+
+class HandlerSpanMiddleware:
+    """Спан handler вокруг роутера: отделяет время обработчика от middleware.
+
+    Добавляется самым внутренним, поэтому ответы, отданные middleware без
+    вызова обработчика (503 допуска, повтор по Idempotency-Key), спана не имеют.
+    Запросы к БД из обработчика становятся его потомками.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with tracing.span("handler"):
+            await self.app(scope, receive, send)
@@ -0,0 +1,23 @@
+-- Fingerprints and drift reports for ISPmanager reconciliation
+
+CREATE TABLE IF NOT EXISTS isp_object_fingerprints (
+    kind VARCHAR(32) NOT NULL,
+    isp_id VARCHAR(128) NOT NULL,
+    fingerprint CHAR(32) NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (kind, isp_id)
+);
+
+CREATE TABLE IF NOT EXISTS isp_drift_reports (
+    id SERIAL PRIMARY KEY,
+    kind VARCHAR(32) NOT NULL,
+    isp_id VARCHAR(128) NOT NULL,
+    drift_type VARCHAR(32) NOT NULL,
+    details JSONB,
+    detected_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    resolved_at TIMESTAMPTZ
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_isp_drift_reports_open
+    ON isp_drift_reports (kind, isp_id, drift_type)
+    WHERE resolved_at IS NULL;
@@ -0,0 +1,99 @@
+-- Per-tenant change counters for ETag / conditional GET
+
+CREATE TABLE IF NOT EXISTS tenant_versions (
+    user_id INTEGER NOT NULL REFERENCES auth_users (id) ON DELETE CASCADE,
+    resource VARCHAR(32) NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, resource)
+);
+
+-- TG_ARGV[0] - resource, TG_ARGV[1] - query selecting owner_id from $rows
+-- (the transition table of the statement). Statement-level triggers bump
+-- each affected tenant once per statement, so a COPY of thousands of
+-- rows costs a single counter update.
+CREATE OR REPLACE FUNCTION bump_tenant_version() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    source_rows TEXT := CASE WHEN TG_OP = 'DELETE' THEN 'old_rows' ELSE 'new_rows' END;
+BEGIN
+    EXECUTE format(
+        'INSERT INTO tenant_versions (user_id, resource, version)
+         SELECT owners.owner_id, %L, 1
+         FROM (%s) AS owners
+         WHERE owners.owner_id IS NOT NULL
+           AND EXISTS (SELECT 1 FROM auth_users u WHERE u.id = owners.owner_id)
+         ON CONFLICT (user_id, resource)
+         DO UPDATE SET version = tenant_versions.version + 1, updated_at = NOW()',
+        TG_ARGV[0],
+        replace(TG_ARGV[1], '$rows', source_rows)
+    );
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_auth_users_version_ins ON auth_users;
+DROP TRIGGER IF EXISTS trg_auth_users_version_upd ON auth_users;
+
+CREATE TRIGGER trg_auth_users_version_ins
+    AFTER INSERT ON auth_users REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_tenant_version('user', 'SELECT DISTINCT id AS owner_id FROM $rows');
+CREATE TRIGGER trg_auth_users_version_upd
+    AFTER UPDATE ON auth_users REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_tenant_version('user', 'SELECT DISTINCT id AS owner_id FROM $rows');
+
+DROP TRIGGER IF EXISTS trg_hosting_accounts_version_ins ON hosting_accounts;
+DROP TRIGGER IF EXISTS trg_hosting_accounts_version_upd ON hosting_accounts;
+DROP TRIGGER IF EXISTS trg_hosting_accounts_version_del ON hosting_accounts;
+
+CREATE TRIGGER trg_hosting_accounts_version_ins
+    AFTER INSERT ON hosting_accounts REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_tenant_version('user', 'SELECT DISTINCT user_id AS owner_id FROM $rows');
+CREATE TRIGGER trg_hosting_accounts_version_upd
+    AFTER UPDATE ON hosting_accounts REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_tenant_version('user', 'SELECT DISTINCT user_id AS owner_id FROM $rows');
+CREATE TRIGGER trg_hosting_accounts_version_del
+    AFTER DELETE ON hosting_accounts REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_tenant_version('user', 'SELECT DISTINCT user_id AS owner_id FROM $rows');
+
+DROP TRIGGER IF EXISTS trg_domains_version_ins ON domains;
+DROP TRIGGER IF EXISTS trg_domains_version_upd ON domains;
+DROP TRIGGER IF EXISTS trg_domains_version_del ON domains;
+
+CREATE TRIGGER trg_domains_version_ins
+    AFTER INSERT ON domains REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_tenant_version('domains', 'SELECT DISTINCT user_id AS owner_id FROM $rows');
+CREATE TRIGGER trg_domains_version_upd
+    AFTER UPDATE ON domains REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_tenant_version('domains', 'SELECT DISTINCT user_id AS owner_id FROM $rows');
+CREATE TRIGGER trg_domains_version_del
+    AFTER DELETE ON domains REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_tenant_version('domains', 'SELECT DISTINCT user_id AS owner_id FROM $rows');
+
+DROP TRIGGER IF EXISTS trg_dns_records_version_ins ON dns_records;
+DROP TRIGGER IF EXISTS trg_dns_records_version_upd ON dns_records;
+DROP TRIGGER IF EXISTS trg_dns_records_version_del ON dns_records;
+
+CREATE TRIGGER trg_dns_records_version_ins
+    AFTER INSERT ON dns_records REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_tenant_version('dns', 'SELECT DISTINCT d.user_id AS owner_id FROM $rows r JOIN domains d ON d.id = r.domain_id');
+CREATE TRIGGER trg_dns_records_version_upd
+    AFTER UPDATE ON dns_records REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_tenant_version('dns', 'SELECT DISTINCT d.user_id AS owner_id FROM $rows r JOIN domains d ON d.id = r.domain_id');
+CREATE TRIGGER trg_dns_records_version_del
+    AFTER DELETE ON dns_records REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_tenant_version('dns', 'SELECT DISTINCT d.user_id AS owner_id FROM $rows r JOIN domains d ON d.id = r.domain_id');
+
+DROP TRIGGER IF EXISTS trg_hosting_sites_version_ins ON hosting_sites;
+DROP TRIGGER IF EXISTS trg_hosting_sites_version_upd ON hosting_sites;
+DROP TRIGGER IF EXISTS trg_hosting_sites_version_del ON hosting_sites;
+
+CREATE TRIGGER trg_hosting_sites_version_ins
+    AFTER INSERT ON hosting_sites REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_tenant_version('sites', 'SELECT DISTINCT user_id AS owner_id FROM $rows');
+CREATE TRIGGER trg_hosting_sites_version_upd
+    AFTER UPDATE ON hosting_sites REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_tenant_version('sites', 'SELECT DISTINCT user_id AS owner_id FROM $rows');
+CREATE TRIGGER trg_hosting_sites_version_del
+    AFTER DELETE ON hosting_sites REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_tenant_version('sites', 'SELECT DISTINCT user_id AS owner_id FROM $rows');
@@ -0,0 +1,17 @@
+-- Stored responses for Idempotency-Key retries
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    scope VARCHAR(64) NOT NULL,
+    key VARCHAR(255) NOT NULL,
+    fingerprint CHAR(64) NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'in_progress',
+    response_status INTEGER,
+    response_headers JSONB,
+    response_body BYTEA,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    locked_until TIMESTAMPTZ NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (scope, key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at ON idempotency_keys (expires_at);
@@ -0,0 +1,20 @@
+-- Multi-node ISPmanager: owning node per user, reconciliation scoped by node
+
+ALTER TABLE auth_users ADD COLUMN IF NOT EXISTS isp_node VARCHAR(64);
+
+CREATE INDEX IF NOT EXISTS ix_auth_users_isp_node ON auth_users (isp_node);
+
+-- Existing rows were produced against the single configured panel
+ALTER TABLE isp_object_fingerprints ADD COLUMN IF NOT EXISTS node VARCHAR(64) NOT NULL DEFAULT 'default';
+
+ALTER TABLE isp_object_fingerprints DROP CONSTRAINT IF EXISTS isp_object_fingerprints_pkey;
+
+ALTER TABLE isp_object_fingerprints ADD PRIMARY KEY (node, kind, isp_id);
+
+ALTER TABLE isp_drift_reports ADD COLUMN IF NOT EXISTS node VARCHAR(64) NOT NULL DEFAULT 'default';
+
+DROP INDEX IF EXISTS uq_isp_drift_reports_open;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_isp_drift_reports_open
+    ON isp_drift_reports (node, kind, isp_id, drift_type)
+    WHERE resolved_at IS NULL;
@@ -0,0 +1,33 @@
+-- Per-account resource usage: raw samples, hourly/daily rollups, last panel counters
+
+CREATE TABLE IF NOT EXISTS usage_samples (
+    user_id INTEGER NOT NULL REFERENCES auth_users (id) ON DELETE CASCADE,
+    sampled_at TIMESTAMPTZ NOT NULL,
+    disk_mb REAL NOT NULL,
+    traffic_mb REAL NOT NULL,
+    hits INTEGER NOT NULL,
+    PRIMARY KEY (user_id, sampled_at)
+);
+
+CREATE INDEX IF NOT EXISTS idx_usage_samples_sampled_at ON usage_samples (sampled_at);
+
+CREATE TABLE IF NOT EXISTS usage_rollups (
+    user_id INTEGER NOT NULL REFERENCES auth_users (id) ON DELETE CASCADE,
+    bucket VARCHAR(8) NOT NULL,
+    bucket_start TIMESTAMPTZ NOT NULL,
+    disk_mb_avg REAL NOT NULL,
+    disk_mb_max REAL NOT NULL,
+    traffic_mb REAL NOT NULL,
+    hits BIGINT NOT NULL,
+    samples INTEGER NOT NULL,
+    PRIMARY KEY (user_id, bucket, bucket_start)
+);
+
+CREATE INDEX IF NOT EXISTS idx_usage_rollups_retention ON usage_rollups (bucket, bucket_start);
+
+CREATE TABLE IF NOT EXISTS usage_counters (
+    user_id INTEGER PRIMARY KEY REFERENCES auth_users (id) ON DELETE CASCADE,
+    traffic_mb DOUBLE PRECISION NOT NULL,
+    hits BIGINT NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
@@ -0,0 +1,19 @@
+-- Local disk usage of client home directories: per-directory aggregates and per-account totals
+
+CREATE TABLE IF NOT EXISTS disk_usage_dirs (
+    user_id INTEGER NOT NULL REFERENCES auth_users (id) ON DELETE CASCADE,
+    path TEXT NOT NULL,
+    bytes BIGINT NOT NULL,
+    files INTEGER NOT NULL,
+    mtime_ns BIGINT NOT NULL,
+    PRIMARY KEY (user_id, path)
+);
+
+CREATE TABLE IF NOT EXISTS disk_usage_totals (
+    user_id INTEGER PRIMARY KEY REFERENCES auth_users (id) ON DELETE CASCADE,
+    bytes BIGINT NOT NULL,
+    files BIGINT NOT NULL,
+    directories INTEGER NOT NULL,
+    full_scan_at TIMESTAMPTZ NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
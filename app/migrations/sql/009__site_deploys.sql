@@ -0,0 +1,17 @@
+-- Resumable site archive uploads and their extraction status
+
+CREATE TABLE IF NOT EXISTS site_deploys (
+    id VARCHAR(32) PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES auth_users (id) ON DELETE CASCADE,
+    site_id INTEGER NOT NULL REFERENCES hosting_sites (id) ON DELETE CASCADE,
+    filename VARCHAR(255),
+    size BIGINT NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'uploading',
+    files INTEGER,
+    bytes BIGINT,
+    error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_site_deploys_site_id ON site_deploys (site_id);
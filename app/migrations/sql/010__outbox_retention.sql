@@ -0,0 +1,18 @@
+-- Outbox retention and dead-letter state
+
+ALTER TABLE outbox_events ADD COLUMN IF NOT EXISTS failed_at TIMESTAMPTZ;
+ALTER TABLE outbox_events ADD COLUMN IF NOT EXISTS last_error TEXT;
+
+-- Dead-lettered rows are no longer picked up by the publisher
+DROP INDEX IF EXISTS idx_outbox_events_pending;
+CREATE INDEX IF NOT EXISTS idx_outbox_events_pending
+    ON outbox_events (id)
+    WHERE published_at IS NULL AND failed_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_outbox_events_published_at
+    ON outbox_events (published_at)
+    WHERE published_at IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_outbox_events_failed_at
+    ON outbox_events (failed_at)
+    WHERE failed_at IS NOT NULL;
@@ -0,0 +1,4 @@
+-- Stale uploads and interrupted extractions are found by status and age
+
+CREATE INDEX IF NOT EXISTS idx_site_deploys_pending ON site_deploys (status, updated_at)
+    WHERE status IN ('uploading', 'extracting');
@@ -0,0 +1,128 @@
+import asyncio
+import os
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from app.core import profiling, tracing
+from app.core.config import settings
+from app.core.responses import model_response, models_response
+from app.modules.admin.schemas import (
+    ProfileTokenResponse,
+    ProfilingStartedResponse,
+    TraceResponse,
+    TracemallocSnapshotResponse,
+)
+from app.modules.auth.models import AuthUsers
+from app.modules.auth.routes import get_current_admin
+
+router = APIRouter()
+
+
+def _trace_response(spans: List[Dict[str, Any]]) -> TraceResponse:
+    root = spans[0]
+    return TraceResponse(trace_id=root["trace_id"], duration_ms=root["duration_ms"], spans=spans)
+
+
+def _ring_buffer() -> tracing.RingBufferExporter:
+    if tracing.ring_buffer is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Экспорт трасс в память выключен")
+    return tracing.ring_buffer
+
+
+@router.get("/admin/traces", response_model=List[TraceResponse])
+async def list_traces(
+    limit: int = Query(50, ge=1, le=500),
+    min_duration_ms: float = Query(0, ge=0),
+    _: AuthUsers = Depends(get_current_admin),
+):
+    """Последние сэмплированные трассы этого процесса, новые первыми."""
+
+    traces = [
+        _trace_response(spans)
+        for spans in _ring_buffer().recent(limit)
+        if (spans[0]["duration_ms"] or 0) >= min_duration_ms
+    ]
+    return models_response(TraceResponse, traces)
+
+
+@router.get("/admin/traces/{trace_id}", response_model=TraceResponse)
+async def get_trace(
+    trace_id: str,
+    _: AuthUsers = Depends(get_current_admin),
+):
+    """Все спаны одной трассы."""
+
+    spans = _ring_buffer().find(trace_id)
+    if spans is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Трасса не найдена")
+    return model_response(_trace_response(spans))
+
+
+@router.post(
+    "/admin/profiling/sample",
+    response_model=ProfilingStartedResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def start_sampling_profiler(
+    seconds: float = Query(30, gt=0),
+    _: AuthUsers = Depends(get_current_admin),
+):
+    """Сэмплировать стек event loop этого воркера seconds секунд (collapsed stacks)."""
+
+    if seconds > settings.profiler_max_seconds:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Не более {settings.profiler_max_seconds} секунд",
+        )
+    try:
+        path = profiling.start_sampling(seconds)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc))
+    return model_response(
+        ProfilingStartedResponse(pid=os.getpid(), file=path.name, seconds=seconds),
+        status_code=status.HTTP_202_ACCEPTED,
+    )
+
+
+@router.post("/admin/profiling/token", response_model=ProfileTokenResponse)
+async def create_profile_token(
+    ttl: int = Query(300, ge=1, le=86400),
+    _: AuthUsers = Depends(get_current_admin),
+):
+    """Подписанный токен для заголовка X-Profile (профиль отдельных запросов)."""
+
+    return model_response(ProfileTokenResponse(token=profiling.sign_profile_token(ttl), expires_in=ttl))
+
+
+@router.post("/admin/profiling/tracemalloc/start", status_code=status.HTTP_204_NO_CONTENT)
+async def start_tracemalloc(
+    frames: int = Query(25, ge=1, le=100),
+    _: AuthUsers = Depends(get_current_admin),
+):
+    """Включить tracemalloc в этом воркере."""
+
+    profiling.start_tracemalloc(frames)
+
+
+@router.post("/admin/profiling/tracemalloc/snapshot", response_model=TracemallocSnapshotResponse)
+async def tracemalloc_snapshot(
+    limit: int = Query(20, ge=1, le=200),
+    _: AuthUsers = Depends(get_current_admin),
+):
+    """Сохранить снимок аллокаций и вернуть top роста с предыдущего снимка."""
+
+    try:
+        result = await asyncio.to_thread(profiling.take_tracemalloc_snapshot, limit)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc))
+    return model_response(TracemallocSnapshotResponse(pid=os.getpid(), **result))
+
+
+@router.post("/admin/profiling/tracemalloc/stop", status_code=status.HTTP_204_NO_CONTENT)
+async def stop_tracemalloc(
+    _: AuthUsers = Depends(get_current_admin),
+):
+    """Выключить tracemalloc и забыть предыдущий снимок."""
+
+    profiling.stop_tracemalloc()
@@ -0,0 +1,47 @@
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class TraceSpanResponse(BaseModel):
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    name: str
+    start_time: float
+    duration_ms: Optional[float] = None
+    attributes: Dict[str, Any] = {}
+    error: Optional[str] = None
+
+
+class TraceResponse(BaseModel):
+    trace_id: str
+    duration_ms: Optional[float] = None
+    spans: List[TraceSpanResponse]
+
+
+class ProfilingStartedResponse(BaseModel):
+    pid: int
+    file: str
+    seconds: float
+
+
+class ProfileTokenResponse(BaseModel):
+    header: str = "X-Profile"
+    token: str
+    expires_in: int
+
+
+class TracemallocStat(BaseModel):
+    location: str
+    size: int
+    size_diff: Optional[int] = None
+    count: int
+
+
+class TracemallocSnapshotResponse(BaseModel):
+    pid: int
+    path: str
+    current: int
+    peak: int
+    top: List[TracemallocStat]
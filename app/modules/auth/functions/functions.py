@@ -6,15 +6,16 @@ from datetime import datetime, timedelta
 
 from fastapi import HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials
-from sqlalchemy import select
+from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.core.config import settings
-from app.integrations import ISPManagerError, extract_identifier, get_isp_client
+from app.integrations import ISPManagerError, NoNodeAvailable, extract_identifier, get_isp_client, isp_nodes
 from app.modules.auth.models import AuthUsers
 from app.modules.auth.schemas import Token, UserLogin, UserRegister, UserResponse
 from app.modules.hosting.models import HostingAccount
+from app.modules.outbox.events import USER_REGISTERED, record_event
 from app.modules.security.security import (
     create_access_token,
     create_refresh_token,
@@ -61,6 +62,24 @@ class AuthService:
         )
         return result.scalar_one_or_none() is not None
 
+    @staticmethod
+    async def _place_account(db: AsyncSession) -> str:
+        """Узел для нового аккаунта по числу аккаунтов в БД и кэшу занятости дисков.
+
+        Панель здесь не опрашивается: кэш дисков обновляет run_node_stats_refresher.
+        """
+
+        result = await db.execute(
+            select(AuthUsers.isp_node, func.count())
+            .where(AuthUsers.isp_account_id.is_not(None))
+            .group_by(AuthUsers.isp_node)
+        )
+        accounts: dict[str, int] = {}
+        for node, count in result:
+            node = isp_nodes.resolve(node)
+            accounts[node] = accounts.get(node, 0) + count
+        return isp_nodes.choose(accounts)
+
     @staticmethod
     async def register_user(db: AsyncSession, user_data: UserRegister) -> UserResponse:
         """Регистрация нового пользователя"""
@@ -104,17 +123,27 @@ class AuthService:
 
         isp_account_id: str | None = None
         isp_ftp_id: str | None = None
+        isp_node: str | None = None
 
         if settings.isp_enable_sync:
-            if not settings.isp_admin_login or not settings.isp_admin_password:
+            try:
+                isp_node = await AuthService._place_account(db)
+            except NoNodeAvailable as exc:
+                await db.rollback()
+                logger.error("No ISPmanager node available for a new account: %s", exc)
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Нет свободных серверов хостинга, повторите регистрацию позже",
+                )
+            isp_client = get_isp_client(isp_node)
+
+            if not isp_client.admin_login or not isp_client.admin_password:
                 await db.rollback()
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     detail="Не сконфигурирована учётка администратора ISPmanager",
                 )
 
-            isp_client = get_isp_client()
-
             try:
                 isp_username_base = _generate_isp_username(user_data.email)
                 isp_username = isp_username_base
@@ -173,6 +202,22 @@ class AuthService:
         db.add(hosting_account)
 
         auth_user.isp_account_id = isp_account_id
+        auth_user.isp_node = isp_node
+
+        record_event(
+            db,
+            USER_REGISTERED,
+            "user",
+            auth_user.id,
+            {
+                "email": auth_user.email,
+                "username": auth_user.username,
+                "isp_account_id": isp_account_id,
+                "isp_node": isp_node,
+                "ftp_username": ftp_username,
+                "home_directory": home_directory,
+            },
+        )
 
         await db.commit()
         await db.refresh(auth_user)
@@ -200,7 +245,7 @@ class AuthService:
         user = result.scalar_one_or_none()
 
         if not user:
-            logger.warning(f"Попытка входа с несуществующим email: {user_data.email}")
+            logger.warning("Попытка входа с несуществующим email: %s", user_data.email)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Неверный email или пароль"
@@ -208,7 +253,7 @@ class AuthService:
 
         # 2. Проверить пароль
         if not verify_password(user_data.password, user.hashed_password):
-            logger.warning(f"Неверный пароль для пользователя {user.id}")
+            logger.warning("Неверный пароль для пользователя %s", user.id)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Неверный email или пароль"
@@ -216,7 +261,7 @@ class AuthService:
 
         # 3. Проверить активность аккаунта
         if not user.is_active:
-            logger.warning(f"Попытка входа в деактивированный аккаунт: {user.id}")
+            logger.warning("Попытка входа в деактивированный аккаунт: %s", user.id)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Аккаунт деактивирован"
@@ -242,7 +287,7 @@ class AuthService:
         user.last_login = datetime.utcnow()
         await db.commit()
         
-        logger.info(f"Успешный вход пользователя {user.id}")
+        logger.info("Успешный вход пользователя %s", user.id)
 
         return Token(
             access_token=access_token,
@@ -269,6 +314,19 @@ class AuthService:
         
         return user
 
+    @staticmethod
+    def get_user_id_from_token(credentials: HTTPAuthorizationCredentials) -> int:
+        """Проверить JWT и вернуть id пользователя без обращения к БД"""
+
+        token_data = verify_token(credentials.credentials, "access")
+        if token_data is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Недействительный токен",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return int(token_data["user_id"])
+
     @staticmethod
     async def get_current_user_from_token(
         credentials: HTTPAuthorizationCredentials, 
@@ -276,28 +334,26 @@ class AuthService:
     ) -> AuthUsers:
         """Получить текущего пользователя из JWT токена"""
         
-        logger.info(f"Получен токен для проверки: {credentials.credentials[:20]}...")
-        
         # Проверить и декодировать токен
         token_data = verify_token(credentials.credentials, "access")
         
         if token_data is None:
-            logger.error("Токен недействителен")
+            logger.warning("Токен недействителен")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Недействительный токен",
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        logger.info(f"Токен успешно декодирован, user_id: {token_data.get('user_id')}")
+        logger.debug("Токен успешно декодирован, user_id: %s", token_data.get("user_id"))
         
         # Получить пользователя из базы данных
         try:
             user = await AuthService.get_user_by_id(db, int(token_data["user_id"]))
-            logger.info(f"Пользователь найден: {user.email}")
+            logger.debug("Пользователь найден: %s", user.id)
             return user
         except Exception as e:
-            logger.error(f"Ошибка при получении пользователя: {str(e)}")
+            logger.warning("Ошибка при получении пользователя: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Пользователь не найден",
@@ -370,7 +426,7 @@ class AuthService:
         """Логаут пользователя"""
         # В текущей реализации JWT токены не хранятся в БД
         # Для полноценной реализации логаута нужно добавить черный список токенов
-        logger.info(f"Пользователь {user.username} вышел из системы")
+        logger.info("Пользователь %s вышел из системы", user.username)
         return {"message": "Успешный выход из системы"}
 
     @staticmethod
@@ -30,6 +30,7 @@ class AuthUsers(Base):
     phone_verified = Column(Boolean, nullable=False, default=False)
 
     isp_account_id = Column(String(128))
+    isp_node = Column(String(64), index=True)  # узел ISPmanager аккаунта; NULL — isp_default_node
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
+from app.core.context import batch_user, current_tenant
 from app.core.db import get_db
 from app.modules.auth.functions.functions import AuthService
 from app.modules.auth.models import AuthUsers
@@ -16,7 +18,32 @@ async def get_current_user(
     db: AsyncSession = Depends(get_db)
 ) -> AuthUsers:
     """Получить текущего пользователя по JWT токену"""
-    return await AuthService.get_current_user_from_token(credentials, db)
+    user = batch_user.get()
+    if user is not None:
+        # Внутри POST /batch пользователь уже проверен; переносим его в сессию подзапроса без запроса к БД
+        user = user if user in db else await db.merge(user, load=False)
+    else:
+        user = await AuthService.get_current_user_from_token(credentials, db)
+    current_tenant.set(user.id)
+    return user
+
+
+async def get_current_admin(
+    current_user: AuthUsers = Depends(get_current_user),
+) -> AuthUsers:
+    """Текущий пользователь, если он указан в admin_emails"""
+    if current_user.email.lower() not in {email.lower() for email in settings.admin_emails}:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
+    return current_user
+
+
+async def get_current_user_id(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+) -> int:
+    """Получить id пользователя из JWT без загрузки записи из БД"""
+    user_id = AuthService.get_user_id_from_token(credentials)
+    current_tenant.set(user_id)
+    return user_id
 
 
 @router.post("/auth/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
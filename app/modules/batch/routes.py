@@ -0,0 +1,308 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.middleware.asyncexitstack import AsyncExitStackMiddleware
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.middleware.exceptions import ExceptionMiddleware
+from starlette.types import ASGIApp
+
+from app.core import deadline
+from app.core.config import settings
+from app.core.context import batch_session, batch_user
+from app.core.db import get_db
+from app.core.metrics import ADMISSION_REJECTED
+from app.core.responses import model_response
+from app.middleware import admission
+from app.middleware.admission import HEALTH, admission_class, route_class
+from app.middleware.idempotency import IdempotencyMiddleware
+from app.middleware.tracing import HandlerSpanMiddleware
+from app.modules.auth.models import AuthUsers
+from app.modules.auth.routes import get_current_user
+from app.modules.batch.schemas import BatchItemResult, BatchRequest, BatchResponse, BatchSubRequest
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+BATCH_PATH = "/batch"
+FORWARDED_HEADERS = {"authorization", "accept", "accept-language", "user-agent"}
+RETURNED_HEADERS = {"content-type", "etag", "location", "retry-after"}
+
+
+class _RejectedResponse(Exception):
+    """Ответ подзапроса нельзя вернуть в пакете: поток или слишком большое тело."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _inner_app(request: Request) -> ASGIApp:
+    """Роутер приложения с обработчиками исключений, спаном handler и Idempotency-Key.
+
+    Подзапросы не проходят CORS и трассировку повторно: это уже сделал сам
+    запрос POST /batch. Допуск (слот класса и сброс нагрузки) и срок для
+    подзапросов применяет _execute.
+    """
+
+    app = request.app
+    inner = getattr(app.state, "batch_app", None)
+    if inner is None:
+        handlers = {key: value for key, value in app.exception_handlers.items() if key not in (500, Exception)}
+        inner = IdempotencyMiddleware(
+            HandlerSpanMiddleware(
+                ExceptionMiddleware(AsyncExitStackMiddleware(app.router), handlers=handlers, debug=app.debug)
+            )
+        )
+        app.state.batch_app = inner
+    return inner
+
+
+def _item_timeout(method: str, path: str) -> float:
+    """Срок подзапроса: по его классу маршрута, но не дольше остатка срока пакета."""
+
+    timeout = settings.request_timeouts.get(route_class(method, path), settings.request_timeout_max)
+    left = deadline.remaining()
+    return timeout if left is None else min(timeout, left)
+
+
+def _error(item_id: str, status_code: int, detail: str, headers: Optional[Dict[str, str]] = None) -> BatchItemResult:
+    return BatchItemResult(id=item_id, status=status_code, headers=headers or {}, body={"detail": detail})
+
+
+async def _execute(request: Request, item_id: str, item: BatchSubRequest) -> BatchItemResult:
+    path, _, query = item.path.partition("?")
+    request_class = admission_class(item.method, path, query.encode("latin-1"))
+    counted = settings.admission_enabled and request_class != HEALTH
+    if counted:
+        admitted, reason, pressure = admission.admit(request_class)
+        if not admitted:
+            ADMISSION_REJECTED.labels(request_class, reason).inc()
+            return _error(
+                item_id,
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+                "Сервис перегружен, повторите запрос позже",
+                {"retry-after": str(admission.retry_after(pressure))},
+            )
+    try:
+        return await _execute_admitted(request, item_id, item, path, query)
+    finally:
+        if counted:
+            admission.release(request_class)
+
+
+async def _execute_admitted(
+    request: Request, item_id: str, item: BatchSubRequest, path: str, query: str
+) -> BatchItemResult:
+    timeout = _item_timeout(item.method, path)
+    if timeout <= 0:
+        return _error(item_id, status.HTTP_504_GATEWAY_TIMEOUT, "Превышено время выполнения запроса")
+    body = b"" if item.body is None else json.dumps(item.body, ensure_ascii=False).encode("utf-8")
+
+    headers = [
+        (name.encode("latin-1"), value.encode("latin-1"))
+        for name, value in request.headers.items()
+        if name in FORWARDED_HEADERS
+    ]
+    headers.extend((name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in item.headers.items())
+    if item.body is not None:
+        headers.append((b"content-type", b"application/json"))
+        headers.append((b"content-length", str(len(body)).encode("latin-1")))
+
+    scope = {
+        "type": "http",
+        "asgi": request.scope.get("asgi", {"version": "3.0"}),
+        "http_version": request.scope.get("http_version", "1.1"),
+        "method": item.method,
+        "scheme": request.url.scheme,
+        "path": path,
+        "raw_path": path.encode("utf-8"),
+        "root_path": request.scope.get("root_path", ""),
+        "query_string": query.encode("latin-1"),
+        "headers": headers,
+        "client": request.scope.get("client"),
+        "server": request.scope.get("server"),
+        "app": request.app,
+        "state": {},
+    }
+
+    pending_body = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        if pending_body:
+            return pending_body.pop()
+        # Тело уже отдано; подзапрос не может «отключиться» раньше пакета
+        await asyncio.Future()
+
+    response_status = status.HTTP_500_INTERNAL_SERVER_ERROR
+    response_headers: Dict[str, str] = {}
+    chunks: List[bytes] = []
+    collected = 0
+
+    async def send(message):
+        nonlocal response_status, collected
+        if message["type"] == "http.response.start":
+            response_status = message["status"]
+            for name, value in message.get("headers", []):
+                decoded = name.decode("latin-1").lower()
+                if decoded in RETURNED_HEADERS:
+                    response_headers[decoded] = value.decode("latin-1")
+            if response_headers.get("content-type", "").startswith("text/event-stream"):
+                raise _RejectedResponse(status.HTTP_400_BAD_REQUEST, "Потоковые ответы (SSE) не поддерживаются в пакете")
+        elif message["type"] == "http.response.body":
+            body_part = message.get("body", b"")
+            collected += len(body_part)
+            if collected > settings.batch_max_response_bytes:
+                # Потоковая выгрузка или просто большой ответ — обрываем, а не копим в памяти
+                raise _RejectedResponse(
+                    status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    f"Ответ подзапроса больше {settings.batch_max_response_bytes} байт, выполните его отдельно",
+                )
+            chunks.append(body_part)
+
+    async def run_item() -> None:
+        # Своя задача — свой контекст: срок подзапроса не меняет срок пакета
+        deadline.request_deadline.set(time.monotonic() + timeout)
+        await _inner_app(request)(scope, receive, send)
+
+    try:
+        await asyncio.wait_for(run_item(), timeout)
+        payload = _decode_body(b"".join(chunks), response_headers.get("content-type", ""))
+    except _RejectedResponse as exc:
+        return _error(item_id, exc.status_code, exc.detail)
+    except asyncio.TimeoutError:
+        return _error(item_id, status.HTTP_504_GATEWAY_TIMEOUT, "Превышено время выполнения запроса")
+    except Exception:
+        logger.exception("Batch sub-request %s %s failed", item.method, item.path)
+        return BatchItemResult(
+            id=item_id,
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            body={"detail": "Internal Server Error"},
+        )
+
+    return BatchItemResult(id=item_id, status=response_status, headers=response_headers, body=payload)
+
+
+def _decode_body(raw_body: bytes, content_type: str):
+    if not raw_body:
+        return None
+    if content_type.startswith("application/json"):
+        try:
+            return json.loads(raw_body)
+        except ValueError:
+            logger.warning("Batch sub-request returned invalid JSON body")
+    return raw_body.decode("utf-8", errors="replace")
+
+
+def _validate_plan(ids: List[str], items: List[BatchSubRequest]) -> None:
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Идентификаторы подзапросов должны быть уникальны")
+
+    known = set(ids)
+    for item_id, item in zip(ids, items):
+        if not item.path.startswith("/") or item.path.split("?", 1)[0].rstrip("/") == BATCH_PATH:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Недопустимый путь подзапроса {item_id}")
+        unknown = set(item.depends_on) - known
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Подзапрос {item_id} зависит от неизвестных: {', '.join(sorted(unknown))}",
+            )
+
+    # Алгоритм Кана без выполнения: проверяем, что зависимости не образуют цикл
+    done: set = set()
+    remaining = dict(zip(ids, items))
+    while remaining:
+        ready = [item_id for item_id, item in remaining.items() if set(item.depends_on) <= done]
+        if not ready:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Циклические зависимости в пакете")
+        for item_id in ready:
+            done.add(item_id)
+            del remaining[item_id]
+
+
+@router.post(BATCH_PATH, response_model=BatchResponse)
+async def execute_batch(
+    batch: BatchRequest,
+    request: Request,
+    current_user: AuthUsers = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Выполнить несколько вызовов API за один HTTP-запрос.
+
+    Аутентификация выполняется один раз. Независимые подзапросы идут
+    параллельно (каждый со своей сессией), depends_on задаёт порядок.
+    С shared_session все подзапросы выполняются последовательно в сессии
+    пакета; после ответа 5xx сессия откатывается, а оставшиеся подзапросы
+    получают 424. Пакет не атомарен: уже зафиксированные подзапросами
+    изменения не откатываются.
+    """
+
+    items = batch.requests
+    if len(items) > settings.batch_max_items:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Не более {settings.batch_max_items} подзапросов в пакете",
+        )
+
+    ids = [item.id or str(index) for index, item in enumerate(items)]
+    _validate_plan(ids, items)
+
+    results: Dict[str, BatchItemResult] = {}
+    aborted = False
+    semaphore = asyncio.Semaphore(max(1, settings.batch_max_concurrency))
+
+    async def run(item_id: str, item: BatchSubRequest) -> None:
+        async with semaphore:
+            results[item_id] = await _execute(request, item_id, item)
+
+    user_token = batch_user.set(current_user)
+    session_token = batch_session.set(db) if batch.shared_session else None
+    try:
+        pending = list(zip(ids, items))
+        while pending:
+            ready = [(item_id, item) for item_id, item in pending if all(dep in results for dep in item.depends_on)]
+            runnable = []
+            for item_id, item in ready:
+                if any(results[dep].status >= 400 for dep in item.depends_on):
+                    results[item_id] = BatchItemResult(
+                        id=item_id,
+                        status=status.HTTP_424_FAILED_DEPENDENCY,
+                        body={"detail": "Зависимый подзапрос завершился ошибкой"},
+                    )
+                else:
+                    runnable.append((item_id, item))
+
+            if batch.shared_session:
+                for item_id, item in runnable:
+                    if aborted:
+                        results[item_id] = _error(
+                            item_id, status.HTTP_424_FAILED_DEPENDENCY, "Пакет остановлен после сбоя подзапроса"
+                        )
+                        continue
+                    await run(item_id, item)
+                    if results[item_id].status >= 500:
+                        # Сбой или тайм-аут мог оборвать подзапрос посреди транзакции общей сессии:
+                        # её изменения откатываются, а остальные подзапросы не выполняются
+                        await db.rollback()
+                        aborted = True
+                        continue
+                    # rollback в подзапросе истекает все объекты сессии, включая пользователя
+                    if sa_inspect(current_user).expired_attributes:
+                        await db.refresh(current_user)
+                        await db.refresh(current_user, ["hosting_account"])
+            else:
+                await asyncio.gather(*(run(item_id, item) for item_id, item in runnable))
+
+            pending = [(item_id, item) for item_id, item in pending if item_id not in results]
+    finally:
+        batch_user.reset(user_token)
+        if session_token is not None:
+            batch_session.reset(session_token)
+
+    return model_response(BatchResponse(results=[results[item_id] for item_id in ids]))
@@ -0,0 +1,30 @@
+from typing import Any, Dict, List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+
+class BatchSubRequest(BaseModel):
+    """Один вызов API внутри пакета"""
+    id: Optional[str] = None
+    method: Literal["GET", "POST", "PUT", "PATCH", "DELETE"] = "GET"
+    path: str
+    headers: Dict[str, str] = {}
+    body: Optional[Any] = None
+    depends_on: List[str] = []
+
+
+class BatchRequest(BaseModel):
+    """Пакет вызовов; shared_session выполняет их последовательно в одной сессии БД"""
+    requests: List[BatchSubRequest] = Field(..., min_length=1)
+    shared_session: bool = False
+
+
+class BatchItemResult(BaseModel):
+    id: str
+    status: int
+    headers: Dict[str, str] = {}
+    body: Optional[Any] = None
+
+
+class BatchResponse(BaseModel):
+    results: List[BatchItemResult]
@@ -0,0 +1,106 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.db import get_db
+from app.core.responses import model_response
+from app.modules.auth.routes import get_current_user_id
+from app.modules.dashboard.schemas import DashboardSummaryResponse
+
+router = APIRouter()
+
+
+# Профиль, FTP, счётчики и последние изменения собираются одним запросом:
+# каждый раздел — скалярный или LATERAL подзапрос, агрегированный в JSON.
+DASHBOARD_SUMMARY_QUERY = text(
+    """
+    SELECT
+        json_build_object(
+            'id', u.id,
+            'email', u.email,
+            'username', u.username,
+            'first_name', u.first_name,
+            'last_name', u.last_name,
+            'phone', u.phone,
+            'email_verified', u.email_verified,
+            'phone_verified', u.phone_verified,
+            'isp_account_id', u.isp_account_id,
+            'created_at', u.created_at,
+            'hosting_account', CASE WHEN ha.id IS NULL THEN NULL ELSE json_build_object(
+                'ftp_username', ha.ftp_username,
+                'home_directory', ha.home_directory
+            ) END
+        ) AS profile,
+        CASE WHEN ha.id IS NULL THEN NULL ELSE json_build_object(
+            'ftp_username', ha.ftp_username,
+            'ftp_password', ha.ftp_password,
+            'home_directory', ha.home_directory
+        ) END AS ftp_account,
+        json_build_object(
+            'domains', (SELECT count(*) FROM domains d WHERE d.user_id = u.id),
+            'sites', (SELECT count(*) FROM hosting_sites s WHERE s.user_id = u.id),
+            'dns_records', (
+                SELECT count(*) FROM dns_records r JOIN domains d ON d.id = r.domain_id
+                WHERE d.user_id = u.id
+            )
+        ) AS counts,
+        latest_domains.items AS latest_domains,
+        latest_sites.items AS latest_sites,
+        latest_dns.items AS latest_dns_changes
+    FROM auth_users u
+    LEFT JOIN hosting_accounts ha ON ha.user_id = u.id
+    LEFT JOIN LATERAL (
+        SELECT coalesce(json_agg(x ORDER BY x.registered_at DESC), '[]'::json) AS items
+        FROM (
+            SELECT d.id, d.name, d.status, d.registered_at, d.expires_at
+            FROM domains d
+            WHERE d.user_id = u.id
+            ORDER BY d.registered_at DESC
+            LIMIT :limit
+        ) x
+    ) latest_domains ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT coalesce(json_agg(x ORDER BY x.created_at DESC), '[]'::json) AS items
+        FROM (
+            SELECT s.id, s.domain_id, s.root_path, s.status, s.created_at
+            FROM hosting_sites s
+            WHERE s.user_id = u.id
+            ORDER BY s.created_at DESC
+            LIMIT :limit
+        ) x
+    ) latest_sites ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT coalesce(json_agg(x ORDER BY x.created_at DESC), '[]'::json) AS items
+        FROM (
+            SELECT r.id, r.domain_id, d.name AS domain_name, r.record_type, r.name, r.value, r.created_at
+            FROM dns_records r
+            JOIN domains d ON d.id = r.domain_id
+            WHERE d.user_id = u.id
+            ORDER BY r.created_at DESC
+            LIMIT :limit
+        ) x
+    ) latest_dns ON TRUE
+    WHERE u.id = :user_id
+    """
+)
+
+
+@router.get("/dashboard/summary", response_model=DashboardSummaryResponse)
+async def get_dashboard_summary(
+    limit: int = Query(5, ge=1, le=50),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    """Сводка для главной страницы кабинета за один запрос к БД."""
+
+    result = await db.execute(DASHBOARD_SUMMARY_QUERY, {"user_id": user_id, "limit": limit})
+    row = result.mappings().one_or_none()
+
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Пользователь не найден",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    return model_response(DashboardSummaryResponse.model_validate(dict(row)))
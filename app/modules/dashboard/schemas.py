@@ -0,0 +1,49 @@
+from datetime import date, datetime
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from app.modules.domains.schemas import DNSRecordType, DomainStatus
+from app.modules.hosting.schemas import HostingAccountResponse, SiteStatus
+from app.modules.users.schemas import UserProfileResponse
+
+
+class DashboardCounts(BaseModel):
+    domains: int = 0
+    sites: int = 0
+    dns_records: int = 0
+
+
+class DashboardDomain(BaseModel):
+    id: int
+    name: str
+    status: DomainStatus
+    registered_at: datetime
+    expires_at: Optional[date] = None
+
+
+class DashboardSite(BaseModel):
+    id: int
+    domain_id: Optional[int] = None
+    root_path: str
+    status: SiteStatus
+    created_at: datetime
+
+
+class DashboardDNSChange(BaseModel):
+    id: int
+    domain_id: int
+    domain_name: str
+    record_type: DNSRecordType
+    name: str
+    value: str
+    created_at: datetime
+
+
+class DashboardSummaryResponse(BaseModel):
+    profile: UserProfileResponse
+    ftp_account: Optional[HostingAccountResponse] = None
+    counts: DashboardCounts
+    latest_domains: List[DashboardDomain] = []
+    latest_sites: List[DashboardSite] = []
+    latest_dns_changes: List[DashboardDNSChange] = []
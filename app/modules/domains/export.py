@@ -0,0 +1,114 @@
+"""Потоковая выгрузка доменов и DNS-зон через серверный курсор."""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Any, AsyncIterator
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.db import async_session_maker
+from app.modules.domains.models import DNSRecord, Domain
+from app.modules.domains.zonefile import format_record
+
+DOMAIN_EXPORT_COLUMNS = (
+    Domain.id,
+    Domain.name,
+    Domain.status,
+    Domain.registered_at,
+    Domain.expires_at,
+    Domain.auto_renew,
+    Domain.nameservers,
+    Domain.isp_domain_id,
+)
+DNS_EXPORT_COLUMNS = (
+    DNSRecord.id,
+    DNSRecord.record_type,
+    DNSRecord.name,
+    DNSRecord.value,
+    DNSRecord.ttl,
+    DNSRecord.priority,
+)
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _dumps(payload: dict[str, Any]) -> str:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=_json_default) + "\n"
+
+
+async def _stream_rows(statement) -> AsyncIterator[list]:
+    """Читать строки порциями из серверного курсора в отдельной сессии.
+
+    Сессия живёт ровно столько, сколько клиент читает ответ, и не зависит от
+    жизненного цикла зависимости get_db.
+    """
+
+    batch_size = max(1, settings.export_batch_size)
+    async with async_session_maker() as session:
+        result = await session.stream(statement.execution_options(yield_per=batch_size))
+        async for partition in result.partitions(batch_size):
+            yield partition
+
+
+async def stream_zone(domain_id: int, domain_name: str, fmt: str) -> AsyncIterator[str]:
+    """Выгрузить DNS-записи домена в формате BIND или JSONL."""
+
+    if fmt == "bind":
+        yield f"$ORIGIN {domain_name.rstrip('.')}.\n"
+
+    statement = select(*DNS_EXPORT_COLUMNS).where(DNSRecord.domain_id == domain_id).order_by(DNSRecord.id)
+
+    async for partition in _stream_rows(statement):
+        if fmt == "bind":
+            yield "".join(
+                format_record(row.name, row.record_type, row.value, row.ttl, row.priority) for row in partition
+            )
+        else:
+            yield "".join(
+                _dumps(
+                    {
+                        "record_type": row.record_type,
+                        "name": row.name,
+                        "value": row.value,
+                        "ttl": row.ttl,
+                        "priority": row.priority,
+                    }
+                )
+                for row in partition
+            )
+
+
+async def stream_domains(user_id: int, fmt: str) -> AsyncIterator[str]:
+    """Выгрузить все домены пользователя в NDJSON или CSV."""
+
+    fields = [column.key for column in DOMAIN_EXPORT_COLUMNS]
+    nameservers_index = fields.index("nameservers")
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    if fmt == "csv":
+        writer.writerow(fields)
+        yield buffer.getvalue()
+
+    statement = select(*DOMAIN_EXPORT_COLUMNS).where(Domain.user_id == user_id).order_by(Domain.id)
+
+    async for partition in _stream_rows(statement):
+        if fmt == "csv":
+            buffer.seek(0)
+            buffer.truncate()
+            for row in partition:
+                values = list(row)
+                values[nameservers_index] = " ".join(values[nameservers_index] or [])
+                writer.writerow(values)
+            yield buffer.getvalue()
+        else:
+            yield "".join(_dumps(dict(zip(fields, row))) for row in partition)
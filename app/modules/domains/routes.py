@@ -1,24 +1,56 @@
-from typing import List
+import asyncio
+import logging
+from typing import List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.db import get_db
-from app.integrations import ISPManagerError, extract_identifier, get_isp_client
+from app.core.config import settings
+from app.core.db import copy_records, get_db
+from app.core.etag import DNS_RESOURCE, DOMAINS_RESOURCE, conditional_get
+from app.core.responses import model_columns, rows_response
+from app.integrations import ISPManagerClient, ISPManagerError, extract_identifier, get_isp_client
 from app.modules.auth.models import AuthUsers
 from app.modules.auth.routes import get_current_user
+from app.modules.domains.export import stream_domains, stream_zone
 from app.modules.domains.models import DNSRecord, Domain
 from app.modules.domains.schemas import (
     DNSRecordCreate,
     DNSRecordResponse,
+    DNSZoneFormat,
+    DNSZoneImportResponse,
+    DNSZoneRecordRef,
+    DNSZoneSyncResponse,
     DomainCreate,
+    DomainExportFormat,
     DomainResponse,
     DomainStatus,
     DomainUpdate,
 )
+from app.modules.domains.sync import sync_domain_zone
+from app.modules.domains.zonefile import ZoneFileParser, ZoneParseError, iter_batches, parse_jsonl
+from app.modules.outbox.events import (
+    DNS_RECORD_CREATED,
+    DNS_ZONE_IMPORTED,
+    DOMAIN_CREATED,
+    DOMAIN_DELETED,
+    record_event,
+)
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+EXPORT_MEDIA_TYPES = {
+    "bind": "text/dns",
+    "jsonl": "application/x-ndjson",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+EXPORT_EXTENSIONS = {"bind": "zone", "jsonl": "jsonl", "ndjson": "ndjson", "csv": "csv"}
+
+DNS_RECORD_COLUMNS = ("domain_id", "record_type", "name", "value", "ttl", "priority", "isp_record_id")
 
 
 def _ensure_remote_binding(user: AuthUsers) -> None:
@@ -41,20 +73,44 @@ async def _get_domain_or_404(db: AsyncSession, domain_id: int, user: AuthUsers)
 
 @router.get("/domains", response_model=List[DomainResponse])
 async def get_user_domains(
+    request: Request,
     current_user: AuthUsers = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
     skip: int = 0,
     limit: int = 100,
 ):
+    etag, not_modified = await conditional_get(db, request, current_user.id, DOMAINS_RESOURCE)
+    if not_modified:
+        return not_modified
+
     query = (
-        select(Domain)
+        select(*model_columns(DomainResponse, Domain))
         .where(Domain.user_id == current_user.id)
         .order_by(Domain.registered_at.desc())
         .offset(skip)
         .limit(limit)
     )
     result = await db.execute(query)
-    return result.scalars().all()
+    response = rows_response(DomainResponse, result.mappings())
+    response.headers["ETag"] = etag
+    return response
+
+
+def _export_response(body, fmt: str, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{EXPORT_EXTENSIONS[fmt]}"'},
+    )
+
+
+@router.get("/domains/export")
+async def export_user_domains(
+    format: DomainExportFormat = DomainExportFormat.NDJSON,
+    current_user: AuthUsers = Depends(get_current_user),
+):
+    """Потоковая выгрузка всех доменов пользователя без буферизации списка."""
+    return _export_response(stream_domains(current_user.id, format.value), format.value, "domains")
 
 
 @router.post("/domains", response_model=DomainResponse, status_code=status.HTTP_201_CREATED)
@@ -81,7 +137,7 @@ async def create_domain(
     db.add(domain)
     await db.flush()
 
-    isp_client = get_isp_client()
+    isp_client = get_isp_client(current_user.isp_node)
 
     try:
         isp_response = await isp_client.create_domain(
@@ -95,6 +151,13 @@ async def create_domain(
             normalized = status_value.lower()
             if normalized in {status.value for status in DomainStatus}:
                 domain.status = normalized
+        record_event(
+            db,
+            DOMAIN_CREATED,
+            "domain",
+            domain.id,
+            {"user_id": current_user.id, "name": domain.name, "status": domain.status, "isp_domain_id": domain.isp_domain_id},
+        )
         await db.commit()
     except ISPManagerError as exc:
         await db.rollback()
@@ -129,12 +192,13 @@ async def delete_domain(
 ):
     domain = await _get_domain_or_404(db, domain_id, current_user)
 
-    isp_client = get_isp_client()
+    isp_client = get_isp_client(current_user.isp_node)
 
     try:
         if domain.isp_domain_id:
             await isp_client.delete_domain(domain_id=domain.isp_domain_id)
         await db.execute(delete(Domain).where(Domain.id == domain.id))
+        record_event(db, DOMAIN_DELETED, "domain", domain.id, {"user_id": current_user.id, "name": domain.name})
         await db.commit()
     except ISPManagerError as exc:
         await db.rollback()
@@ -156,7 +220,7 @@ async def create_dns_record(
     if not domain.isp_domain_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Домен не связан с ISPmanager")
 
-    isp_client = get_isp_client()
+    isp_client = get_isp_client(current_user.isp_node)
 
     try:
         isp_response = await isp_client.create_dns_record(
@@ -175,9 +239,23 @@ async def create_dns_record(
             value=dns_data.value,
             ttl=dns_data.ttl,
             priority=dns_data.priority,
-            isp_record_id=extract_identifier(isp_response, "record_id"),
+            isp_record_id=isp_response.get("identifier"),
         )
         db.add(record)
+        record_event(
+            db,
+            DNS_RECORD_CREATED,
+            "domain",
+            domain.id,
+            {
+                "record_type": record.record_type,
+                "name": record.name,
+                "value": record.value,
+                "ttl": record.ttl,
+                "priority": record.priority,
+                "isp_record_id": record.isp_record_id,
+            },
+        )
         await db.commit()
     except ISPManagerError as exc:
         await db.rollback()
@@ -191,14 +269,232 @@ async def create_dns_record(
     return record
 
 
+@router.get("/domains/{domain_id}/dns/export")
+async def export_dns_zone(
+    domain_id: int,
+    format: DNSZoneFormat = DNSZoneFormat.BIND,
+    current_user: AuthUsers = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Потоковая выгрузка DNS-зоны домена в формате BIND или JSONL."""
+    domain = await _get_domain_or_404(db, domain_id, current_user)
+    return _export_response(stream_zone(domain.id, domain.name, format.value), format.value, domain.name)
+
+
 @router.get("/domains/{domain_id}/dns", response_model=List[DNSRecordResponse])
 async def get_dns_records(
     domain_id: int,
+    request: Request,
     current_user: AuthUsers = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     await _get_domain_or_404(db, domain_id, current_user)
+
+    etag, not_modified = await conditional_get(db, request, current_user.id, DNS_RESOURCE)
+    if not_modified:
+        return not_modified
+
     result = await db.execute(
-        select(DNSRecord).where(DNSRecord.domain_id == domain_id).order_by(DNSRecord.created_at.desc())
+        select(*model_columns(DNSRecordResponse, DNSRecord))
+        .where(DNSRecord.domain_id == domain_id)
+        .order_by(DNSRecord.created_at.desc())
+    )
+    response = rows_response(DNSRecordResponse, result.mappings())
+    response.headers["ETag"] = etag
+    return response
+
+
+async def _push_dns_records(
+    isp_client: ISPManagerClient,
+    isp_domain_id: str,
+    records: List[DNSRecordCreate],
+    semaphore: asyncio.Semaphore,
+    accepted: List[Tuple[DNSRecordCreate, Optional[str]]],
+) -> None:
+    """Отправить пачку записей в ISPmanager с ограниченным параллелизмом.
+
+    Принятые панелью записи с их rkey (None, если панель его не вернула)
+    добавляются в accepted, даже если соседний вызов пачки упал, — их нужно
+    будет отозвать. Ошибка панели пробрасывается после завершения всей пачки.
+    """
+
+    async def push(record: DNSRecordCreate) -> Optional[str]:
+        async with semaphore:
+            isp_response = await isp_client.create_dns_record(
+                domain_id=isp_domain_id,
+                record_type=record.record_type.value,
+                name=record.name,
+                value=record.value,
+                ttl=record.ttl,
+                priority=record.priority,
+            )
+        return isp_response.get("identifier")
+
+    results = await asyncio.gather(*(push(record) for record in records), return_exceptions=True)
+    error: Optional[BaseException] = None
+    for record, result in zip(records, results):
+        if isinstance(result, BaseException):
+            error = error or result
+        else:
+            accepted.append((record, result))
+    if error is not None:
+        raise error
+
+
+async def _withdraw_dns_records(
+    isp_node: Optional[str], isp_domain_id: str, accepted: List[Tuple[DNSRecordCreate, Optional[str]]]
+) -> None:
+    """Удалить из панели записи импорта, который не удалось завершить."""
+
+    lost = [record for record, isp_id in accepted if not isp_id]
+    for record in lost:
+        # Без rkey запись из панели не удалить — её придётся убрать вручную или синхронизацией
+        logger.error(
+            "Imported DNS record %s %s %s in zone %s has no rkey and stays in ISPmanager",
+            record.name,
+            record.record_type.value,
+            record.value,
+            isp_domain_id,
+        )
+
+    isp_client = get_isp_client(isp_node)
+    identifiers = [isp_id for _, isp_id in accepted if isp_id]
+    for batch in iter_batches(identifiers, max(1, settings.isp_batch_size)):
+        try:
+            await isp_client.delete_dns_records(domain_id=isp_domain_id, record_ids=batch)
+        except ISPManagerError as exc:
+            logger.error("Failed to withdraw %d imported DNS records from ISPmanager: %s", len(batch), exc)
+
+
+@router.post(
+    "/domains/{domain_id}/dns/import",
+    response_model=DNSZoneImportResponse,
+    status_code=status.HTTP_201_CREATED,
+)
+async def import_dns_zone(
+    domain_id: int,
+    request: Request,
+    format: DNSZoneFormat = DNSZoneFormat.BIND,
+    current_user: AuthUsers = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Импорт зоны BIND или JSONL одним потоком и одной транзакцией.
+
+    Записи отправляются в панель и копируются COPY пачками по мере разбора.
+    Импорт атомарен: при любой ошибке транзакция откатывается, а уже принятые
+    панелью записи отзываются, поэтому повтор запроса не создаёт дублей.
+    """
+
+    domain = await _get_domain_or_404(db, domain_id, current_user)
+
+    if settings.isp_enable_sync and not domain.isp_domain_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Домен не связан с ISPmanager")
+    domain_pk, domain_name, isp_domain_id = domain.id, domain.name, domain.isp_domain_id
+    isp_node = current_user.isp_node
+    # Транзакция чтения домена не держится открытой до первой пачки записей
+    await db.commit()
+
+    parser: Optional[ZoneFileParser] = None
+    if format is DNSZoneFormat.BIND:
+        parser = ZoneFileParser(domain_name)
+        stream = parser.parse(request.stream())
+    else:
+        stream = parse_jsonl(request.stream())
+
+    isp_client = get_isp_client(isp_node) if settings.isp_enable_sync else None
+    semaphore = asyncio.Semaphore(max(1, settings.isp_max_concurrency))
+    batch_size = max(1, settings.isp_batch_size)
+    accepted: List[Tuple[DNSRecordCreate, Optional[str]]] = []
+    batch: List[DNSRecordCreate] = []
+    parsed = 0
+    imported = 0
+
+    async def flush() -> int:
+        start = len(accepted)
+        if isp_client is not None:
+            await _push_dns_records(isp_client, isp_domain_id, batch, semaphore, accepted)
+        else:
+            accepted.extend((record, None) for record in batch)
+        batch.clear()
+        rows = [
+            (domain_pk, record.record_type.value, record.name, record.value, record.ttl, record.priority, isp_id)
+            for record, isp_id in accepted[start:]
+        ]
+        return await copy_records(db, DNSRecord.__tablename__, DNS_RECORD_COLUMNS, rows)
+
+    try:
+        async for record in stream:
+            parsed += 1
+            if parsed > settings.dns_import_max_records:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Слишком много записей, максимум {settings.dns_import_max_records}",
+                )
+            batch.append(record)
+            if len(batch) >= batch_size:
+                imported += await flush()
+        if batch:
+            imported += await flush()
+        if not imported:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Файл не содержит DNS-записей")
+        record_event(db, DNS_ZONE_IMPORTED, "domain", domain_pk, {"name": domain_name, "imported": imported})
+        await db.commit()
+    except BaseException as exc:
+        await db.rollback()
+        # Записи уже в панели, но БД о них не знает — убираем их из панели
+        if isp_client is not None and accepted:
+            await asyncio.shield(_withdraw_dns_records(isp_node, isp_domain_id, accepted))
+        if isinstance(exc, ZoneParseError):
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc)) from exc
+        if isinstance(exc, ISPManagerError):
+            logger.warning("ISPmanager rejected DNS record during import: %s", exc)
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="ISPmanager отклонил запись, импорт отменён",
+            ) from exc
+        raise
+
+    return DNSZoneImportResponse(
+        domain_id=domain_pk,
+        imported=imported,
+        skipped=parser.skipped if parser else 0,
+        pushed=len(accepted) if isp_client is not None else 0,
+    )
+
+
+@router.post("/domains/{domain_id}/dns/sync", response_model=DNSZoneSyncResponse)
+async def sync_dns_zone(
+    domain_id: int,
+    dry_run: bool = False,
+    current_user: AuthUsers = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Привести зону в ISPmanager к записям из БД, отправив только отличия."""
+
+    domain = await _get_domain_or_404(db, domain_id, current_user)
+
+    if not domain.isp_domain_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Домен не связан с ISPmanager")
+
+    try:
+        result = await sync_domain_zone(db, domain, get_isp_client(current_user.isp_node), dry_run=dry_run)
+    except ISPManagerError as exc:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="Не удалось синхронизировать зону с ISPmanager",
+        ) from exc
+
+    return DNSZoneSyncResponse(
+        domain_id=domain.id,
+        dry_run=dry_run,
+        created=result.created,
+        updated=result.updated,
+        deleted=result.deleted,
+        unchanged=result.unchanged,
+        conflicts=[
+            DNSZoneRecordRef(name=record.name, record_type=record.record_type, value=record.value)
+            for record in result.conflicts
+        ],
+        duplicates=[record.db_id for record in result.duplicates if record.db_id is not None],
     )
-    return result.scalars().all()
\ No newline at end of file
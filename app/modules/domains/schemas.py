@@ -23,6 +23,18 @@ class DNSRecordType(str, Enum):
     PTR = "PTR"
 
 
+class DNSZoneFormat(str, Enum):
+    """Форматы импорта DNS-зоны"""
+    BIND = "bind"
+    JSONL = "jsonl"
+
+
+class DomainExportFormat(str, Enum):
+    """Форматы выгрузки списка доменов"""
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
 class DomainCreate(BaseModel):
     """Схема создания домена"""
 
@@ -81,4 +93,33 @@ class DNSRecordResponse(BaseModel):
     created_at: datetime
     
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+
+class DNSZoneImportResponse(BaseModel):
+    """Схема ответа импорта DNS-зоны"""
+    domain_id: int
+    imported: int
+    skipped: int = 0
+    pushed: int = 0
+
+
+class DNSZoneRecordRef(BaseModel):
+    """Запись зоны в ответе синхронизации"""
+    name: str
+    record_type: str
+    value: str
+
+
+class DNSZoneSyncResponse(BaseModel):
+    """Схема ответа синхронизации DNS-зоны с ISPmanager"""
+    domain_id: int
+    dry_run: bool = False
+    created: int
+    updated: int
+    deleted: int
+    unchanged: int
+    # Группы с этими записями панели не изменены: у записей нет rkey
+    conflicts: List[DNSZoneRecordRef] = []
+    # id строк dns_records, повторяющих другую запись зоны
+    duplicates: List[int] = []
@@ -0,0 +1,352 @@
+"""Инкрементальная синхронизация DNS-зоны домена с ISPmanager.
+
+Желаемое состояние берётся из dns_records, фактическое — одним вызовом
+domain.record. Записи сравниваются по хешу ключа (имя, тип, значение,
+приоритет), в панель уходят только отличия.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.integrations import ISPManagerClient, extract_identifier
+from app.modules.domains.models import DNSRecord, Domain
+from app.modules.domains.schemas import DNSRecordType
+from app.modules.domains.zonefile import iter_batches
+
+logger = logging.getLogger(__name__)
+
+MANAGED_TYPES = {record_type.value for record_type in DNSRecordType}
+HOSTNAME_TYPES = {"CNAME", "NS", "MX", "PTR"}
+
+
+@dataclass(frozen=True)
+class ZoneRecord:
+    name: str
+    record_type: str
+    value: str
+    ttl: int
+    priority: Optional[int] = None
+    isp_record_id: Optional[str] = None
+    db_id: Optional[int] = None
+
+    @property
+    def group(self) -> Tuple[str, str]:
+        return self.name, self.record_type
+
+    @property
+    def key(self) -> str:
+        priority = "" if self.priority is None else str(self.priority)
+        raw = "\x1f".join((self.name, self.record_type, self.value, priority))
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+@dataclass
+class ZoneDiff:
+    create: List[ZoneRecord] = field(default_factory=list)
+    update: List[Tuple[ZoneRecord, ZoneRecord]] = field(default_factory=list)
+    delete: List[ZoneRecord] = field(default_factory=list)
+    unchanged: List[Tuple[ZoneRecord, ZoneRecord]] = field(default_factory=list)
+    # Записи панели без rkey, которые нужно изменить или удалить; их группы (имя, тип) не трогаются
+    conflicts: List[ZoneRecord] = field(default_factory=list)
+    # Строки dns_records, повторяющие другую строку той же зоны
+    duplicates: List[ZoneRecord] = field(default_factory=list)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.create or self.update or self.delete)
+
+
+def _normalize_name(name: str, zone: str) -> str:
+    name = (name or "@").strip().lower()
+    if name in {"@", ""}:
+        return "@"
+    if name.endswith("."):
+        name = name.rstrip(".")
+        if name == zone:
+            return "@"
+        if name.endswith(f".{zone}"):
+            return name[: -len(zone) - 1]
+    return name
+
+
+def _normalize_value(record_type: str, value: str) -> str:
+    value = (value or "").strip()
+    if record_type == "TXT" and len(value) >= 2 and value[0] == value[-1] == '"':
+        value = value[1:-1]
+    if record_type in HOSTNAME_TYPES:
+        value = value.lower().rstrip(".")
+    return value
+
+
+def desired_record(record: DNSRecord, zone: str) -> ZoneRecord:
+    record_type = record.record_type.upper()
+    return ZoneRecord(
+        name=_normalize_name(record.name, zone),
+        record_type=record_type,
+        value=_normalize_value(record_type, record.value),
+        ttl=int(record.ttl),
+        priority=record.priority if record_type == "MX" else None,
+        isp_record_id=record.isp_record_id,
+        db_id=record.id,
+    )
+
+
+def live_record(element: Dict[str, Any], zone: str) -> Optional[ZoneRecord]:
+    record_type = str(element.get("rtype") or "").upper()
+    if record_type not in MANAGED_TYPES:
+        return None
+
+    value = str(element.get("value") or "")
+    priority: Optional[int] = None
+    if record_type == "MX":
+        head, _, tail = value.strip().partition(" ")
+        if head.isdigit() and tail:
+            priority, value = int(head), tail
+
+    try:
+        ttl = int(element.get("ttl") or 0)
+    except (TypeError, ValueError):
+        ttl = 0
+
+    return ZoneRecord(
+        name=_normalize_name(str(element.get("name") or "@"), zone),
+        record_type=record_type,
+        value=_normalize_value(record_type, value),
+        ttl=ttl,
+        priority=priority,
+        isp_record_id=str(element.get("rkey") or element.get("elid") or "") or None,
+    )
+
+
+def compute_zone_diff(desired: Iterable[ZoneRecord], live: Iterable[ZoneRecord]) -> ZoneDiff:
+    """Посчитать минимальный набор create/update/delete.
+
+    Совпадение по ключу с другим TTL даёт update. Оставшиеся лишние и
+    недостающие записи с одинаковыми (имя, тип) попарно превращаются в update,
+    чтобы смена значения стоила одного вызова вместо удаления и создания.
+    Повторы строк БД и группы с записями панели без rkey попадают в
+    duplicates и conflicts и не меняются.
+    """
+
+    diff = ZoneDiff()
+    desired_by_key: Dict[str, ZoneRecord] = {}
+    for record in desired:
+        if record.key in desired_by_key:
+            diff.duplicates.append(record)
+        else:
+            desired_by_key[record.key] = record
+
+    live_by_key: Dict[str, ZoneRecord] = {}
+    surplus: List[ZoneRecord] = []
+    for record in live:
+        if record.key in live_by_key:
+            # Повтор в панели лишний: в БД запись одна
+            surplus.append(record)
+        else:
+            live_by_key[record.key] = record
+
+    # NS на вершине зоны панель ведёт сама, трогаем их только если они заданы явно
+    if not any(record.group == ("@", "NS") for record in desired_by_key.values()):
+        live_by_key = {key: record for key, record in live_by_key.items() if record.group != ("@", "NS")}
+        surplus = [record for record in surplus if record.group != ("@", "NS")]
+
+    missing: Dict[Tuple[str, str], List[ZoneRecord]] = defaultdict(list)
+    for key, record in desired_by_key.items():
+        current = live_by_key.pop(key, None)
+        if current is None:
+            missing[record.group].append(record)
+        elif current.ttl != record.ttl:
+            diff.update.append((current, record))
+        else:
+            diff.unchanged.append((current, record))
+
+    for current in [*live_by_key.values(), *surplus]:
+        candidates = missing.get(current.group)
+        if candidates:
+            diff.update.append((current, candidates.pop()))
+        else:
+            diff.delete.append(current)
+
+    for records in missing.values():
+        diff.create.extend(records)
+
+    # Запись без rkey нельзя ни изменить, ни удалить. Если менять группу частично,
+    # рядом со старым значением появится новое и в зоне будут обслуживаться оба
+    diff.conflicts = [current for current, _ in diff.update if not current.isp_record_id]
+    diff.conflicts += [current for current in diff.delete if not current.isp_record_id]
+    blocked = {record.group for record in diff.conflicts}
+    if blocked:
+        diff.create = [record for record in diff.create if record.group not in blocked]
+        diff.update = [(current, record) for current, record in diff.update if current.group not in blocked]
+        diff.delete = [record for record in diff.delete if record.group not in blocked]
+
+    return diff
+
+
+@dataclass
+class ZoneSyncResult:
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    conflicts: List[ZoneRecord] = field(default_factory=list)
+    duplicates: List[ZoneRecord] = field(default_factory=list)
+
+
+async def apply_zone_diff(
+    client: ISPManagerClient,
+    isp_domain_id: str,
+    diff: ZoneDiff,
+    identifiers: Optional[Dict[int, Optional[str]]] = None,
+) -> Dict[int, Optional[str]]:
+    """Отправить отличия в панель и вернуть новые rkey для строк dns_records.
+
+    Сначала создаются и изменяются записи, потом удаляются лишние: сбой на
+    середине оставляет в зоне лишние записи, а не дыру. identifiers
+    заполняется по мере ответов панели, так что при исключении вызывающий
+    сохраняет rkey уже созданных записей.
+    """
+
+    identifiers = {} if identifiers is None else identifiers
+    semaphore = asyncio.Semaphore(max(1, settings.isp_max_concurrency))
+
+    async def create(record: ZoneRecord) -> None:
+        async with semaphore:
+            response = await client.create_dns_record(
+                domain_id=isp_domain_id,
+                record_type=record.record_type,
+                name=record.name,
+                value=record.value,
+                ttl=record.ttl,
+                priority=record.priority,
+            )
+        if record.db_id is not None:
+            identifiers[record.db_id] = response.get("identifier")
+
+    async def edit(current: ZoneRecord, record: ZoneRecord) -> None:
+        async with semaphore:
+            response = await client.update_dns_record(
+                domain_id=isp_domain_id,
+                record_id=current.isp_record_id,
+                record_type=record.record_type,
+                name=record.name,
+                value=record.value,
+                ttl=record.ttl,
+                priority=record.priority,
+            )
+        if record.db_id is not None:
+            identifiers[record.db_id] = extract_identifier(response, "record_id")
+
+    async def run_batch(calls: List[Any]) -> None:
+        # Ждём всю пачку, чтобы rkey успешных вызовов не потерялись из-за соседнего сбоя
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    for current, record in diff.unchanged:
+        if record.db_id is not None and current.isp_record_id and current.isp_record_id != record.isp_record_id:
+            identifiers[record.db_id] = current.isp_record_id
+
+    batch_size = max(1, settings.isp_batch_size)
+
+    for batch in iter_batches(diff.create, batch_size):
+        await run_batch([create(record) for record in batch])
+
+    for batch in iter_batches(diff.update, batch_size):
+        await run_batch([edit(current, record) for current, record in batch])
+
+    for batch in iter_batches([record.isp_record_id for record in diff.delete], batch_size):
+        async with semaphore:
+            await client.delete_dns_records(domain_id=isp_domain_id, record_ids=batch)
+
+    return identifiers
+
+
+async def _save_identifiers(db: AsyncSession, identifiers: Dict[int, Optional[str]]) -> None:
+    if identifiers:
+        await db.execute(
+            update(DNSRecord),
+            [{"id": record_id, "isp_record_id": isp_record_id} for record_id, isp_record_id in identifiers.items()],
+        )
+        await db.commit()
+
+
+async def sync_domain_zone(
+    db: AsyncSession,
+    domain: Domain,
+    client: ISPManagerClient,
+    *,
+    dry_run: bool = False,
+) -> ZoneSyncResult:
+    """Привести зону домена в ISPmanager к содержимому dns_records."""
+
+    zone = domain.name.lower().rstrip(".")
+
+    result = await db.execute(select(DNSRecord).where(DNSRecord.domain_id == domain.id))
+    desired = [desired_record(record, zone) for record in result.scalars()]
+
+    live = [
+        record
+        for record in (live_record(element, zone) for element in await client.list_dns_records(domain_id=domain.isp_domain_id))
+        if record is not None
+    ]
+
+    diff = compute_zone_diff(desired, live)
+    summary = ZoneSyncResult(
+        created=len(diff.create),
+        updated=len(diff.update),
+        deleted=len(diff.delete),
+        unchanged=len(diff.unchanged),
+        conflicts=diff.conflicts,
+        duplicates=diff.duplicates,
+    )
+    for record in diff.conflicts:
+        logger.warning(
+            "DNS record %s %s %s in zone %s has no rkey, group left unchanged",
+            record.name,
+            record.record_type,
+            record.value,
+            zone,
+        )
+    if diff.duplicates:
+        logger.warning(
+            "Zone %s has duplicate dns_records rows: %s", zone, ", ".join(str(record.db_id) for record in diff.duplicates)
+        )
+
+    if dry_run:
+        return summary
+
+    identifiers: Dict[int, Optional[str]] = {}
+    try:
+        await apply_zone_diff(client, domain.isp_domain_id, diff, identifiers)
+    except BaseException:
+        # Созданные до сбоя записи уже в панели, их rkey нужны следующей синхронизации.
+        # Ошибка записи в БД не должна подменить исходную ошибку панели
+        try:
+            await _save_identifiers(db, identifiers)
+        except Exception:
+            logger.exception("Failed to save rkeys of DNS records created before zone %s sync failed", zone)
+        raise
+    await _save_identifiers(db, identifiers)
+
+    logger.info(
+        "DNS zone %s synced: +%d ~%d -%d =%d, %d conflicts",
+        zone,
+        summary.created,
+        summary.updated,
+        summary.deleted,
+        summary.unchanged,
+        len(summary.conflicts),
+    )
+    return summary
@@ -0,0 +1,307 @@
+"""Потоковый разбор зон BIND и JSONL для импорта DNS-записей."""
+
+from __future__ import annotations
+
+import codecs
+import re
+from typing import AsyncIterator, Iterator, Optional
+
+from pydantic import ValidationError
+
+from app.modules.domains.schemas import DNSRecordCreate, DNSRecordType
+
+DNS_CLASSES = {"IN", "CH", "HS", "CS"}
+SKIPPED_TYPES = {"SOA"}
+SUPPORTED_TYPES = {record_type.value for record_type in DNSRecordType}
+
+# Самая длинная допустимая строка файла: TXT с DKIM-ключом укладывается с запасом
+MAX_LINE_LENGTH = 64 * 1024
+
+_TTL_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+_TTL_RE = re.compile(r"^(\d+[smhdw]?)+$", re.IGNORECASE)
+_TTL_PART_RE = re.compile(r"(\d+)([smhdw]?)", re.IGNORECASE)
+
+
+class ZoneParseError(ValueError):
+    """Ошибка разбора файла зоны с номером строки."""
+
+    def __init__(self, line_no: int, message: str):
+        super().__init__(f"Строка {line_no}: {message}")
+        self.line_no = line_no
+        self.message = message
+
+
+def _parse_ttl(token: str) -> Optional[int]:
+    if not _TTL_RE.match(token):
+        return None
+    return sum(int(amount) * _TTL_UNITS[(unit or "s").lower()] for amount, unit in _TTL_PART_RE.findall(token))
+
+
+def _tokenize(line: str) -> list[tuple[str, bool]]:
+    """Разбить строку на токены (значение, был ли в кавычках), отбросив комментарий."""
+
+    tokens: list[tuple[str, bool]] = []
+    current: list[str] = []
+    quoted = False
+    in_token = False
+    index = 0
+
+    while index < len(line):
+        char = line[index]
+        if quoted:
+            if char == "\\" and index + 1 < len(line):
+                current.append(line[index + 1])
+                index += 2
+                continue
+            if char == '"':
+                tokens.append(("".join(current), True))
+                current = []
+                quoted = False
+                in_token = False
+            else:
+                current.append(char)
+        elif char == ";":
+            break
+        elif char == '"':
+            if in_token:
+                tokens.append(("".join(current), False))
+                current = []
+            quoted = True
+            in_token = True
+        elif char in "()":
+            if in_token:
+                tokens.append(("".join(current), False))
+                current = []
+                in_token = False
+            tokens.append((char, False))
+        elif char.isspace():
+            if in_token:
+                tokens.append(("".join(current), False))
+                current = []
+                in_token = False
+        else:
+            current.append(char)
+            in_token = True
+        index += 1
+
+    if quoted:
+        raise ValueError("незакрытая кавычка")
+    if in_token:
+        tokens.append(("".join(current), False))
+    return tokens
+
+
+class ZoneFileParser:
+    """Построчный парсер зоны BIND: хранит только $ORIGIN, $TTL и незакрытые скобки."""
+
+    def __init__(self, zone_name: str, default_ttl: int = 3600):
+        self.zone = zone_name.lower().rstrip(".")
+        self.origin = self.zone
+        self.default_ttl = default_ttl
+        self.last_owner: Optional[str] = None
+        self.skipped = 0
+        self._pending: list[tuple[str, bool]] = []
+        self._pending_owner_blank = False
+        self._pending_line = 0
+        self._depth = 0
+
+    def _absolute(self, name: str) -> str:
+        if name == "@":
+            return self.origin
+        if name.endswith("."):
+            return name.rstrip(".").lower()
+        return f"{name}.{self.origin}".lower()
+
+    def _relative(self, line_no: int, name: str) -> str:
+        absolute = self._absolute(name)
+        if absolute == self.zone:
+            return "@"
+        suffix = f".{self.zone}"
+        if not absolute.endswith(suffix):
+            raise ZoneParseError(line_no, f"имя {name!r} вне зоны {self.zone}")
+        return absolute[: -len(suffix)]
+
+    def feed(self, line_no: int, line: str) -> Optional[DNSRecordCreate]:
+        try:
+            tokens = _tokenize(line)
+        except ValueError as exc:
+            raise ZoneParseError(line_no, str(exc)) from exc
+
+        if not self._pending and not self._depth:
+            if not tokens:
+                return None
+            self._pending_owner_blank = line[:1].isspace()
+            self._pending_line = line_no
+
+        for token, quoted in tokens:
+            if not quoted and token == "(":
+                self._depth += 1
+            elif not quoted and token == ")":
+                self._depth -= 1
+                if self._depth < 0:
+                    raise ZoneParseError(line_no, "лишняя закрывающая скобка")
+            else:
+                self._pending.append((token, quoted))
+
+        if self._depth:
+            return None
+
+        pending, self._pending = self._pending, []
+        if not pending:
+            return None
+        return self._build(self._pending_line, pending, self._pending_owner_blank)
+
+    def finish(self) -> None:
+        if self._depth or self._pending:
+            raise ZoneParseError(self._pending_line, "незакрытая скобка в конце файла")
+
+    async def parse(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[DNSRecordCreate]:
+        """Инкрементально разобрать загружаемый файл, отдавая записи по мере чтения."""
+
+        async for line_no, line in iter_lines(chunks):
+            record = self.feed(line_no, line)
+            if record is not None:
+                yield record
+        self.finish()
+
+    def _build(self, line_no: int, tokens: list[tuple[str, bool]], owner_blank: bool) -> Optional[DNSRecordCreate]:
+        first = tokens[0][0]
+
+        if first.upper() == "$ORIGIN":
+            if len(tokens) < 2:
+                raise ZoneParseError(line_no, "$ORIGIN без значения")
+            self.origin = self._absolute(tokens[1][0])
+            return None
+        if first.upper() == "$TTL":
+            ttl = _parse_ttl(tokens[1][0]) if len(tokens) > 1 else None
+            if ttl is None:
+                raise ZoneParseError(line_no, "некорректный $TTL")
+            self.default_ttl = ttl
+            return None
+        if first.startswith("$"):
+            raise ZoneParseError(line_no, f"директива {first} не поддерживается")
+
+        rest = list(tokens)
+        if owner_blank:
+            if self.last_owner is None:
+                raise ZoneParseError(line_no, "запись без имени владельца")
+            owner = self.last_owner
+        else:
+            owner = rest.pop(0)[0]
+            self.last_owner = owner
+
+        ttl = self.default_ttl
+        record_type: Optional[str] = None
+        while rest:
+            token = rest.pop(0)[0]
+            parsed_ttl = _parse_ttl(token)
+            if parsed_ttl is not None:
+                ttl = parsed_ttl
+            elif token.upper() in DNS_CLASSES:
+                continue
+            else:
+                record_type = token.upper()
+                break
+
+        if record_type is None:
+            raise ZoneParseError(line_no, "не указан тип записи")
+        if record_type in SKIPPED_TYPES:
+            self.skipped += 1
+            return None
+        if record_type not in SUPPORTED_TYPES:
+            raise ZoneParseError(line_no, f"тип записи {record_type} не поддерживается")
+        if not rest:
+            raise ZoneParseError(line_no, "пустое значение записи")
+
+        priority: Optional[int] = None
+        if record_type == "MX":
+            if len(rest) != 2 or not rest[0][0].isdigit():
+                raise ZoneParseError(line_no, "MX должна содержать приоритет и хост")
+            priority = int(rest[0][0])
+            rest = rest[1:]
+
+        if record_type == "TXT":
+            value = "".join(token for token, _ in rest)
+        else:
+            value = " ".join(token for token, _ in rest)
+
+        try:
+            return DNSRecordCreate(
+                record_type=record_type,
+                name=self._relative(line_no, owner),
+                value=value,
+                ttl=ttl,
+                priority=priority,
+            )
+        except ValidationError as exc:
+            raise ZoneParseError(line_no, exc.errors()[0]["msg"]) from exc
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, str]]:
+    """Нарезать поток байт на строки, не держа в памяти больше одной строки.
+
+    Строка длиннее MAX_LINE_LENGTH символов — ошибка: без этого поток без
+    переводов строк копился бы в памяти целиком.
+    """
+
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="strict")
+    buffer = ""
+    line_no = 0
+
+    async for chunk in chunks:
+        try:
+            buffer += decoder.decode(chunk)
+        except UnicodeDecodeError as exc:
+            raise ZoneParseError(line_no + 1, "файл не в кодировке UTF-8") from exc
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            line_no += 1
+            if len(line) > MAX_LINE_LENGTH:
+                raise ZoneParseError(line_no, f"строка длиннее {MAX_LINE_LENGTH} символов")
+            yield line_no, line.rstrip("\r")
+        if len(buffer) > MAX_LINE_LENGTH:
+            raise ZoneParseError(line_no + 1, f"строка длиннее {MAX_LINE_LENGTH} символов")
+
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield line_no + 1, buffer.rstrip("\r")
+
+
+def _parse_jsonl_line(line_no: int, line: str) -> Optional[DNSRecordCreate]:
+    if not line.strip():
+        return None
+    try:
+        return DNSRecordCreate.model_validate_json(line)
+    except ValidationError as exc:
+        error = exc.errors()[0]
+        location = ".".join(str(part) for part in error.get("loc", ()))
+        raise ZoneParseError(line_no, f"{location}: {error['msg']}" if location else error["msg"]) from exc
+
+
+async def parse_jsonl(chunks: AsyncIterator[bytes]) -> AsyncIterator[DNSRecordCreate]:
+    """Разобрать JSONL, где каждая строка соответствует DNSRecordCreate."""
+
+    async for line_no, line in iter_lines(chunks):
+        record = _parse_jsonl_line(line_no, line)
+        if record is not None:
+            yield record
+
+
+def iter_batches(items: list, size: int) -> Iterator[list]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _quote_txt(value: str) -> str:
+    # BIND ограничивает одну строку символов 255 байтами
+    parts = [value[start : start + 255] for start in range(0, len(value), 255)] or [""]
+    return " ".join('"' + part.replace("\\", "\\\\").replace('"', '\\"') + '"' for part in parts)
+
+
+def format_record(name: str, record_type: str, value: str, ttl: int, priority: Optional[int]) -> str:
+    """Сформировать строку зоны BIND для одной записи."""
+
+    rdata = _quote_txt(value) if record_type == "TXT" else value
+    if record_type == "MX":
+        rdata = f"{priority if priority is not None else 10} {rdata}"
+    return f"{name}\t{ttl}\tIN\t{record_type}\t{rdata}\n"
@@ -0,0 +1,299 @@
+"""Безопасная распаковка архива сайта и атомарная подмена каталога.
+
+Функции выполняются в процессах пула деплоя, поэтому модуль зависит
+только от стандартной библиотеки. Архив (zip или tar, в том числе сжатый)
+распаковывается во временный каталог рядом с корнем сайта, после чего
+каталоги меняются местами одним renameat2(RENAME_EXCHANGE); без него —
+двумя rename подряд.
+
+Каталоги внутри home принадлежат пользователю и меняются по FTP прямо во
+время распаковки, поэтому путь к корню сайта не разыменовывается заранее:
+все операции идут относительно дескрипторов каталогов, открытых от home по
+одному компоненту с O_NOFOLLOW. Ссылка, подложенная вместо каталога, даёт
+ошибку, а не запись за пределами home.
+
+Пути с «..», абсолютные пути, ссылки и специальные файлы в архив не
+пропускаются; число файлов и объём распакованных данных ограничены, причём
+объём считается по фактически записанным байтам, а не по заголовкам.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import errno
+import os
+import secrets
+import shutil
+import stat
+import tarfile
+import zipfile
+import zlib
+from typing import BinaryIO, Optional, Set, Tuple
+
+_COPY_BUFFER = 1024 * 1024
+_RENAME_EXCHANGE = 2
+_OPEN_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW | getattr(os, "O_CLOEXEC", 0)
+_DIR_FLAGS = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW | getattr(os, "O_CLOEXEC", 0)
+
+
+class ArchiveError(Exception):
+    """Архив нельзя развернуть; текст показывается пользователю."""
+
+
+def safe_member_path(name: str) -> Optional[str]:
+    """Нормализованный относительный путь элемента; None — корень архива."""
+
+    if "\x00" in name:
+        raise ArchiveError("Недопустимое имя файла в архиве")
+    normalized = name.replace("\\", "/")
+    parts = [part for part in normalized.split("/") if part not in ("", ".")]
+    if normalized.startswith("/") or ".." in parts or (parts and parts[0].endswith(":")):
+        raise ArchiveError(f"Недопустимый путь в архиве: {name}")
+    return "/".join(parts) or None
+
+
+class _Extractor:
+    """Запись элементов архива в staging с учётом лимитов.
+
+    Пути элементов разрешаются относительно дескриптора staging: каталог
+    создан этим процессом с правами 0700, и пользователь не может подложить
+    в него ссылки до окончания распаковки.
+    """
+
+    def __init__(self, target_fd: int, max_files: int, max_bytes: int, owner: Optional[Tuple[int, int]]):
+        self.target_fd = target_fd
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.owner = owner
+        self.files = 0
+        self.bytes = 0
+        self._dirs: Set[str] = {""}
+
+    def directory(self, rel: str) -> None:
+        if rel in self._dirs:
+            return
+        parent = rel.rpartition("/")[0]
+        self.directory(parent)
+        try:
+            os.mkdir(rel, 0o755, dir_fd=self.target_fd)
+        except FileExistsError:
+            if not stat.S_ISDIR(os.stat(rel, dir_fd=self.target_fd, follow_symlinks=False).st_mode):
+                raise ArchiveError(f"Файл и каталог с одним именем в архиве: {rel}") from None
+        else:
+            if self.owner is not None:
+                os.chown(rel, *self.owner, dir_fd=self.target_fd, follow_symlinks=False)
+        self._dirs.add(rel)
+
+    def file(self, rel: str, source: BinaryIO, executable: bool) -> None:
+        self.files += 1
+        if self.files > self.max_files:
+            raise ArchiveError(f"В архиве больше {self.max_files} файлов")
+        self.directory(rel.rpartition("/")[0])
+        mode = 0o755 if executable else 0o644
+        try:
+            fd = os.open(rel, _OPEN_FLAGS, mode, dir_fd=self.target_fd)
+        except FileExistsError:
+            if rel in self._dirs:
+                raise ArchiveError(f"Файл и каталог с одним именем в архиве: {rel}") from None
+            # Повторный элемент с тем же именем: как у unzip, побеждает последний
+            os.unlink(rel, dir_fd=self.target_fd)
+            fd = os.open(rel, _OPEN_FLAGS, mode, dir_fd=self.target_fd)
+        with open(fd, "wb", closefd=True) as output:
+            if self.owner is not None:
+                os.fchown(fd, *self.owner)
+            while True:
+                chunk = source.read(_COPY_BUFFER)
+                if not chunk:
+                    break
+                self.bytes += len(chunk)
+                if self.bytes > self.max_bytes:
+                    raise ArchiveError(f"Распакованный архив больше {self.max_bytes // (1024 * 1024)} МБ")
+                output.write(chunk)
+
+
+def _extract_zip(archive: str, extractor: _Extractor) -> None:
+    try:
+        _extract_zip_members(archive, extractor)
+    except (zipfile.BadZipFile, zlib.error) as exc:
+        raise ArchiveError("Архив повреждён или имеет неподдерживаемый формат") from exc
+
+
+def _extract_zip_members(archive: str, extractor: _Extractor) -> None:
+    with zipfile.ZipFile(archive) as bundle:
+        members = bundle.infolist()
+        # Заголовкам не доверяем, но явно завышенный архив отклоняем до записи
+        if len(members) > extractor.max_files * 2 or sum(member.file_size for member in members) > extractor.max_bytes:
+            raise ArchiveError(f"Распакованный архив больше {extractor.max_bytes // (1024 * 1024)} МБ")
+        for member in members:
+            rel = safe_member_path(member.filename)
+            if rel is None:
+                continue
+            mode = member.external_attr >> 16
+            if member.is_dir():
+                extractor.directory(rel)
+            elif stat.S_IFMT(mode) not in (0, stat.S_IFREG):
+                continue  # ссылки и специальные файлы
+            else:
+                with bundle.open(member) as source:
+                    extractor.file(rel, source, bool(mode & 0o111))
+
+
+def _extract_tar(archive: str, extractor: _Extractor) -> None:
+    try:
+        # Потоковый режим: элементы читаются по порядку без повторных проходов по сжатому файлу
+        with tarfile.open(archive, "r|*") as bundle:
+            for member in bundle:
+                rel = safe_member_path(member.name)
+                if rel is None:
+                    continue
+                if member.isdir():
+                    extractor.directory(rel)
+                elif member.isreg():
+                    source = bundle.extractfile(member)
+                    if source is not None:
+                        extractor.file(rel, source, bool(member.mode & 0o111))
+    except (tarfile.ReadError, EOFError) as exc:
+        raise ArchiveError("Архив повреждён или имеет неподдерживаемый формат") from exc
+
+
+def _exchange(dir_fd: int, first: str, second: str) -> bool:
+    """Атомарно поменять местами две записи каталога dir_fd (Linux 3.15+, glibc 2.28+)."""
+
+    renameat2 = getattr(ctypes.CDLL(None, use_errno=True), "renameat2", None)
+    if renameat2 is None:
+        return False
+    result = renameat2(dir_fd, os.fsencode(first), dir_fd, os.fsencode(second), _RENAME_EXCHANGE)
+    return result == 0
+
+
+def _tree_size(dir_fd: int, name: str) -> int:
+    total = 0
+    for _, _, files, directory_fd in os.fwalk(name, dir_fd=dir_fd):
+        for file_name in files:
+            try:
+                total += os.stat(file_name, dir_fd=directory_fd, follow_symlinks=False).st_size
+            except FileNotFoundError:
+                continue
+    return total
+
+
+def _open_parent(home: str, root_path: str, owner: Optional[Tuple[int, int]]) -> int:
+    """Дескриптор каталога-родителя корня сайта; недостающие каталоги создаются.
+
+    Спуск от home идёт по одному компоненту с O_NOFOLLOW, поэтому ссылка
+    на любом уровне пути даёт ошибку вместо выхода за пределы home.
+    """
+
+    fd = os.open(home, _DIR_FLAGS)
+    try:
+        for part in root_path.split("/")[:-1]:
+            created = False
+            try:
+                os.mkdir(part, 0o755, dir_fd=fd)
+                created = True
+            except FileExistsError:
+                pass
+            try:
+                child = os.open(part, _DIR_FLAGS, dir_fd=fd)
+            except OSError as exc:
+                if exc.errno in (errno.ELOOP, errno.ENOTDIR):
+                    raise ArchiveError("Путь к корню сайта содержит ссылку или файл") from None
+                raise
+            os.close(fd)
+            fd = child
+            if created and owner is not None:
+                os.fchown(fd, *owner)
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+
+def _make_staging(parent_fd: int) -> Tuple[str, int]:
+    """Создать и открыть каталог распаковки рядом с корнем сайта."""
+
+    while True:
+        name = f".deploy-{secrets.token_hex(8)}"
+        try:
+            os.mkdir(name, 0o700, dir_fd=parent_fd)
+            break
+        except FileExistsError:
+            continue
+    fd = os.open(name, _DIR_FLAGS, dir_fd=parent_fd)
+    # Между mkdir и open запись каталога могли подменить каталогом пользователя
+    if os.fstat(fd).st_uid != os.geteuid():
+        os.close(fd)
+        raise ArchiveError("Каталог распаковки подменён во время развёртывания")
+    return name, fd
+
+
+def deploy_archive(
+    archive: str,
+    home: str,
+    root_path: str,
+    *,
+    max_files: int,
+    max_bytes: int,
+    quota_left: Optional[int] = None,
+    owner: Optional[Tuple[int, int]] = None,
+) -> Tuple[int, int]:
+    """Развернуть архив в home/root_path с подменой содержимого; возвращает (файлы, байты).
+
+    root_path — нормализованный относительный путь без «..». quota_left —
+    свободное место по квоте: к нему добавляется объём текущего содержимого
+    корня, которое будет удалено.
+    """
+
+    parent_fd = _open_parent(home, root_path, owner)
+    try:
+        return _deploy_into(archive, parent_fd, root_path.rpartition("/")[2], max_files, max_bytes, quota_left, owner)
+    finally:
+        os.close(parent_fd)
+
+
+def _deploy_into(
+    archive: str,
+    parent_fd: int,
+    name: str,
+    max_files: int,
+    max_bytes: int,
+    quota_left: Optional[int],
+    owner: Optional[Tuple[int, int]],
+) -> Tuple[int, int]:
+    try:
+        root_mode: Optional[int] = os.stat(name, dir_fd=parent_fd, follow_symlinks=False).st_mode
+    except FileNotFoundError:
+        root_mode = None
+    if root_mode is not None and not stat.S_ISDIR(root_mode):
+        raise ArchiveError("Корень сайта не является каталогом")
+    if quota_left is not None:
+        available = quota_left + (_tree_size(parent_fd, name) if root_mode is not None else 0)
+        max_bytes = min(max_bytes, max(0, available))
+
+    # Рядом с корнем: rename возможен только в пределах одной файловой системы
+    staging, staging_fd = _make_staging(parent_fd)
+    try:
+        extractor = _Extractor(staging_fd, max_files, max_bytes, owner)
+        if zipfile.is_zipfile(archive):
+            _extract_zip(archive, extractor)
+        else:
+            _extract_tar(archive, extractor)
+        os.fchmod(staging_fd, stat.S_IMODE(root_mode) if root_mode is not None else 0o755)
+        if owner is not None:
+            os.fchown(staging_fd, *owner)
+
+        if root_mode is None:
+            os.rename(staging, name, src_dir_fd=parent_fd, dst_dir_fd=parent_fd)
+        elif not _exchange(parent_fd, staging, name):
+            previous = f"{staging}.old"
+            os.rename(name, previous, src_dir_fd=parent_fd, dst_dir_fd=parent_fd)
+            os.rename(staging, name, src_dir_fd=parent_fd, dst_dir_fd=parent_fd)
+            os.rename(previous, staging, src_dir_fd=parent_fd, dst_dir_fd=parent_fd)
+    except BaseException:
+        shutil.rmtree(staging, dir_fd=parent_fd, ignore_errors=True)
+        raise
+    finally:
+        os.close(staging_fd)
+    # После подмены в staging лежит прежнее содержимое сайта; rmtree по дескрипторам не идёт по ссылкам
+    shutil.rmtree(staging, dir_fd=parent_fd, ignore_errors=True)
+    return extractor.files, extractor.bytes
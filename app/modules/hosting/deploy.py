@@ -0,0 +1,312 @@
+"""Загрузка архива сайта по частям и развёртывание в root_path.
+
+POST /hosting/sites/{id}/deploy создаёт загрузку с заявленным размером.
+Части приходят PATCH-запросами с заголовком Upload-Offset и дописываются в
+deploy_upload_dir/{deploy_id}.part по мере чтения тела, без буферизации
+архива в памяти. Принятое смещение — размер этого файла, поэтому оборванную
+загрузку продолжают с offset из GET .../deploy/{deploy_id}. Часть, дошедшая
+до заявленного размера, переводит загрузку в extracting, и архив
+распаковывается в пуле процессов (archive.deploy_archive).
+
+Распаковка живёт в памяти воркера, поэтому после падения или перезапуска
+строка осталась бы в extracting навсегда. run_deploy_sweeper при старте и
+затем раз в deploy_sweep_interval переводит в failed распаковки старше
+deploy_extract_stale_minutes и загрузки без новых частей дольше
+deploy_upload_stale_hours, удаляя их .part.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Optional, Set, Tuple
+
+from sqlalchemy import select, update
+
+from app.core.config import settings
+from app.core.db import async_session_maker
+from app.modules.hosting.archive import ArchiveError, deploy_archive
+from app.modules.hosting.models import SiteDeploy
+from app.modules.hosting.schemas import DeployStatus
+from app.modules.outbox.events import SITE_DEPLOYED, record_event
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Тело части копится до этого размера и пишется одним write
+_WRITE_BUFFER = MB
+
+_pool: Optional[ProcessPoolExecutor] = None
+_tasks: Set[asyncio.Task] = set()
+# Загрузки, которые распаковывает этот воркер: уборка их не трогает
+_extracting: Set[str] = set()
+
+
+class UploadConflict(Exception):
+    """Смещение части не совпадает с принятым или загрузку пишет другой запрос."""
+
+    def __init__(self, offset: int):
+        super().__init__(offset)
+        self.offset = offset
+
+
+class UploadTooLarge(Exception):
+    """Часть выходит за заявленный размер архива."""
+
+
+def part_path(deploy_id: str) -> str:
+    return os.path.join(settings.deploy_upload_dir, f"{deploy_id}.part")
+
+
+def upload_offset(deploy_id: str) -> int:
+    try:
+        return os.path.getsize(part_path(deploy_id))
+    except FileNotFoundError:
+        return 0
+
+
+def discard_upload(deploy_id: str) -> None:
+    try:
+        os.unlink(part_path(deploy_id))
+    except FileNotFoundError:
+        pass
+
+
+def resolve_site_root(home_directory: str, root_path: str) -> Optional[str]:
+    """Корень сайта относительно домашнего каталога; None — путь ведёт наружу.
+
+    Проверка только по тексту пути: ссылки не разыменовываются здесь, а
+    отвергаются при распаковке, когда archive.deploy_archive спускается от
+    home по дескрипторам каталогов.
+    """
+
+    home = os.path.normpath(home_directory)
+    root = os.path.relpath(os.path.normpath(os.path.join(home, root_path)), home)
+    if root == "." or root == os.pardir or root.startswith(os.pardir + os.sep):
+        return None
+    return root
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+async def append_chunk(deploy_id: str, offset: int, size: int, chunks: AsyncIterator[bytes]) -> int:
+    """Дописать тело части с offset; возвращает новое принятое смещение."""
+
+    os.makedirs(settings.deploy_upload_dir, mode=0o700, exist_ok=True)
+    fd = os.open(part_path(deploy_id), os.O_WRONLY | os.O_CREAT | os.O_CLOEXEC, 0o600)
+    loop = asyncio.get_running_loop()
+    pending: Optional[asyncio.Future] = None
+    try:
+        try:
+            # flock снимается вместе с закрытием fd, в том числе при гибели воркера
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadConflict(os.fstat(fd).st_size) from None
+        accepted = os.fstat(fd).st_size
+        if accepted != offset:
+            raise UploadConflict(accepted)
+        os.lseek(fd, accepted, os.SEEK_SET)
+
+        received = accepted
+        buffer = bytearray()
+        async for chunk in chunks:
+            received += len(chunk)
+            if received > size:
+                os.ftruncate(fd, offset)
+                raise UploadTooLarge()
+            buffer += chunk
+            if len(buffer) >= _WRITE_BUFFER:
+                data = bytes(buffer)
+                buffer.clear()
+                pending = loop.run_in_executor(None, _write_all, fd, data)
+                await asyncio.shield(pending)
+        if buffer:
+            pending = loop.run_in_executor(None, _write_all, fd, bytes(buffer))
+            await asyncio.shield(pending)
+        return received
+    finally:
+        if pending is not None and not pending.done():
+            # Запрос отменён во время записи: fd закрывается только после неё
+            await asyncio.wait({pending})
+        os.close(fd)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: форк процесса с работающим event loop и пулом соединений небезопасен
+        _pool = ProcessPoolExecutor(
+            max_workers=max(1, settings.deploy_workers), mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+async def close_deploy_pool(timeout: float) -> None:
+    """Дождаться начатых распаковок (не дольше timeout) и остановить пул."""
+
+    global _pool
+    if _tasks:
+        logger.info("Waiting for %d deploy extractions", len(_tasks))
+        await asyncio.wait(set(_tasks), timeout=timeout)
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _owner(home_directory: str) -> Optional[Tuple[int, int]]:
+    """Владелец домашнего каталога; менять владельца файлов может только root."""
+
+    if os.geteuid() != 0:
+        return None
+    home_stat = os.stat(home_directory)
+    return home_stat.st_uid, home_stat.st_gid
+
+
+async def _finish(deploy_id: str, status: DeployStatus, **values) -> Optional[SiteDeploy]:
+    async with async_session_maker() as db:
+        deploy = await db.get(SiteDeploy, deploy_id)
+        if deploy is None:
+            return None
+        deploy.status = status.value
+        for name, value in values.items():
+            setattr(deploy, name, value)
+        if status == DeployStatus.DONE:
+            record_event(
+                db,
+                SITE_DEPLOYED,
+                "site",
+                deploy.site_id,
+                {"user_id": deploy.user_id, "deploy_id": deploy.id, "files": deploy.files, "bytes": deploy.bytes},
+            )
+        await db.commit()
+        return deploy
+
+
+async def _extract(deploy_id: str, home_directory: str, root: str, quota_left: Optional[int]) -> None:
+    try:
+        job = partial(
+            deploy_archive,
+            part_path(deploy_id),
+            os.path.realpath(home_directory),
+            root,
+            max_files=settings.deploy_max_files,
+            max_bytes=settings.deploy_max_extracted_mb * MB,
+            quota_left=quota_left,
+            owner=_owner(home_directory),
+        )
+        files, size = await asyncio.get_running_loop().run_in_executor(_get_pool(), job)
+    except ArchiveError as exc:
+        await _finish(deploy_id, DeployStatus.FAILED, error=str(exc))
+    except Exception:
+        logger.exception("Deploy %s extraction failed", deploy_id)
+        await _finish(deploy_id, DeployStatus.FAILED, error="Не удалось развернуть архив")
+    else:
+        logger.info("Deploy %s extracted to %s: files=%d bytes=%d", deploy_id, root, files, size)
+        await _finish(deploy_id, DeployStatus.DONE, files=files, bytes=size, error=None)
+    finally:
+        _extracting.discard(deploy_id)
+        discard_upload(deploy_id)
+
+
+async def start_extraction(deploy_id: str, home_directory: str, root: str, quota_left: Optional[int]) -> bool:
+    """Перевести загрузку в extracting и запустить распаковку root (пути от home); False — это уже сделал другой запрос."""
+
+    async with async_session_maker() as db:
+        result = await db.execute(
+            update(SiteDeploy)
+            .where(SiteDeploy.id == deploy_id, SiteDeploy.status == DeployStatus.UPLOADING.value)
+            .values(status=DeployStatus.EXTRACTING.value)
+        )
+        await db.commit()
+    if not result.rowcount:
+        return False
+    # Распаковка переживает запрос: её не отменяют ни срок запроса, ни отключение клиента
+    _extracting.add(deploy_id)
+    task = asyncio.create_task(_extract(deploy_id, home_directory, root, quota_left))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return True
+
+
+def _part_mtime(deploy_id: str) -> Optional[float]:
+    try:
+        return os.path.getmtime(part_path(deploy_id))
+    except FileNotFoundError:
+        return None
+
+
+async def _fail_stale(status: DeployStatus, cutoff: datetime, error: str, upload_cutoff: Optional[float]) -> List[str]:
+    async with async_session_maker() as db:
+        candidates = (
+            await db.scalars(
+                select(SiteDeploy.id).where(SiteDeploy.status == status.value, SiteDeploy.updated_at < cutoff)
+            )
+        ).all()
+        # Части загрузки пишутся без обновления строки: свежесть смотрим по .part
+        stale = [
+            deploy_id
+            for deploy_id in candidates
+            if deploy_id not in _extracting
+            and (upload_cutoff is None or (_part_mtime(deploy_id) or 0.0) < upload_cutoff)
+        ]
+        if not stale:
+            return []
+        result = await db.execute(
+            update(SiteDeploy)
+            .where(SiteDeploy.id.in_(stale), SiteDeploy.status == status.value, SiteDeploy.updated_at < cutoff)
+            .values(status=DeployStatus.FAILED.value, error=error)
+            .returning(SiteDeploy.id)
+        )
+        failed = list(result.scalars())
+        await db.commit()
+    return failed
+
+
+async def sweep_stale_deploys() -> int:
+    """Перевести в failed прерванные распаковки и брошенные загрузки; вернуть их число."""
+
+    now = datetime.now(timezone.utc)
+    failed = await _fail_stale(
+        DeployStatus.EXTRACTING,
+        now - timedelta(minutes=settings.deploy_extract_stale_minutes),
+        "Распаковка прервана, загрузите архив заново",
+        None,
+    )
+    upload_age = settings.deploy_upload_stale_hours * 3600
+    failed += await _fail_stale(
+        DeployStatus.UPLOADING,
+        now - timedelta(seconds=upload_age),
+        "Загрузка брошена",
+        time.time() - upload_age,
+    )
+    for deploy_id in failed:
+        discard_upload(deploy_id)
+    if failed:
+        logger.info("Marked %d stale deploys as failed", len(failed))
+    return len(failed)
+
+
+async def run_deploy_sweeper() -> None:
+    """Периодическая уборка; запускается из lifespan при deploy_sweep_interval > 0."""
+
+    while True:
+        try:
+            await sweep_stale_deploys()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Deploy sweep failed")
+        await asyncio.sleep(settings.deploy_sweep_interval)
@@ -0,0 +1,225 @@
+"""Чтение хвоста и поиск по логам сайта через mmap.
+
+Строки ищутся по границам «\\n» прямо в отображённом файле, копируются
+только возвращаемые строки (не длиннее max_line байт), поэтому память не
+зависит от размера лога. Смещения — байтовые позиции начала строк: их
+отдают клиенту как курсоры. Поиск — подстрока, как grep -F: mmap.rfind
+перескакивает сразу к совпадениям, без учёта регистра файл просматривается
+окнами через re.finditer.
+
+Каталог логов лежит в home и принадлежит пользователю, поэтому лог
+открывается не по готовому пути: от home по одному компоненту с O_NOFOLLOW
+и затем сам файл относительно дескриптора каталога. Ссылка на любом уровне
+не позволяет прочитать чужой файл.
+
+Функции выполняются в потоках и процессах пула, поэтому модуль зависит
+только от стандартной библиотеки.
+"""
+
+from __future__ import annotations
+
+import errno
+import mmap
+import os
+import re
+import stat
+from dataclasses import dataclass, field
+from typing import List, NamedTuple, Optional, Pattern, Tuple
+
+# (смещение начала строки, содержимое)
+Line = Tuple[int, bytes]
+
+_SEARCH_WINDOW = 4 * 1024 * 1024
+_CLOEXEC = getattr(os, "O_CLOEXEC", 0)
+_DIR_FLAGS = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW | _CLOEXEC
+# O_NONBLOCK: открытие FIFO с именем лога не должно зависать
+_FILE_FLAGS = os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK | _CLOEXEC
+
+
+class LogLocation(NamedTuple):
+    home: str  # разыменованный домашний каталог
+    directory: str  # каталог логов относительно home
+    name: str
+
+
+def open_log(location: LogLocation) -> int:
+    """Дескриптор лога только для чтения; ссылка, каталог или FIFO — как отсутствующий файл."""
+
+    dir_fd = os.open(location.home, os.O_RDONLY | os.O_DIRECTORY | _CLOEXEC)
+    try:
+        for part in location.directory.split("/"):
+            if part in ("", "."):
+                continue
+            if part == "..":
+                raise FileNotFoundError(errno.ENOENT, "Каталог логов вне домашнего каталога", location.directory)
+            child = os.open(part, _DIR_FLAGS, dir_fd=dir_fd)
+            os.close(dir_fd)
+            dir_fd = child
+        fd = os.open(location.name, _FILE_FLAGS, dir_fd=dir_fd)
+    except OSError as exc:
+        if exc.errno in (errno.ELOOP, errno.ENOTDIR, errno.ENOENT):
+            raise FileNotFoundError(errno.ENOENT, "Лог не найден", location.name) from None
+        raise
+    finally:
+        os.close(dir_fd)
+    if not stat.S_ISREG(os.fstat(fd).st_mode):
+        os.close(fd)
+        raise FileNotFoundError(errno.ENOENT, "Лог не является файлом", location.name)
+    return fd
+
+
+@dataclass
+class LogSlice:
+    lines: List[Line] = field(default_factory=list)
+    start: int = 0  # позиция, до которой прочитано назад; 0 — достигнуто начало файла
+    end: int = 0  # позиция после последней прочитанной строки
+    size: int = 0
+    inode: int = 0
+
+
+def _floor_cursor(mm: mmap.mmap, floor: int, pos: int) -> int:
+    """Курсор после просмотра до floor: начало строки, следующей за пересекающей floor.
+
+    Пересекающую строку следующая страница просмотрит целиком.
+    """
+
+    boundary = mm.find(b"\n", floor, pos) + 1
+    return boundary if 0 < boundary < pos else floor
+
+
+def _grep_backward_ignore_case(
+    mm: mmap.mmap, end: int, limit: int, needle: bytes, floor: int, max_line: int
+) -> Tuple[List[Line], int]:
+    """Поиск без учёта регистра окнами: re.finditer по окну идёт в C, без цикла по строкам."""
+
+    pattern = re.compile(re.escape(needle), re.IGNORECASE)
+    lowest = max(0, floor - max_line)
+    lines: List[Line] = []
+    pos = end
+    while pos > floor:
+        window_start = max(floor, pos - _SEARCH_WINDOW)
+        if window_start > floor:
+            window_start = mm.find(b"\n", window_start, pos) + 1 or floor
+        starts: List[int] = []
+        for match in pattern.finditer(mm, window_start, pos):
+            start = mm.rfind(b"\n", lowest, match.start()) + 1 or lowest
+            if not starts or starts[-1] != start:
+                starts.append(start)
+        for start in reversed(starts):
+            line_end = mm.find(b"\n", start, pos)
+            lines.append((start, mm[start:min(line_end if line_end >= 0 else pos, start + max_line)]))
+            if len(lines) == limit:
+                return lines, start
+        pos = window_start
+    if lines and lines[-1][0] < floor:
+        return lines, lines[-1][0]
+    return lines, _floor_cursor(mm, floor, lines[-1][0] if lines else end) if floor else 0
+
+
+def _read_backward(
+    mm: mmap.mmap,
+    end: int,
+    limit: int,
+    needle: Optional[bytes],
+    ignore_case: bool,
+    floor: int,
+    max_line: int,
+) -> Tuple[List[Line], int]:
+    if needle is not None and ignore_case:
+        return _grep_backward_ignore_case(mm, end, limit, needle, floor, max_line)
+    lines: List[Line] = []
+    pos = end
+    # Строка, начатая до floor, ищется ещё на max_line байт назад; более длинная обрезается спереди
+    lowest = max(0, floor - max_line)
+    fast = needle is not None
+    while pos > floor and len(lines) < limit:
+        if fast:
+            hit = mm.rfind(needle, floor, pos)
+            if hit < 0:
+                return lines, _floor_cursor(mm, floor, pos) if floor else 0
+            start = mm.rfind(b"\n", lowest, hit) + 1 or lowest
+            line_end = mm.find(b"\n", hit, pos)
+            if line_end < 0:
+                line_end = pos
+        else:
+            line_end = pos - 1 if mm[pos - 1] == 0x0A else pos
+            start = mm.rfind(b"\n", lowest, line_end) + 1 or lowest
+        line = mm[start:min(line_end, start + max_line)]
+        lines.append((start, line))
+        pos = start
+    return lines, pos
+
+
+def read_backward(
+    location: LogLocation,
+    before: Optional[int],
+    limit: int,
+    *,
+    needle: Optional[bytes] = None,
+    ignore_case: bool = False,
+    max_scan: int,
+    max_line: int = 8192,
+) -> LogSlice:
+    """Последние limit подходящих строк перед позицией before (None — конец файла).
+
+    Просматривается не больше max_scan байт; start ответа — курсор для
+    следующей, более ранней страницы.
+    """
+
+    if needle is not None and ignore_case:
+        needle = needle.lower()
+    with open(open_log(location), "rb") as log_file:
+        info = os.fstat(log_file.fileno())
+        size = info.st_size
+        end = size if before is None else max(0, min(before, size))
+        if end == 0:
+            return LogSlice(start=0, end=0, size=size, inode=info.st_ino)
+        with mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            lines, start = _read_backward(mm, end, limit, needle, ignore_case, max(0, end - max_scan), max_line)
+    lines.reverse()
+    return LogSlice(lines=lines, start=start, end=end, size=size, inode=info.st_ino)
+
+
+def read_forward(
+    location: LogLocation,
+    after: int,
+    limit: int,
+    *,
+    needle: Optional[bytes] = None,
+    ignore_case: bool = False,
+    max_scan: int,
+    max_line: int = 8192,
+) -> LogSlice:
+    """Полные строки, начиная с позиции after; end ответа — курсор продолжения.
+
+    Недописанная последняя строка (без «\\n») не возвращается, пока её не
+    допишут. after больше размера файла означает, что лог усечён или
+    заменён при ротации, — чтение начинается с начала.
+    """
+
+    pattern: Optional[Pattern[bytes]] = None
+    if needle is not None and ignore_case:
+        pattern = re.compile(re.escape(needle), re.IGNORECASE)
+    with open(open_log(location), "rb") as log_file:
+        info = os.fstat(log_file.fileno())
+        size = info.st_size
+        pos = 0 if after > size else after
+        result = LogSlice(start=pos, end=pos, size=size, inode=info.st_ino)
+        if pos == size:
+            return result
+        with mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            stop = min(size, pos + max_scan)
+            while pos < stop and len(result.lines) < limit:
+                line_end = mm.find(b"\n", pos, size)
+                if line_end < 0:
+                    break
+                # Совпадение ищется во всей строке, отдаются первые max_line байт
+                if needle is None or (
+                    pattern.search(mm, pos, line_end) is not None
+                    if pattern is not None
+                    else mm.find(needle, pos, line_end) >= 0
+                ):
+                    result.lines.append((pos, mm[pos:min(line_end, pos + max_line)]))
+                pos = line_end + 1
+    result.end = pos
+    return result
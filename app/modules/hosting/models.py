@@ -1,6 +1,6 @@
 from typing import TYPE_CHECKING
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Integer, String, Text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -37,4 +37,22 @@ class HostingSite(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     user = relationship("AuthUsers", back_populates="sites")
-    domain = relationship("Domain", back_populates="site")
\ No newline at end of file
+    domain = relationship("Domain", back_populates="site")
+
+
+class SiteDeploy(Base):
+    """Загрузка архива сайта; принятые байты лежат в deploy_upload_dir/{id}.part."""
+
+    __tablename__ = "site_deploys"
+
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("auth_users.id", ondelete="CASCADE"), nullable=False)
+    site_id = Column(Integer, ForeignKey("hosting_sites.id", ondelete="CASCADE"), nullable=False, index=True)
+    filename = Column(String(255))
+    size = Column(BigInteger, nullable=False)
+    status = Column(String(16), nullable=False, default="uploading")
+    files = Column(Integer)
+    bytes = Column(BigInteger)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,16 +1,37 @@
-from typing import List
+import asyncio
+import uuid
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import delete, select
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.db import get_db
+from app.core.config import settings
+from app.core.db import async_session_maker, get_db
+from app.core.etag import SITES_RESOURCE, conditional_get
+from app.core.responses import model_columns, model_response, rows_response
 from app.integrations import ISPManagerError, extract_identifier, get_isp_client
 from app.modules.auth.models import AuthUsers
-from app.modules.auth.routes import get_current_user
+from app.modules.auth.routes import get_current_user, get_current_user_id
 from app.modules.domains.models import Domain
-from app.modules.hosting.models import HostingAccount, HostingSite
-from app.modules.hosting.schemas import HostingAccountResponse, HostingSiteCreate, HostingSiteResponse, SiteStatus
+from app.modules.hosting import deploy as site_deploy
+from app.modules.hosting import site_logs
+from app.modules.hosting.models import HostingAccount, HostingSite, SiteDeploy
+from app.modules.hosting.schemas import (
+    DeployStatus,
+    HostingAccountResponse,
+    HostingSiteCreate,
+    HostingSiteResponse,
+    SiteDeployCreate,
+    SiteDeployResponse,
+    SiteLogKind,
+    SiteLogLine,
+    SiteLogResponse,
+    SiteStatus,
+)
+from app.modules.outbox.events import SITE_CREATED, SITE_DELETED, record_event
+from app.modules.usage.disk import disk_quota_left
 
 router = APIRouter()
 
@@ -49,26 +70,33 @@ async def _get_domain_for_user(db: AsyncSession, domain_id: int, user: AuthUsers
 
 @router.get("/hosting/account/ftp", response_model=HostingAccountResponse)
 async def get_ftp_account(current_user: AuthUsers = Depends(get_current_user)):
-    _ensure_hosting_account(current_user)
-    return HostingAccountResponse.model_validate(account, from_attributes=True)
+    account = _ensure_hosting_account(current_user)
+    return model_response(HostingAccountResponse.model_validate(account, from_attributes=True))
 
 
 @router.get("/hosting/sites", response_model=List[HostingSiteResponse])
 async def get_user_sites(
+    request: Request,
     current_user: AuthUsers = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
     skip: int = 0,
     limit: int = 100,
 ):
+    etag, not_modified = await conditional_get(db, request, current_user.id, SITES_RESOURCE)
+    if not_modified:
+        return not_modified
+
     query = (
-        select(HostingSite)
+        select(*model_columns(HostingSiteResponse, HostingSite))
         .where(HostingSite.user_id == current_user.id)
         .order_by(HostingSite.created_at.desc())
         .offset(skip)
         .limit(limit)
     )
     result = await db.execute(query)
-    return result.scalars().all()
+    response = rows_response(HostingSiteResponse, result.mappings())
+    response.headers["ETag"] = etag
+    return response
 
 
 @router.post("/hosting/sites", response_model=HostingSiteResponse, status_code=status.HTTP_201_CREATED)
@@ -84,7 +112,7 @@ async def create_site(
     if site_data.domain_id is not None:
         domain = await _get_domain_for_user(db, site_data.domain_id, current_user)
 
-    isp_client = get_isp_client()
+    isp_client = get_isp_client(current_user.isp_node)
 
     site = HostingSite(
         user_id=current_user.id,
@@ -110,6 +138,19 @@ async def create_site(
             normalized = status_value.lower()
             if normalized in {status.value for status in SiteStatus}:
                 site.status = normalized
+        record_event(
+            db,
+            SITE_CREATED,
+            "site",
+            site.id,
+            {
+                "user_id": current_user.id,
+                "domain_id": site.domain_id,
+                "root_path": site.root_path,
+                "status": site.status,
+                "isp_site_id": site.isp_site_id,
+            },
+        )
         await db.commit()
     except ISPManagerError as exc:
         await db.rollback()
@@ -138,13 +179,205 @@ async def delete_site(
 ):
     site = await _get_site_or_404(db, site_id, current_user)
 
-    isp_client = get_isp_client()
+    isp_client = get_isp_client(current_user.isp_node)
 
     try:
         if site.isp_site_id:
             await isp_client.delete_site(site_id=site.isp_site_id)
         await db.execute(delete(HostingSite).where(HostingSite.id == site.id))
+        record_event(db, SITE_DELETED, "site", site.id, {"user_id": current_user.id, "isp_site_id": site.isp_site_id})
         await db.commit()
     except ISPManagerError as exc:
         await db.rollback()
-        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Не удалось удалить сайт в ISPmanager") from exc
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Не удалось удалить сайт в ISPmanager") from exc
+
+
+def _deploy_response(deploy: SiteDeploy) -> SiteDeployResponse:
+    response = SiteDeployResponse.model_validate(deploy, from_attributes=True)
+    if deploy.status == DeployStatus.UPLOADING.value:
+        response.offset = site_deploy.upload_offset(deploy.id)
+    else:
+        response.offset = deploy.size
+    return response
+
+
+async def _get_deploy_or_404(db: AsyncSession, site_id: int, deploy_id: str, user_id: int) -> SiteDeploy:
+    result = await db.execute(
+        select(SiteDeploy).where(SiteDeploy.id == deploy_id, SiteDeploy.site_id == site_id, SiteDeploy.user_id == user_id)
+    )
+    deploy = result.scalar_one_or_none()
+    if not deploy:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Загрузка не найдена")
+    return deploy
+
+
+@router.post("/hosting/sites/{site_id}/deploy", response_model=SiteDeployResponse, status_code=status.HTTP_201_CREATED)
+async def create_site_deploy(
+    site_id: int,
+    deploy_data: SiteDeployCreate,
+    current_user: AuthUsers = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Начать загрузку архива (zip, tar, tar.gz/bz2/xz); части отправляются PATCH-запросами"""
+    account = _ensure_hosting_account(current_user)
+    site = await _get_site_or_404(db, site_id, current_user)
+    if site_deploy.resolve_site_root(account.home_directory, site.root_path) is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Корень сайта находится вне домашнего каталога")
+    if deploy_data.size > settings.deploy_max_archive_mb * site_deploy.MB:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Архив больше {settings.deploy_max_archive_mb} МБ",
+        )
+    quota_left = await disk_quota_left(db, current_user.id)
+    if quota_left is not None and deploy_data.size > quota_left:
+        raise HTTPException(status_code=status.HTTP_507_INSUFFICIENT_STORAGE, detail="Недостаточно места по квоте")
+
+    # Незавершённые загрузки этого сайта заменяются новой и больше не занимают диск
+    stale = await db.execute(
+        update(SiteDeploy)
+        .where(SiteDeploy.site_id == site.id, SiteDeploy.status == DeployStatus.UPLOADING.value)
+        .values(status=DeployStatus.FAILED.value, error="Заменена новой загрузкой")
+        .returning(SiteDeploy.id)
+    )
+    for stale_id in stale.scalars():
+        site_deploy.discard_upload(stale_id)
+
+    deploy = SiteDeploy(
+        id=uuid.uuid4().hex,
+        user_id=current_user.id,
+        site_id=site.id,
+        filename=deploy_data.filename,
+        size=deploy_data.size,
+        status=DeployStatus.UPLOADING.value,
+    )
+    db.add(deploy)
+    await db.commit()
+    await db.refresh(deploy)
+    return _deploy_response(deploy)
+
+
+@router.patch("/hosting/sites/{site_id}/deploy/{deploy_id}", response_model=SiteDeployResponse)
+async def upload_site_deploy_chunk(
+    site_id: int,
+    deploy_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset", ge=0),
+    user_id: int = Depends(get_current_user_id),
+):
+    """Дописать часть архива с байта Upload-Offset; тело пишется на диск по мере приёма"""
+    # Соединение с БД не держится, пока принимается тело части
+    async with async_session_maker() as db:
+        deploy = await _get_deploy_or_404(db, site_id, deploy_id, user_id)
+        location = (
+            await db.execute(
+                select(HostingAccount.home_directory, HostingSite.root_path)
+                .join(HostingSite, HostingSite.user_id == HostingAccount.user_id)
+                .where(HostingSite.id == site_id, HostingAccount.user_id == user_id)
+            )
+        ).one_or_none()
+    if deploy.status != DeployStatus.UPLOADING.value:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Загрузка уже завершена")
+    root = site_deploy.resolve_site_root(*location) if location is not None else None
+    if root is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Корень сайта находится вне домашнего каталога")
+
+    try:
+        offset = await site_deploy.append_chunk(deploy.id, upload_offset, deploy.size, request.stream())
+    except site_deploy.UploadConflict as exc:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Загрузка продолжается с байта {exc.offset}",
+            headers={"Upload-Offset": str(exc.offset)},
+        ) from exc
+    except site_deploy.UploadTooLarge as exc:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Часть выходит за заявленный размер архива"
+        ) from exc
+
+    if offset == deploy.size:
+        async with async_session_maker() as db:
+            quota_left = await disk_quota_left(db, user_id)
+        if await site_deploy.start_extraction(deploy.id, location.home_directory, root, quota_left):
+            deploy.status = DeployStatus.EXTRACTING.value
+    response = _deploy_response(deploy)
+    response.offset = offset
+    return response
+
+
+@router.get("/hosting/sites/{site_id}/deploy/{deploy_id}", response_model=SiteDeployResponse)
+async def get_site_deploy(
+    site_id: int,
+    deploy_id: str,
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    """Состояние загрузки: принятое смещение для продолжения или результат распаковки"""
+    deploy = await _get_deploy_or_404(db, site_id, deploy_id, user_id)
+    return _deploy_response(deploy)
+
+
+@router.get("/hosting/sites/{site_id}/logs", response_model=SiteLogResponse)
+async def get_site_logs(
+    site_id: int,
+    kind: SiteLogKind = SiteLogKind.ACCESS,
+    lines: int = Query(100, ge=1),
+    before: Optional[int] = Query(None, ge=0),
+    after: Optional[int] = Query(None, ge=0),
+    grep: Optional[str] = Query(None, min_length=1, max_length=256),
+    ignore_case: bool = False,
+    follow: bool = False,
+    last_event_id: Optional[int] = Header(None, alias="Last-Event-ID", ge=0),
+    user_id: int = Depends(get_current_user_id),
+):
+    """Лог сайта: последние строки, страницы по курсорам before/after, поиск подстроки grep.
+
+    follow=true — поток новых строк в формате SSE; переподключение с Last-Event-ID продолжает с той же позиции.
+    """
+    # Поток может идти минутами: соединение с БД нужно только для поиска сайта
+    async with async_session_maker() as db:
+        location = (
+            await db.execute(
+                select(HostingAccount.home_directory, Domain.name)
+                .select_from(HostingSite)
+                .join(HostingAccount, HostingAccount.user_id == HostingSite.user_id)
+                .outerjoin(Domain, Domain.id == HostingSite.domain_id)
+                .where(HostingSite.id == site_id, HostingSite.user_id == user_id)
+            )
+        ).one_or_none()
+    if location is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Сайт не найден")
+    home_directory, domain_name = location
+    if not domain_name:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="У сайта нет домена, логи не ведутся")
+    location = site_logs.log_path(home_directory, domain_name, kind.value)
+    if location is None or not await asyncio.to_thread(site_logs.log_exists, location):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Лог не найден")
+    if grep is not None and "\n" in grep:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="grep ищет в пределах одной строки")
+
+    needle = grep.encode("utf-8") if grep is not None else None
+    limit = min(lines, settings.site_logs_max_lines)
+    if follow:
+        start = after if after is not None else last_event_id
+        return StreamingResponse(
+            site_logs.follow(location, start, limit, needle, ignore_case),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    try:
+        if after is not None:
+            chunk = await site_logs.forward(location, after, limit, needle, ignore_case)
+        else:
+            chunk = await site_logs.tail(location, before, limit, needle, ignore_case)
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Лог не найден") from exc
+    return model_response(
+        SiteLogResponse(
+            kind=kind,
+            size=chunk.size,
+            lines=[SiteLogLine(offset=offset, text=line.decode("utf-8", "replace")) for offset, line in chunk.lines],
+            before=chunk.start or None,
+            after=chunk.end,
+        )
+    )
@@ -1,8 +1,8 @@
 from datetime import datetime
 from enum import Enum
-from typing import Optional
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class SiteStatus(str, Enum):
@@ -34,4 +34,51 @@ class HostingAccountResponse(BaseModel):
     home_directory: str
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class DeployStatus(str, Enum):
+    UPLOADING = "uploading"
+    EXTRACTING = "extracting"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class SiteDeployCreate(BaseModel):
+    size: int = Field(..., gt=0)  # размер архива в байтах
+    filename: Optional[str] = Field(None, max_length=255)
+
+
+class SiteDeployResponse(BaseModel):
+    id: str
+    site_id: int
+    status: DeployStatus
+    size: int
+    offset: int = 0  # принято байт; с этого смещения продолжается загрузка
+    filename: Optional[str] = None
+    files: Optional[int] = None
+    bytes: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class SiteLogKind(str, Enum):
+    ACCESS = "access"
+    ERROR = "error"
+
+
+class SiteLogLine(BaseModel):
+    offset: int  # байтовая позиция начала строки в файле
+    text: str
+
+
+class SiteLogResponse(BaseModel):
+    kind: SiteLogKind
+    size: int
+    lines: List[SiteLogLine]
+    before: Optional[int] = None  # курсор более ранней страницы; None — достигнуто начало файла
+    after: int  # курсор для чтения новых строк
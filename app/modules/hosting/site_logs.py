@@ -0,0 +1,187 @@
+"""Логи сайта из домашнего каталога: хвост, страницы по курсорам, поиск и SSE.
+
+Файлы — {site_logs_dir}/{домен}.access.log и .error.log внутри
+home_directory. Чтение без поиска идёт в потоке, поиск — в пуле процессов:
+просмотр десятков мегабайт не занимает event loop и не конкурирует с ним за
+GIL. За один вызов просматривается не больше site_logs_scan_mb, поэтому
+время ответа и память ограничены при любом размере лога.
+
+SSE-поток опрашивает лог в потоке: пока файл не вырос, читать нечего, а
+небольшой прирост быстрее просмотреть на месте, чем занимать пул, нужный
+интерактивному поиску. В пул уходит только большой отставший кусок.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import AsyncIterator, Callable, Optional, Tuple
+
+from app.core.config import settings
+from app.modules.hosting.logfiles import LogLocation, LogSlice, open_log, read_backward, read_forward
+
+MB = 1024 * 1024
+KEEPALIVE_INTERVAL = 15.0
+# Отставание SSE-потока, начиная с которого поиск по нему идёт в пуле процессов
+FOLLOW_THREAD_BYTES = MB
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def log_path(home_directory: str, domain: str, kind: str) -> Optional[LogLocation]:
+    """Расположение лога домена; None — имя файла недопустимо.
+
+    Ссылки не разыменовываются здесь: logfiles.open_log открывает файл от
+    home по дескрипторам и отвергает их в момент чтения.
+    """
+
+    name = f"{domain}.{kind}.log"
+    if "/" in name or name.startswith("."):
+        return None
+    return LogLocation(os.path.realpath(home_directory), settings.site_logs_dir, name)
+
+
+def log_exists(location: LogLocation) -> bool:
+    try:
+        os.close(open_log(location))
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _log_state(location: LogLocation) -> Tuple[int, int]:
+    """Размер и inode лога."""
+
+    fd = open_log(location)
+    try:
+        info = os.fstat(fd)
+    finally:
+        os.close(fd)
+    return info.st_size, info.st_ino
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=max(1, settings.site_logs_workers), mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def close_site_logs_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def _run(
+    reader: Callable[..., LogSlice],
+    location: LogLocation,
+    cursor: Optional[int],
+    limit: int,
+    needle: Optional[bytes],
+    ignore_case: bool,
+    use_pool: bool,
+) -> LogSlice:
+    job = partial(
+        reader,
+        location,
+        cursor,
+        limit,
+        needle=needle,
+        ignore_case=ignore_case,
+        max_scan=settings.site_logs_scan_mb * MB,
+    )
+    if not use_pool:
+        return await asyncio.to_thread(job)
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), job)
+
+
+async def tail(
+    location: LogLocation, before: Optional[int], limit: int, needle: Optional[bytes], ignore_case: bool
+) -> LogSlice:
+    return await _run(read_backward, location, before, limit, needle, ignore_case, needle is not None)
+
+
+async def forward(
+    location: LogLocation, after: int, limit: int, needle: Optional[bytes], ignore_case: bool
+) -> LogSlice:
+    return await _run(read_forward, location, after, limit, needle, ignore_case, needle is not None)
+
+
+def _events(chunk: LogSlice) -> bytes:
+    """Строки как SSE-события; id — позиция, с которой продолжать после этой строки."""
+
+    parts = []
+    for index, (offset, line) in enumerate(chunk.lines):
+        resume = chunk.lines[index + 1][0] if index + 1 < len(chunk.lines) else chunk.end
+        data = json.dumps({"offset": offset, "text": line.decode("utf-8", "replace")}, ensure_ascii=False)
+        parts.append(f"id: {resume}\nevent: line\ndata: {data}\n\n")
+    return "".join(parts).encode("utf-8")
+
+
+async def follow(
+    location: LogLocation, start: Optional[int], limit: int, needle: Optional[bytes], ignore_case: bool
+) -> AsyncIterator[bytes]:
+    """SSE-поток новых строк, как tail -f; без start сначала отдаются последние limit строк.
+
+    Поток закрывается через site_logs_follow_seconds: клиент переподключается
+    с Last-Event-ID и продолжает с той же позиции.
+    """
+
+    stop_at = time.monotonic() + settings.site_logs_follow_seconds
+    inode: Optional[int] = None
+    if start is None:
+        chunk = await tail(location, None, limit, needle, ignore_case)
+        yield _events(chunk) or b": tail\n\n"
+        position, inode = chunk.size, chunk.inode
+    else:
+        position = start
+    last_sent = time.monotonic()
+
+    while time.monotonic() < stop_at:
+        try:
+            size, current_inode = await asyncio.to_thread(_log_state, location)
+            if size == position and current_inode == inode:
+                chunk = None  # лог не менялся
+            else:
+                backlog = size if size < position or current_inode != inode else size - position
+                chunk = await _run(
+                    read_forward,
+                    location,
+                    position,
+                    settings.site_logs_max_lines,
+                    needle,
+                    ignore_case,
+                    needle is not None and backlog > FOLLOW_THREAD_BYTES,
+                )
+        except FileNotFoundError:
+            chunk = None  # ротация: новый файл ещё не создан
+        if chunk is not None and inode is not None and chunk.inode != inode:
+            # Лог заменён при ротации — новый файл читается с начала
+            yield b"event: rotated\ndata: {}\n\n"
+            position, inode = 0, chunk.inode
+            continue
+        if chunk is not None and chunk.start != position:
+            # Лог усечён (copytruncate): read_forward уже начал с начала файла
+            yield b"event: rotated\ndata: {}\n\n"
+        if chunk is not None:
+            inode = chunk.inode
+            if chunk.lines:
+                yield _events(chunk)
+                last_sent = time.monotonic()
+            moved = chunk.end != position
+            position = chunk.end
+            if moved and chunk.end < chunk.size:
+                continue  # отстали от файла — читаем дальше без паузы
+        if time.monotonic() - last_sent >= KEEPALIVE_INTERVAL:
+            yield b": keepalive\n\n"
+            last_sent = time.monotonic()
+        await asyncio.sleep(settings.site_logs_poll_interval)
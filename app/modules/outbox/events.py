@@ -0,0 +1,52 @@
+"""Запись событий в outbox в рамках текущей транзакции обработчика."""
+
+from __future__ import annotations
+
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Dict, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.modules.outbox.models import OutboxEvent
+
+USER_REGISTERED = "user.registered"
+USER_UPDATED = "user.updated"
+DOMAIN_CREATED = "domain.created"
+DOMAIN_DELETED = "domain.deleted"
+DNS_RECORD_CREATED = "dns_record.created"
+DNS_ZONE_IMPORTED = "dns_zone.imported"
+SITE_CREATED = "site.created"
+SITE_DELETED = "site.deleted"
+SITE_DEPLOYED = "site.deployed"
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, dict):
+        return {key: _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    return value
+
+
+def record_event(
+    db: AsyncSession,
+    event_type: str,
+    aggregate_type: str,
+    aggregate_id: Any,
+    payload: Optional[Dict[str, Any]] = None,
+) -> OutboxEvent:
+    """Добавить событие в сессию; оно сохранится только вместе с commit обработчика."""
+
+    event = OutboxEvent(
+        event_type=event_type,
+        aggregate_type=aggregate_type,
+        aggregate_id=str(aggregate_id),
+        payload=_jsonable(payload or {}),
+    )
+    db.add(event)
+    return event
@@ -0,0 +1,23 @@
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, Text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+
+from app.core.db import Base
+
+
+class OutboxEvent(Base):
+    """Событие, записанное в той же транзакции, что и изменение данных."""
+
+    __tablename__ = "outbox_events"
+
+    id = Column(BigInteger, primary_key=True)
+    event_type = Column(String(64), nullable=False)
+    aggregate_type = Column(String(32), nullable=False)
+    aggregate_id = Column(String(64), nullable=False)
+    payload = Column(JSONB, nullable=False, default=dict)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    published_at = Column(DateTime(timezone=True))
+    attempts = Column(Integer, nullable=False, default=0)
+    # Выставляется после outbox_max_attempts неудачных попыток: строка больше не публикуется
+    failed_at = Column(DateTime(timezone=True))
+    last_error = Column(Text)
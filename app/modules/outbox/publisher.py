@@ -0,0 +1,166 @@
+"""Фоновая отправка событий из outbox в RabbitMQ.
+
+Доставка не реже одного раза: строка помечается опубликованной только после
+подтверждения брокера, поэтому при сбое между публикацией и commit событие
+уйдёт повторно. Потребители дедуплицируют по message_id (= outbox_events.id).
+Строки выбираются с FOR UPDATE SKIP LOCKED, так что публикатор можно
+запускать в каждом воркере.
+
+Событие, которое брокер не принял outbox_max_attempts раз, переводится в
+dead-letter (failed_at, last_error) и больше не публикуется; вернуть его в
+очередь можно, сбросив failed_at. Опубликованные события удаляются через
+outbox_retention_hours, dead-letter — через outbox_failed_retention_days.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Optional
+
+from sqlalchemy import case, delete, select, update
+from sqlalchemy.sql import func
+
+from app.core.config import settings
+from app.core.db import async_session_maker
+from app.integrations.rabbitmq import OutgoingMessage, RabbitMQError, RabbitMQPublisher
+from app.modules.outbox.models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF_SECONDS = 30.0
+PURGE_INTERVAL = 3600.0
+PURGE_BATCH_SIZE = 1000
+
+
+def _to_message(event: OutboxEvent) -> OutgoingMessage:
+    return OutgoingMessage(
+        message_id=str(event.id),
+        routing_key=event.event_type,
+        body={
+            "id": event.id,
+            "type": event.event_type,
+            "aggregate_type": event.aggregate_type,
+            "aggregate_id": event.aggregate_id,
+            "payload": event.payload,
+            "created_at": event.created_at.isoformat() if event.created_at else None,
+        },
+        headers={"attempt": event.attempts + 1},
+    )
+
+
+async def drain_once(publisher: RabbitMQPublisher, batch_size: Optional[int] = None) -> int:
+    """Опубликовать одну пачку ожидающих событий; возвращает их количество."""
+
+    batch_size = batch_size or settings.outbox_batch_size
+
+    async with async_session_maker() as db:
+        result = await db.execute(
+            select(OutboxEvent)
+            .where(OutboxEvent.published_at.is_(None), OutboxEvent.failed_at.is_(None))
+            .order_by(OutboxEvent.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        events = result.scalars().all()
+        if not events:
+            return 0
+
+        event_ids = [event.id for event in events]
+
+        try:
+            await publisher.publish_batch([_to_message(event) for event in events])
+        except RabbitMQError as exc:
+            exhausted = OutboxEvent.attempts + 1 >= settings.outbox_max_attempts
+            dead = await db.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.id.in_(event_ids))
+                .values(
+                    attempts=OutboxEvent.attempts + 1,
+                    last_error=str(exc)[:1000],
+                    failed_at=case((exhausted, func.now()), else_=None),
+                )
+                .returning(OutboxEvent.id, OutboxEvent.failed_at)
+            )
+            dead_ids = [event_id for event_id, failed_at in dead if failed_at is not None]
+            await db.commit()
+            if dead_ids:
+                logger.error(
+                    "Outbox events moved to dead-letter after %d attempts: %s", settings.outbox_max_attempts, dead_ids
+                )
+            raise
+
+        await db.execute(
+            update(OutboxEvent)
+            .where(OutboxEvent.id.in_(event_ids))
+            .values(published_at=func.now(), attempts=OutboxEvent.attempts + 1)
+        )
+        await db.commit()
+        return len(events)
+
+
+async def purge_once(batch_size: int = PURGE_BATCH_SIZE) -> int:
+    """Удалить порцию событий старше срока хранения; возвращает число удалённых строк."""
+
+    expired = (
+        select(OutboxEvent.id)
+        .where(
+            (OutboxEvent.published_at < func.now() - timedelta(hours=settings.outbox_retention_hours))
+            | (OutboxEvent.failed_at < func.now() - timedelta(days=settings.outbox_failed_retention_days))
+        )
+        .limit(batch_size)
+    )
+    async with async_session_maker() as db:
+        result = await db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(expired)))
+        await db.commit()
+    return result.rowcount or 0
+
+
+async def purge_expired() -> int:
+    """Удалить все просроченные события порциями, не держа долгих блокировок."""
+
+    total = 0
+    while True:
+        removed = await purge_once()
+        total += removed
+        if removed < PURGE_BATCH_SIZE:
+            break
+    if total:
+        logger.info("Purged %d expired outbox events", total)
+    return total
+
+
+async def run_outbox_publisher(publisher: Optional[RabbitMQPublisher] = None) -> None:
+    """Бесконечно вычерпывать outbox; запускается из lifespan при заданном rabbitmq_host."""
+
+    publisher = publisher or RabbitMQPublisher()
+    backoff = settings.outbox_poll_interval
+    next_purge = 0.0
+
+    try:
+        while True:
+            if time.monotonic() >= next_purge:
+                next_purge = time.monotonic() + PURGE_INTERVAL
+                try:
+                    await purge_expired()
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("Outbox purge failed")
+            try:
+                published = await drain_once(publisher)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Outbox publishing failed, retrying in %.1fs", backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+                continue
+
+            backoff = settings.outbox_poll_interval
+            if published < settings.outbox_batch_size:
+                await asyncio.sleep(settings.outbox_poll_interval)
+    finally:
+        await publisher.close()
@@ -0,0 +1,32 @@
+from sqlalchemy import CHAR, Column, DateTime, Integer, String
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+
+from app.core.db import Base
+
+
+class ISPObjectFingerprint(Base):
+    """Последний увиденный хеш объекта ISPmanager."""
+
+    __tablename__ = "isp_object_fingerprints"
+
+    node = Column(String(64), primary_key=True)
+    kind = Column(String(32), primary_key=True)
+    isp_id = Column(String(128), primary_key=True)
+    fingerprint = Column(CHAR(32), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class ISPDriftReport(Base):
+    """Расхождение между БД и панелью, найденное при сверке."""
+
+    __tablename__ = "isp_drift_reports"
+
+    id = Column(Integer, primary_key=True)
+    node = Column(String(64), nullable=False)
+    kind = Column(String(32), nullable=False)
+    isp_id = Column(String(128), nullable=False)
+    drift_type = Column(String(32), nullable=False)
+    details = Column(JSONB)
+    detected_at = Column(DateTime(timezone=True), server_default=func.now())
+    resolved_at = Column(DateTime(timezone=True))
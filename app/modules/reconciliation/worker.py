@@ -0,0 +1,301 @@
+"""Сверка таблиц API с объектами ISPmanager по хешам содержимого.
+
+Для каждого вида объектов (user, ftp.user, webdomain) список панели
+обходится постранично, а хеш полей панели вместе с ожидаемыми локальными
+значениями сравнивается с сохранённым отпечатком. Подробно разбираются
+только изменившиеся объекты, поэтому повторный прогон по неизменному узлу
+стоит ровно столько вызовов списка, сколько в нём страниц. В нескольких
+воркерах периодическую сверку выполняет только владелец advisory lock.
+
+Запуск одного прохода вручную: ``python -m app.modules.reconciliation.worker``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import func
+
+from app.core.config import settings
+from app.core.db import async_session_maker, try_advisory_lock
+from app.integrations import ISPManagerClient, ISPManagerError, get_isp_client, isp_nodes
+from app.modules.auth.models import AuthUsers
+from app.modules.domains.models import Domain
+from app.modules.hosting.models import HostingAccount, HostingSite
+from app.modules.reconciliation.models import ISPDriftReport, ISPObjectFingerprint
+
+logger = logging.getLogger(__name__)
+
+# Ключ pg_advisory_lock: одна сверка на кластер воркеров
+RECONCILE_LOCK_KEY = 0x69737072
+
+ORPHAN_IN_PANEL = "orphan_in_panel"
+MISSING_IN_PANEL = "missing_in_panel"
+ATTRIBUTE_MISMATCH = "attribute_mismatch"
+
+# isp_id -> ожидаемые значения полей панели
+LocalIndex = Dict[str, Dict[str, Any]]
+
+
+def _on_node(node: str):
+    """Пользователи узла; у узла по умолчанию — и те, кому узел не записан."""
+
+    if node == isp_nodes.default:
+        return or_(AuthUsers.isp_node == node, AuthUsers.isp_node.is_(None))
+    return AuthUsers.isp_node == node
+
+
+async def _local_users(db: AsyncSession, node: str) -> LocalIndex:
+    result = await db.execute(
+        select(AuthUsers.isp_account_id, AuthUsers.id).where(AuthUsers.isp_account_id.is_not(None), _on_node(node))
+    )
+    return {isp_id: {} for isp_id, _ in result}
+
+
+async def _local_ftp_users(db: AsyncSession, node: str) -> LocalIndex:
+    result = await db.execute(
+        select(HostingAccount.isp_ftp_id, HostingAccount.home_directory, AuthUsers.isp_account_id)
+        .join(AuthUsers, AuthUsers.id == HostingAccount.user_id)
+        .where(HostingAccount.isp_ftp_id.is_not(None), _on_node(node))
+    )
+    return {isp_id: {"home": home, "owner": owner} for isp_id, home, owner in result}
+
+
+async def _local_webdomains(db: AsyncSession, node: str) -> LocalIndex:
+    index: LocalIndex = {}
+    domains = await db.execute(
+        select(Domain.isp_domain_id, AuthUsers.isp_account_id)
+        .join(AuthUsers, AuthUsers.id == Domain.user_id)
+        .where(Domain.isp_domain_id.is_not(None), _on_node(node))
+    )
+    for isp_id, owner in domains:
+        index[isp_id] = {"owner": owner}
+    sites = await db.execute(
+        select(HostingSite.isp_site_id, AuthUsers.isp_account_id)
+        .join(AuthUsers, AuthUsers.id == HostingSite.user_id)
+        .where(HostingSite.isp_site_id.is_not(None), _on_node(node))
+    )
+    for isp_id, owner in sites:
+        index.setdefault(isp_id, {"owner": owner})
+    return index
+
+
+@dataclass(frozen=True)
+class PanelKind:
+    name: str
+    func: str
+    fields: Tuple[str, ...]
+    load_local: Callable[[AsyncSession, str], Awaitable[LocalIndex]]
+
+
+# В хеш попадают только стабильные поля: квоты и трафик меняются постоянно
+PANEL_KINDS = (
+    PanelKind("user", "user", ("name", "owner", "status", "preset", "fullname"), _local_users),
+    PanelKind("ftp_user", "ftp.user", ("name", "owner", "home", "status"), _local_ftp_users),
+    PanelKind("webdomain", "webdomain", ("name", "owner", "docroot"), _local_webdomains),
+)
+
+
+@dataclass
+class KindResult:
+    kind: str
+    node: str
+    seen: int = 0
+    changed: int = 0
+    new_reports: int = 0
+    resolved_reports: int = 0
+    drifts: Dict[Tuple[str, str], Dict[str, Any]] = field(default_factory=dict, repr=False)
+
+
+def fingerprint(element: Dict[str, Any], fields: Tuple[str, ...], expected: Optional[Dict[str, Any]]) -> str:
+    payload = [[name, element.get(name)] for name in fields]
+    payload.append(sorted((expected or {}).items()))
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _chunks(items: List[Any], size: int = 1000) -> Iterator[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+async def reconcile_kind(db: AsyncSession, client: ISPManagerClient, kind: PanelKind) -> KindResult:
+    node = client.node
+    result = KindResult(kind=kind.name, node=node)
+
+    stored_rows = await db.execute(
+        select(ISPObjectFingerprint.isp_id, ISPObjectFingerprint.fingerprint).where(
+            ISPObjectFingerprint.node == node,
+            ISPObjectFingerprint.kind == kind.name,
+        )
+    )
+    stored = dict(stored_rows.all())
+    local = await kind.load_local(db, node)
+
+    seen: set[str] = set()
+    changed: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+
+    async for page in client.iter_list(kind.func, page_size=settings.isp_reconcile_page_size):
+        for element in page:
+            isp_id = str(element.get("name") or "")
+            if not isp_id:
+                continue
+            seen.add(isp_id)
+            digest = fingerprint(element, kind.fields, local.get(isp_id))
+            if stored.get(isp_id) != digest:
+                changed[isp_id] = (digest, element)
+
+    result.seen = len(seen)
+    result.changed = len(changed)
+
+    drifts = result.drifts
+    for isp_id in seen - local.keys():
+        drifts[(isp_id, ORPHAN_IN_PANEL)] = {}
+    for isp_id in local.keys() - seen:
+        drifts[(isp_id, MISSING_IN_PANEL)] = {"local": local[isp_id]}
+    for isp_id, (_, element) in changed.items():
+        expected = local.get(isp_id)
+        if not expected:
+            continue
+        mismatches = {
+            name: {"panel": element.get(name), "local": value}
+            for name, value in expected.items()
+            if value is not None and str(element.get(name) or "") != str(value)
+        }
+        if mismatches:
+            drifts[(isp_id, ATTRIBUTE_MISMATCH)] = mismatches
+
+    open_rows = await db.execute(
+        select(ISPDriftReport.isp_id, ISPDriftReport.drift_type).where(
+            ISPDriftReport.node == node,
+            ISPDriftReport.kind == kind.name,
+            ISPDriftReport.resolved_at.is_(None),
+        )
+    )
+    open_reports = set(open_rows.all())
+
+    new_reports = [
+        {"node": node, "kind": kind.name, "isp_id": isp_id, "drift_type": drift_type, "details": details}
+        for (isp_id, drift_type), details in drifts.items()
+        if (isp_id, drift_type) not in open_reports
+    ]
+    # Несовпадение атрибутов перепроверяется только у изменившихся объектов
+    resolved: Dict[str, List[str]] = {}
+    for isp_id, drift_type in open_reports:
+        if (isp_id, drift_type) in drifts:
+            continue
+        if drift_type == ATTRIBUTE_MISMATCH and isp_id in seen and isp_id not in changed:
+            continue
+        resolved.setdefault(drift_type, []).append(isp_id)
+
+    if new_reports:
+        await db.execute(pg_insert(ISPDriftReport).on_conflict_do_nothing(), new_reports)
+    for drift_type, isp_ids in resolved.items():
+        for batch in _chunks(isp_ids):
+            await db.execute(
+                update(ISPDriftReport)
+                .where(
+                    ISPDriftReport.node == node,
+                    ISPDriftReport.kind == kind.name,
+                    ISPDriftReport.drift_type == drift_type,
+                    ISPDriftReport.isp_id.in_(batch),
+                    ISPDriftReport.resolved_at.is_(None),
+                )
+                .values(resolved_at=func.now())
+            )
+
+    if changed:
+        upsert = pg_insert(ISPObjectFingerprint)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[ISPObjectFingerprint.node, ISPObjectFingerprint.kind, ISPObjectFingerprint.isp_id],
+            set_={"fingerprint": upsert.excluded.fingerprint, "updated_at": func.now()},
+        )
+        rows = [
+            {"node": node, "kind": kind.name, "isp_id": isp_id, "fingerprint": digest}
+            for isp_id, (digest, _) in changed.items()
+        ]
+        for batch in _chunks(rows):
+            await db.execute(upsert, batch)
+
+    vanished = list(stored.keys() - seen)
+    for batch in _chunks(vanished):
+        await db.execute(
+            delete(ISPObjectFingerprint).where(
+                ISPObjectFingerprint.node == node,
+                ISPObjectFingerprint.kind == kind.name,
+                ISPObjectFingerprint.isp_id.in_(batch),
+            )
+        )
+
+    await db.commit()
+
+    result.new_reports = len(new_reports)
+    result.resolved_reports = sum(len(isp_ids) for isp_ids in resolved.values())
+    return result
+
+
+async def reconcile_all(client: Optional[ISPManagerClient] = None) -> List[KindResult]:
+    """Один проход сверки по всем видам объектов на каждом узле (или на узле client)."""
+
+    clients = [client] if client is not None else [get_isp_client(node) for node in isp_nodes.names()]
+    results: List[KindResult] = []
+
+    async with async_session_maker() as db:
+        for node_client in clients:
+            try:
+                for kind in PANEL_KINDS:
+                    kind_result = await reconcile_kind(db, node_client, kind)
+                    logger.info(
+                        "ISP reconciliation %s/%s: seen=%d changed=%d new_reports=%d resolved=%d",
+                        kind_result.node,
+                        kind.name,
+                        kind_result.seen,
+                        kind_result.changed,
+                        kind_result.new_reports,
+                        kind_result.resolved_reports,
+                    )
+                    results.append(kind_result)
+            except ISPManagerError as exc:
+                # Недоступный узел не мешает сверке остальных
+                await db.rollback()
+                logger.warning("ISP reconciliation of node %s failed: %s", node_client.node, exc)
+
+    return results
+
+
+async def reconcile_locked() -> Optional[List[KindResult]]:
+    """Сверка под advisory lock; None — её уже выполняет другой воркер."""
+
+    async with try_advisory_lock(RECONCILE_LOCK_KEY) as locked:
+        if not locked:
+            return None
+        return await reconcile_all()
+
+
+async def run_reconciliation_loop() -> None:
+    """Периодическая сверка; запускается из lifespan при isp_reconcile_interval > 0."""
+
+    interval = settings.isp_reconcile_interval
+    while True:
+        try:
+            await reconcile_locked()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("ISP reconciliation run failed")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":  # pragma: no cover - ручной запуск
+    from app.core.logging_config import setup_logging
+
+    setup_logging()
+    asyncio.run(reconcile_all())
@@ -0,0 +1,233 @@
+"""Фоновый сбор статистики ресурсов аккаунтов из ISPmanager.
+
+Раз в usage_collect_interval секунд каждый аккаунт опрашивается один раз:
+моменты опроса случайно разнесены по интервалу, чтобы нагрузка на панель
+была ровной, и одновременно идёт не больше usage_collect_concurrency
+опросов. Замеры пишутся пачками; после цикла пересчитываются часовые и
+суточные агрегаты затронутых периодов и удаляется всё, что старше сроков
+хранения. В нескольких воркерах цикл выполняет только владелец advisory
+lock.
+
+Запуск одного цикла вручную: ``python -m app.modules.usage.collector``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.db import async_session_maker, try_advisory_lock
+from app.integrations import ISPManagerError, get_isp_client
+from app.modules.auth.models import AuthUsers
+from app.modules.usage.models import UsageCounter, UsageRollup, UsageSample
+
+logger = logging.getLogger(__name__)
+
+# Ключ pg_advisory_lock: один сборщик на кластер воркеров
+COLLECTOR_LOCK_KEY = 0x75736167
+
+HOUR = "hour"
+DAY = "day"
+
+# (user_id, момент замера, значения панели)
+RawSample = Tuple[int, datetime, Dict[str, float]]
+
+HOURLY_ROLLUP = text(
+    """
+    INSERT INTO usage_rollups (user_id, bucket, bucket_start, disk_mb_avg, disk_mb_max, traffic_mb, hits, samples)
+    SELECT user_id, 'hour', date_trunc('hour', sampled_at),
+           avg(disk_mb), max(disk_mb), sum(traffic_mb), sum(hits), count(*)
+    FROM usage_samples
+    WHERE sampled_at >= date_trunc('hour', CAST(:since AS timestamptz))
+    GROUP BY user_id, date_trunc('hour', sampled_at)
+    ON CONFLICT (user_id, bucket, bucket_start) DO UPDATE SET
+        disk_mb_avg = EXCLUDED.disk_mb_avg,
+        disk_mb_max = EXCLUDED.disk_mb_max,
+        traffic_mb = EXCLUDED.traffic_mb,
+        hits = EXCLUDED.hits,
+        samples = EXCLUDED.samples
+    """
+)
+
+# Сутки собираются из часов, поэтому часовые агрегаты хранятся дольше суток
+DAILY_ROLLUP = text(
+    """
+    INSERT INTO usage_rollups (user_id, bucket, bucket_start, disk_mb_avg, disk_mb_max, traffic_mb, hits, samples)
+    SELECT user_id, 'day', date_trunc('day', bucket_start),
+           sum(disk_mb_avg * samples) / sum(samples), max(disk_mb_max), sum(traffic_mb), sum(hits), sum(samples)
+    FROM usage_rollups
+    WHERE bucket = 'hour' AND bucket_start >= date_trunc('day', CAST(:since AS timestamptz))
+    GROUP BY user_id, date_trunc('day', bucket_start)
+    ON CONFLICT (user_id, bucket, bucket_start) DO UPDATE SET
+        disk_mb_avg = EXCLUDED.disk_mb_avg,
+        disk_mb_max = EXCLUDED.disk_mb_max,
+        traffic_mb = EXCLUDED.traffic_mb,
+        hits = EXCLUDED.hits,
+        samples = EXCLUDED.samples
+    """
+)
+
+
+def _delta(current: float, previous: Optional[float]) -> float:
+    """Прирост накопительного счётчика; уменьшение — сброс периода статистики панели."""
+
+    if previous is None:
+        return 0.0
+    if current < previous:
+        return current
+    return current - previous
+
+
+async def store_samples(db: AsyncSession, raw: List[RawSample]) -> None:
+    """Записать пачку замеров, переведя счётчики панели в прирост."""
+
+    user_ids = [user_id for user_id, _, _ in raw]
+    counters = {
+        row.user_id: row
+        for row in (await db.execute(select(UsageCounter).where(UsageCounter.user_id.in_(user_ids)))).scalars()
+    }
+
+    samples = []
+    latest: Dict[int, Dict[str, float]] = {}
+    for user_id, sampled_at, usage in sorted(raw, key=lambda item: item[1]):
+        previous = latest.get(user_id)
+        if previous is None and user_id in counters:
+            previous = {"traffic_mb": counters[user_id].traffic_mb, "hits": float(counters[user_id].hits)}
+        samples.append(
+            {
+                "user_id": user_id,
+                "sampled_at": sampled_at,
+                "disk_mb": usage["disk_mb"],
+                "traffic_mb": _delta(usage["traffic_mb"], previous and previous["traffic_mb"]),
+                "hits": int(_delta(usage["hits"], previous and previous["hits"])),
+            }
+        )
+        latest[user_id] = usage
+
+    await db.execute(pg_insert(UsageSample).on_conflict_do_nothing(), samples)
+    upsert = pg_insert(UsageCounter)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=[UsageCounter.user_id],
+        set_={"traffic_mb": upsert.excluded.traffic_mb, "hits": upsert.excluded.hits, "updated_at": upsert.excluded.updated_at},
+    )
+    now = datetime.now(timezone.utc)
+    await db.execute(
+        upsert,
+        [
+            {"user_id": user_id, "traffic_mb": usage["traffic_mb"], "hits": int(usage["hits"]), "updated_at": now}
+            for user_id, usage in latest.items()
+        ],
+    )
+    await db.commit()
+
+
+async def refresh_rollups(db: AsyncSession, since: datetime) -> None:
+    await db.execute(HOURLY_ROLLUP, {"since": since})
+    await db.execute(DAILY_ROLLUP, {"since": since})
+    await db.commit()
+
+
+async def apply_retention(db: AsyncSession) -> None:
+    now = datetime.now(timezone.utc)
+    await db.execute(
+        delete(UsageSample).where(UsageSample.sampled_at < now - timedelta(days=settings.usage_retention_samples_days))
+    )
+    for bucket, days in ((HOUR, settings.usage_retention_hourly_days), (DAY, settings.usage_retention_daily_days)):
+        await db.execute(
+            delete(UsageRollup).where(UsageRollup.bucket == bucket, UsageRollup.bucket_start < now - timedelta(days=days))
+        )
+    await db.commit()
+
+
+async def collect_cycle() -> int:
+    """Опросить все аккаунты один раз; возвращает число записанных замеров."""
+
+    async with async_session_maker() as db:
+        accounts = (
+            await db.execute(
+                select(AuthUsers.id, AuthUsers.isp_account_id, AuthUsers.isp_node).where(
+                    AuthUsers.isp_account_id.is_not(None), AuthUsers.is_active.is_(True)
+                )
+            )
+        ).all()
+    if not accounts:
+        return 0
+
+    cycle_started = datetime.now(timezone.utc)
+    spread = settings.usage_collect_interval * 0.8
+    semaphore = asyncio.Semaphore(max(1, settings.usage_collect_concurrency))
+    pending: List[RawSample] = []
+    stored = 0
+    failed = 0
+
+    async def flush() -> None:
+        nonlocal stored
+        # Пачка забирается до первого await: параллельные flush не пишут одно и то же
+        batch, pending[:] = list(pending), []
+        if batch:
+            async with async_session_maker() as db:
+                await store_samples(db, batch)
+            stored += len(batch)
+
+    async def poll(user_id: int, isp_account_id: str, isp_node: Optional[str]) -> None:
+        nonlocal failed
+        await asyncio.sleep(random.uniform(0, spread))
+        async with semaphore:
+            try:
+                usage = await get_isp_client(isp_node).account_usage(account_id=isp_account_id)
+            except ISPManagerError as exc:
+                failed += 1
+                logger.debug("Usage poll of user %s failed: %s", user_id, exc)
+                return
+        pending.append((user_id, datetime.now(timezone.utc), usage))
+        if len(pending) >= settings.usage_collect_batch_size:
+            await flush()
+
+    await asyncio.gather(*(poll(*account) for account in accounts))
+    await flush()
+
+    async with async_session_maker() as db:
+        await refresh_rollups(db, cycle_started)
+        await apply_retention(db)
+    logger.info("Usage collection: accounts=%d stored=%d failed=%d", len(accounts), stored, failed)
+    return stored
+
+
+async def collect_locked() -> Optional[int]:
+    """Цикл сбора под advisory lock; None — цикл уже идёт в другом воркере."""
+
+    async with try_advisory_lock(COLLECTOR_LOCK_KEY) as locked:
+        if not locked:
+            return None
+        return await collect_cycle()
+
+
+async def run_usage_collector() -> None:
+    """Периодический сбор; запускается из lifespan при usage_collect_interval > 0."""
+
+    interval = settings.usage_collect_interval
+    while True:
+        started = time.monotonic()
+        try:
+            await collect_locked()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Usage collection cycle failed")
+        await asyncio.sleep(max(1.0, interval - (time.monotonic() - started)))
+
+
+if __name__ == "__main__":  # pragma: no cover - ручной запуск
+    from app.core.logging_config import setup_logging
+
+    setup_logging()
+    asyncio.run(collect_cycle())
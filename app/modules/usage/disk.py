@@ -0,0 +1,322 @@
+"""Занятость диска домашними каталогами клиентов (ftp_root_path/{user_id}).
+
+Для каждого каталога дерева хранится его собственный размер (файлы без
+подкаталогов) и mtime, для аккаунта — итог. Первый подсчёт аккаунта обходит
+дерево целиком через os.scandir; обходы разных аккаунтов идут параллельно в
+пуле потоков. Дальше раз в usage_disk_scan_interval секунд проверяется
+только mtime каталогов: он меняется при создании, удалении и переименовании
+записей, и заново читаются лишь изменившиеся каталоги. Дозапись в уже
+существующий файл mtime каталога не меняет, поэтому раз в
+usage_disk_full_scan_interval аккаунт пересчитывается полностью.
+
+Размер считается как у du: по выделенным блокам, ссылки не разыменовываются.
+GET /hosting/usage/disk и проверки квоты читают только disk_usage_totals.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.db import async_session_maker, copy_records, try_advisory_lock
+from app.core.metrics import DISK_SCAN_DURATION
+from app.modules.hosting.models import HostingAccount
+from app.modules.usage.models import DiskUsageDir, DiskUsageTotal
+
+logger = logging.getLogger(__name__)
+
+SCANNER_LOCK_KEY = 0x6469736B
+
+# Удалённых каталогов в одном DELETE ... IN
+_DELETE_CHUNK = 1000
+
+T = TypeVar("T")
+
+
+@dataclass
+class DirStat:
+    bytes: int
+    files: int
+    mtime_ns: int
+
+
+# Относительный путь каталога -> собственный размер
+Tree = Dict[str, DirStat]
+
+
+def _join(parent: str, name: str) -> str:
+    return f"{parent}/{name}" if parent else name
+
+
+def _scan_dir(path: str) -> Tuple[DirStat, List[str]]:
+    """Собственный размер каталога и имена подкаталогов."""
+
+    # mtime берётся до чтения: изменение во время обхода заметит следующий цикл
+    dir_stat = os.stat(path, follow_symlinks=False)
+    size = dir_stat.st_blocks * 512
+    files = 0
+    children: List[str] = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    children.append(entry.name)
+                    continue
+                size += entry.stat(follow_symlinks=False).st_blocks * 512
+            except FileNotFoundError:
+                continue
+            files += 1
+    return DirStat(size, files, dir_stat.st_mtime_ns), children
+
+
+def scan_tree(home: str, start: str = "") -> Tree:
+    """Полный обход поддерева start домашнего каталога home."""
+
+    tree: Tree = {}
+    stack = [start]
+    while stack:
+        rel = stack.pop()
+        try:
+            tree[rel], children = _scan_dir(os.path.join(home, rel))
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        except PermissionError as exc:
+            logger.warning("Disk usage scan skipped %s: %s", exc.filename, exc.strerror)
+            continue
+        stack.extend(_join(rel, name) for name in children)
+    return tree
+
+
+def refresh_tree(home: str, tree: Tree) -> Tuple[Tree, List[str]]:
+    """Изменившиеся и удалённые каталоги по сравнению с сохранённым деревом."""
+
+    changed: Tree = {}
+    removed: List[str] = []
+    for rel, known in tree.items():
+        path = os.path.join(home, rel)
+        try:
+            mtime_ns = os.stat(path, follow_symlinks=False).st_mtime_ns
+            if mtime_ns == known.mtime_ns:
+                continue
+            changed[rel], children = _scan_dir(path)
+        except (FileNotFoundError, NotADirectoryError):
+            removed.append(rel)
+            continue
+        except PermissionError:
+            continue
+        for name in children:
+            child = _join(rel, name)
+            if child not in tree and child not in changed:
+                changed.update(scan_tree(home, child))
+    return changed, removed
+
+
+def _under_root(home: str) -> Optional[str]:
+    root = os.path.realpath(settings.ftp_root_path)
+    resolved = os.path.realpath(home)
+    if resolved != root and resolved.startswith(root + os.sep):
+        return resolved
+    return None
+
+
+async def _save_totals(db: AsyncSession, user_id: int, tree: Tree, full_scan_at: datetime) -> None:
+    values = {
+        "bytes": sum(stat.bytes for stat in tree.values()),
+        "files": sum(stat.files for stat in tree.values()),
+        "directories": len(tree),
+        "full_scan_at": full_scan_at,
+        "updated_at": datetime.now(timezone.utc),
+    }
+    statement = pg_insert(DiskUsageTotal).values(user_id=user_id, **values)
+    await db.execute(statement.on_conflict_do_update(index_elements=[DiskUsageTotal.user_id], set_=values))
+
+
+async def _save_full(db: AsyncSession, user_id: int, tree: Tree, scanned_at: datetime) -> None:
+    await db.execute(delete(DiskUsageDir).where(DiskUsageDir.user_id == user_id))
+    await copy_records(
+        db,
+        DiskUsageDir.__tablename__,
+        ("user_id", "path", "bytes", "files", "mtime_ns"),
+        ((user_id, rel, stat.bytes, stat.files, stat.mtime_ns) for rel, stat in tree.items()),
+    )
+    await _save_totals(db, user_id, tree, scanned_at)
+    await db.commit()
+
+
+async def _save_changes(
+    db: AsyncSession, user_id: int, tree: Tree, changed: Tree, removed: List[str], full_scan_at: datetime
+) -> None:
+    for start in range(0, len(removed), _DELETE_CHUNK):
+        await db.execute(
+            delete(DiskUsageDir).where(
+                DiskUsageDir.user_id == user_id, DiskUsageDir.path.in_(removed[start:start + _DELETE_CHUNK])
+            )
+        )
+    if changed:
+        upsert = pg_insert(DiskUsageDir)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[DiskUsageDir.user_id, DiskUsageDir.path],
+            set_={"bytes": upsert.excluded.bytes, "files": upsert.excluded.files, "mtime_ns": upsert.excluded.mtime_ns},
+        )
+        await db.execute(
+            upsert,
+            [
+                {"user_id": user_id, "path": rel, "bytes": stat.bytes, "files": stat.files, "mtime_ns": stat.mtime_ns}
+                for rel, stat in changed.items()
+            ],
+        )
+    await _save_totals(db, user_id, tree, full_scan_at)
+    await db.commit()
+
+
+class DiskUsageEngine:
+    """Деревья каталогов держатся в памяти процесса сканера; после перезапуска читаются из БД."""
+
+    def __init__(self) -> None:
+        self._trees: Dict[int, Tree] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def _in_pool(self, func: Callable[..., T], *args) -> T:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=max(1, settings.usage_disk_scan_workers), thread_name_prefix="disk-usage"
+            )
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _load_tree(self, user_id: int) -> Optional[Tree]:
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(DiskUsageDir.path, DiskUsageDir.bytes, DiskUsageDir.files, DiskUsageDir.mtime_ns).where(
+                    DiskUsageDir.user_id == user_id
+                )
+            )
+            tree = {rel: DirStat(size, files, mtime_ns) for rel, size, files, mtime_ns in result}
+        return tree or None
+
+    async def update_account(self, user_id: int, home: str, full_scan_at: Optional[datetime]) -> None:
+        root = _under_root(home)
+        if root is None:
+            logger.warning("Home directory %s of user %s is outside ftp_root_path, skipped", home, user_id)
+            return
+
+        now = datetime.now(timezone.utc)
+        full_due = full_scan_at is None or now - full_scan_at > timedelta(seconds=settings.usage_disk_full_scan_interval)
+        tree = self._trees.get(user_id)
+        if tree is None and not full_due:
+            tree = await self._load_tree(user_id)
+
+        started = time.perf_counter()
+        if tree is None or full_due:
+            tree = await self._in_pool(scan_tree, root)
+            async with async_session_maker() as db:
+                await _save_full(db, user_id, tree, now)
+            kind = "full"
+        else:
+            changed, removed = await self._in_pool(refresh_tree, root, tree)
+            for rel in removed:
+                tree.pop(rel, None)
+            tree.update(changed)
+            if changed or removed:
+                async with async_session_maker() as db:
+                    await _save_changes(db, user_id, tree, changed, removed, full_scan_at)
+            kind = "incremental"
+        self._trees[user_id] = tree
+        DISK_SCAN_DURATION.labels(kind).observe(time.perf_counter() - started)
+
+    async def run_cycle(self) -> int:
+        """Обновить все аккаунты; возвращает их число."""
+
+        async with async_session_maker() as db:
+            accounts = (
+                await db.execute(
+                    select(HostingAccount.user_id, HostingAccount.home_directory, DiskUsageTotal.full_scan_at).outerjoin(
+                        DiskUsageTotal, DiskUsageTotal.user_id == HostingAccount.user_id
+                    )
+                )
+            ).all()
+        active = {user_id for user_id, _, _ in accounts}
+        for user_id in list(self._trees):
+            if user_id not in active:
+                del self._trees[user_id]
+
+        semaphore = asyncio.Semaphore(max(1, settings.usage_disk_scan_workers))
+
+        async def update(user_id: int, home: str, full_scan_at: Optional[datetime]) -> None:
+            async with semaphore:
+                try:
+                    await self.update_account(user_id, home, full_scan_at)
+                except Exception:
+                    logger.exception("Disk usage update of user %s failed", user_id)
+
+        await asyncio.gather(*(update(*account) for account in accounts))
+        return len(accounts)
+
+    def forget(self) -> None:
+        self._trees.clear()
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+disk_usage = DiskUsageEngine()
+
+
+def disk_quota_bytes() -> Optional[int]:
+    """Квота на домашний каталог в байтах; None — без ограничения."""
+
+    if settings.hosting_disk_quota_mb <= 0:
+        return None
+    return settings.hosting_disk_quota_mb * 1024 * 1024
+
+
+async def disk_quota_left(db: AsyncSession, user_id: int) -> Optional[int]:
+    """Свободное место по квоте по последнему подсчёту, без обхода каталога."""
+
+    quota = disk_quota_bytes()
+    if quota is None:
+        return None
+    used = await db.scalar(select(DiskUsageTotal.bytes).where(DiskUsageTotal.user_id == user_id))
+    return quota - (used or 0)
+
+
+async def run_disk_usage_scanner() -> None:
+    """Периодический подсчёт; запускается из lifespan при usage_disk_scan_interval > 0."""
+
+    interval = settings.usage_disk_scan_interval
+    try:
+        while True:
+            started = time.monotonic()
+            try:
+                async with try_advisory_lock(SCANNER_LOCK_KEY) as locked:
+                    if locked:
+                        await disk_usage.run_cycle()
+                    else:
+                        # Пока сканирует другой воркер, деревья в памяти устаревают
+                        disk_usage.forget()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Disk usage scan cycle failed")
+            await asyncio.sleep(max(1.0, interval - (time.monotonic() - started)))
+    finally:
+        disk_usage.close()
+
+
+if __name__ == "__main__":  # pragma: no cover - ручной запуск
+    from app.core.logging_config import setup_logging
+
+    setup_logging()
+    asyncio.run(disk_usage.run_cycle())
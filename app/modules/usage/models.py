@@ -0,0 +1,67 @@
+from sqlalchemy import BigInteger, Column, DateTime, Float, ForeignKey, Integer, REAL, String, Text
+from sqlalchemy.sql import func
+
+from app.core.db import Base
+
+
+class UsageSample(Base):
+    """Замер аккаунта: диск на момент замера, трафик и запросы — прирост с прошлого замера."""
+
+    __tablename__ = "usage_samples"
+
+    user_id = Column(Integer, ForeignKey("auth_users.id", ondelete="CASCADE"), primary_key=True)
+    sampled_at = Column(DateTime(timezone=True), primary_key=True)
+    disk_mb = Column(REAL, nullable=False)
+    traffic_mb = Column(REAL, nullable=False)
+    hits = Column(Integer, nullable=False)
+
+
+class UsageRollup(Base):
+    """Агрегат замеров за час или сутки; из него отвечает GET /hosting/usage."""
+
+    __tablename__ = "usage_rollups"
+
+    user_id = Column(Integer, ForeignKey("auth_users.id", ondelete="CASCADE"), primary_key=True)
+    bucket = Column(String(8), primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    disk_mb_avg = Column(REAL, nullable=False)
+    disk_mb_max = Column(REAL, nullable=False)
+    traffic_mb = Column(REAL, nullable=False)
+    hits = Column(BigInteger, nullable=False)
+    samples = Column(Integer, nullable=False)
+
+
+class UsageCounter(Base):
+    """Последние накопительные счётчики панели — для вычисления прироста."""
+
+    __tablename__ = "usage_counters"
+
+    user_id = Column(Integer, ForeignKey("auth_users.id", ondelete="CASCADE"), primary_key=True)
+    traffic_mb = Column(Float, nullable=False)
+    hits = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class DiskUsageDir(Base):
+    """Собственный размер каталога (без подкаталогов) в домашнем каталоге аккаунта."""
+
+    __tablename__ = "disk_usage_dirs"
+
+    user_id = Column(Integer, ForeignKey("auth_users.id", ondelete="CASCADE"), primary_key=True)
+    path = Column(Text, primary_key=True)  # относительно home_directory, "" — сам каталог
+    bytes = Column(BigInteger, nullable=False)
+    files = Column(Integer, nullable=False)
+    mtime_ns = Column(BigInteger, nullable=False)
+
+
+class DiskUsageTotal(Base):
+    """Итог по домашнему каталогу; из него отвечают /hosting/usage/disk и проверки квоты."""
+
+    __tablename__ = "disk_usage_totals"
+
+    user_id = Column(Integer, ForeignKey("auth_users.id", ondelete="CASCADE"), primary_key=True)
+    bytes = Column(BigInteger, nullable=False)
+    files = Column(BigInteger, nullable=False)
+    directories = Column(Integer, nullable=False)
+    full_scan_at = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
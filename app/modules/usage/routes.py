@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.db import get_db
+from app.core.responses import model_response
+from app.modules.auth.routes import get_current_user_id
+from app.modules.usage.disk import disk_quota_bytes
+from app.modules.usage.models import DiskUsageTotal, UsageRollup
+from app.modules.usage.schemas import DiskUsageResponse, UsageBucket, UsagePoint, UsageRange, UsageResponse
+
+router = APIRouter()
+
+# Диапазон -> (длительность, агрегат); часовые агрегаты хранятся не меньше недели
+RANGES = {
+    UsageRange.DAY: (timedelta(hours=24), UsageBucket.HOUR),
+    UsageRange.WEEK: (timedelta(days=7), UsageBucket.HOUR),
+    UsageRange.MONTH: (timedelta(days=30), UsageBucket.DAY),
+    UsageRange.YEAR: (timedelta(days=365), UsageBucket.DAY),
+}
+
+
+@router.get("/hosting/usage", response_model=UsageResponse)
+async def get_usage(
+    range_: UsageRange = Query(UsageRange.DAY, alias="range"),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    """Диск, трафик и запросы аккаунта за период — из готовых агрегатов, без обращения к панели"""
+    duration, bucket = RANGES[range_]
+    result = await db.execute(
+        select(
+            UsageRollup.bucket_start,
+            UsageRollup.disk_mb_avg,
+            UsageRollup.disk_mb_max,
+            UsageRollup.traffic_mb,
+            UsageRollup.hits,
+        )
+        .where(
+            UsageRollup.user_id == user_id,
+            UsageRollup.bucket == bucket.value,
+            UsageRollup.bucket_start >= datetime.now(timezone.utc) - duration,
+        )
+        .order_by(UsageRollup.bucket_start)
+    )
+    points = [
+        UsagePoint(start=start, disk_mb=disk_avg, disk_mb_max=disk_max, traffic_mb=traffic, hits=hits)
+        for start, disk_avg, disk_max, traffic, hits in result
+    ]
+    return model_response(
+        UsageResponse(
+            range=range_,
+            bucket=bucket,
+            disk_mb=points[-1].disk_mb if points else None,
+            traffic_mb=round(sum(point.traffic_mb for point in points), 3),
+            hits=sum(point.hits for point in points),
+            points=points,
+        )
+    )
+
+
+@router.get("/hosting/usage/disk", response_model=DiskUsageResponse)
+async def get_disk_usage(
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    """Занятость домашнего каталога по последнему подсчёту сканера"""
+    total = await db.get(DiskUsageTotal, user_id)
+    if total is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Занятость диска ещё не подсчитана")
+    quota = disk_quota_bytes()
+    return model_response(
+        DiskUsageResponse(
+            bytes=total.bytes,
+            mb=round(total.bytes / (1024 * 1024), 2),
+            files=total.files,
+            directories=total.directories,
+            quota_mb=quota // (1024 * 1024) if quota is not None else None,
+            updated_at=total.updated_at,
+            full_scan_at=total.full_scan_at,
+        )
+    )
@@ -0,0 +1,44 @@
+from datetime import datetime
+from enum import Enum
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class UsageRange(str, Enum):
+    DAY = "24h"
+    WEEK = "7d"
+    MONTH = "30d"
+    YEAR = "365d"
+
+
+class UsageBucket(str, Enum):
+    HOUR = "hour"
+    DAY = "day"
+
+
+class UsagePoint(BaseModel):
+    start: datetime
+    disk_mb: float
+    disk_mb_max: float
+    traffic_mb: float
+    hits: int
+
+
+class UsageResponse(BaseModel):
+    range: UsageRange
+    bucket: UsageBucket
+    disk_mb: Optional[float] = None  # последнее значение
+    traffic_mb: float = 0.0  # сумма за период
+    hits: int = 0
+    points: List[UsagePoint]
+
+
+class DiskUsageResponse(BaseModel):
+    bytes: int
+    mb: float
+    files: int
+    directories: int
+    quota_mb: Optional[int] = None  # None — без ограничения
+    updated_at: datetime
+    full_scan_at: datetime
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.db import get_db
+from app.core.etag import USER_RESOURCE, conditional_get
+from app.core.responses import model_response
 from app.modules.auth.models import AuthUsers
 from app.modules.auth.routes import get_current_user
+from app.modules.outbox.events import USER_UPDATED, record_event
 from app.modules.users.schemas import UserProfileResponse, UserProfileUpdate
 
 router = APIRouter()
@@ -12,10 +15,18 @@ router = APIRouter()
 
 @router.get("/users/me", response_model=UserProfileResponse)
 async def get_my_profile(
+    request: Request,
     current_user: AuthUsers = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
     """Возвращает сведения о текущем пользователе."""
-    return UserProfileResponse.model_validate(current_user, from_attributes=True)
+    etag, not_modified = await conditional_get(db, request, current_user.id, USER_RESOURCE)
+    if not_modified:
+        return not_modified
+
+    response = model_response(UserProfileResponse.model_validate(current_user, from_attributes=True))
+    response.headers["ETag"] = etag
+    return response
 
 
 @router.patch("/users/me", response_model=UserProfileResponse)
@@ -26,21 +37,22 @@ async def update_my_profile(
 ):
     """Обновляет основные данные профиля."""
 
-    updated = False
+    changes = {}
 
     for field in ("first_name", "last_name", "phone"):
         value = getattr(user_update, field)
         if value is not None:
             setattr(current_user, field, value)
-            updated = True
+            changes[field] = value
 
-    if not updated:
-        return UserProfileResponse.model_validate(current_user, from_attributes=True)
+    if not changes:
+        return model_response(UserProfileResponse.model_validate(current_user, from_attributes=True))
 
+    record_event(db, USER_UPDATED, "user", current_user.id, changes)
     await db.commit()
     await db.refresh(current_user)
 
-    return UserProfileResponse.model_validate(current_user, from_attributes=True)
+    return model_response(UserProfileResponse.model_validate(current_user, from_attributes=True))
 
 
 @router.get("/users/{user_id}", response_model=UserProfileResponse)
@@ -60,4 +72,4 @@ async def get_user_by_id(
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден")
 
-    return UserProfileResponse.model_validate(user, from_attributes=True)
\ No newline at end of file
+    return model_response(UserProfileResponse.model_validate(user, from_attributes=True))
\ No newline at end of file
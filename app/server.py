@@ -0,0 +1,362 @@
+"""Продакшен-запуск: мастер-процесс и pre-fork воркеры uvicorn.
+
+Мастер открывает сокет и запускает server_workers воркеров (0 — по числу
+доступных процессу ядер с учётом cgroup-квоты), перезапускает упавших.
+Воркеры стартуют через spawn и импортируют приложение сами, поэтому
+перезапуск подхватывает новый код. uvloop и httptools используются, если
+установлены.
+
+Сигналы мастеру:
+
+- SIGTERM, SIGINT — плавная остановка: воркеры сразу отвечают draining на
+  /health/ready и ещё server_drain_delay секунд принимают запросы, пока
+  балансировщик снимает их с раздачи; затем перестают принимать соединения,
+  дожидаются текущих запросов (не дольше server_graceful_timeout) и
+  закрывают ресурсы в shutdown-фазе lifespan;
+- SIGHUP — поочерёдный перезапуск: новый воркер запускается и проходит
+  startup раньше, чем останавливается старый, так что сокет не простаивает.
+  SIGTERM во время перезапуска прерывает его и останавливает сервер.
+
+Упавший воркер перезапускается с экспоненциальной задержкой, если падения
+идут сразу после запуска (например, новый код не импортируется). После
+WORKER_MAX_RAPID_EXITS таких падений подряд мастер перестаёт перезапускать
+воркеры до SIGHUP, а если не осталось ни одного — завершается с ошибкой.
+"""
+
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import sys
+import time
+from collections import deque
+from multiprocessing.connection import Connection
+from multiprocessing.context import SpawnProcess
+from types import FrameType
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+import uvicorn
+
+from app.core.config import settings
+
+APP = "app.main:app"
+
+logger = logging.getLogger("app.server")
+
+_spawn = multiprocessing.get_context("spawn")
+
+# Воркер, проживший меньше, упал при запуске, а не в работе
+WORKER_RAPID_EXIT_SECONDS = 10.0
+WORKER_MAX_RAPID_EXITS = 5
+WORKER_RESPAWN_MAX_DELAY = 30.0
+_POLL_INTERVAL = 0.2
+
+
+def available_cpus() -> int:
+    """Ядра, доступные процессу: affinity и квота cgroup v2 (cpu.max)."""
+
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover - не Linux
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max", encoding="ascii") as quota_file:
+            quota, period = quota_file.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def _event_loop() -> str:
+    try:
+        import uvloop  # noqa: F401
+    except ImportError:
+        return "asyncio"
+    return "uvloop"
+
+
+def _http_protocol() -> str:
+    try:
+        import httptools  # noqa: F401
+    except ImportError:
+        return "h11"
+    return "httptools"
+
+
+def _uvicorn_options() -> Dict[str, Any]:
+    return {
+        "loop": _event_loop(),
+        "http": _http_protocol(),
+        "lifespan": "on",
+        "backlog": settings.server_backlog,
+        "timeout_keep_alive": settings.server_keepalive,
+        "timeout_graceful_shutdown": settings.server_graceful_timeout,
+        "proxy_headers": True,
+        "forwarded_allow_ips": settings.server_forwarded_allow_ips,
+        "log_level": "info",
+    }
+
+
+def _stop_timeout() -> float:
+    return settings.server_drain_delay + settings.server_graceful_timeout + 5
+
+
+def _mark_process_dead(pid: int) -> None:
+    # Импорт после очистки каталога метрик в main()
+    from app.core.metrics import mark_process_dead
+
+    mark_process_dead(pid)
+
+
+class _WorkerServer(uvicorn.Server):
+    """Сообщает мастеру, что lifespan startup прошёл и воркер принимает запросы.
+
+    Сигнал остановки сначала переводит /health/ready в draining и только
+    через server_drain_delay закрывает сокет: до закрытия балансировщик
+    успевает увидеть 503 и перестать слать сюда запросы.
+    """
+
+    def __init__(self, config: uvicorn.Config, ready: Optional[Connection] = None):
+        super().__init__(config)
+        self._ready = ready
+
+    async def startup(self, sockets: Optional[List[socket.socket]] = None) -> None:
+        await super().startup(sockets=sockets)
+        if self._ready is not None:
+            if not self.should_exit:
+                self._ready.send_bytes(b"1")
+            self._ready.close()
+
+    def handle_exit(self, sig: int, frame: Optional[FrameType]) -> None:
+        from app.core.readiness import readiness
+
+        if readiness.draining or settings.server_drain_delay <= 0:
+            # Повторный сигнал не ждёт окончания задержки
+            readiness.draining = True
+            super().handle_exit(sig, frame)
+            return
+        readiness.draining = True
+        logger.info("Draining for %.1fs before closing the listener", settings.server_drain_delay)
+        asyncio.get_running_loop().call_later(settings.server_drain_delay, super().handle_exit, sig, frame)
+
+
+def _run_worker(app: str, sock: socket.socket, ready: Connection, options: Dict[str, Any]) -> None:
+    config = uvicorn.Config(app, **options)
+    _WorkerServer(config, ready).run(sockets=[sock])
+
+
+class _Worker:
+    def __init__(self, app: str, sock: socket.socket, options: Dict[str, Any]):
+        self._ready, ready = _spawn.Pipe(duplex=False)
+        self.process: SpawnProcess = _spawn.Process(
+            target=_run_worker,
+            args=(app, sock, ready, options),
+            name="hosting-api-worker",
+        )
+        self.process.start()
+        self.started = time.monotonic()
+        ready.close()
+
+    def wait_ready(self, timeout: float, interrupted: Callable[[], bool]) -> bool:
+        """Дождаться startup; ждёт короткими шагами, чтобы мастер видел сигналы."""
+
+        deadline = time.monotonic() + timeout
+        try:
+            while not self._ready.poll(min(_POLL_INTERVAL, max(0.0, deadline - time.monotonic()))):
+                if interrupted() or time.monotonic() >= deadline:
+                    return False
+            return self._ready.recv_bytes() == b"1"
+        except EOFError:
+            # Воркер завершился, не дойдя до приёма запросов
+            return False
+        finally:
+            self._ready.close()
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid or 0
+
+
+class Master:
+    def __init__(self, app: str, workers: int):
+        self.app = app
+        self.workers_count = workers
+        self.options = _uvicorn_options()
+        self.socket = self._bind()
+        self.workers: Dict[int, _Worker] = {}
+        self._signals: Deque[int] = deque()
+        self._stopping = False
+        self._missing = 0  # воркеров, ожидающих перезапуска
+        self._rapid_exits = 0  # падений сразу после запуска подряд
+        self._respawn_at = 0.0
+        self._respawn_blocked = False
+
+    @staticmethod
+    def _bind() -> socket.socket:
+        family = socket.AF_INET6 if ":" in settings.server_host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((settings.server_host, settings.server_port))
+        sock.listen(settings.server_backlog)
+        sock.set_inheritable(True)
+        return sock
+
+    def _on_signal(self, signum: int, frame: Any) -> None:
+        self._signals.append(signum)
+
+    def _stop_requested(self) -> bool:
+        return any(signum != signal.SIGHUP for signum in self._signals)
+
+    def _spawn_worker(self) -> _Worker:
+        worker = _Worker(self.app, self.socket, self.options)
+        self.workers[worker.pid] = worker
+        return worker
+
+    def _reap(self) -> None:
+        now = time.monotonic()
+        for pid, worker in list(self.workers.items()):
+            if worker.process.is_alive():
+                continue
+            worker.process.join()
+            del self.workers[pid]
+            _mark_process_dead(pid)
+            if self._stopping:
+                continue
+            logger.warning("Worker %s exited with code %s", pid, worker.process.exitcode)
+            self._missing += 1
+            if now - worker.started < WORKER_RAPID_EXIT_SECONDS:
+                self._rapid_exits += 1
+                delay = min(WORKER_RESPAWN_MAX_DELAY, _POLL_INTERVAL * 2 ** self._rapid_exits)
+                self._respawn_at = max(self._respawn_at, now + delay)
+            else:
+                self._rapid_exits = 0
+                self._respawn_blocked = False
+
+        if not self._missing or self._stopping:
+            return
+        if self._rapid_exits >= WORKER_MAX_RAPID_EXITS:
+            if not self._respawn_blocked:
+                logger.critical(
+                    "Workers exited %d times right after start, not restarting until SIGHUP", self._rapid_exits
+                )
+                self._respawn_blocked = True
+            if not self.workers:
+                logger.critical("No workers left, exiting")
+                self._shutdown()
+                sys.exit(1)
+            return
+        if now < self._respawn_at:
+            return
+        logger.info("Starting %d workers", self._missing)
+        for _ in range(self._missing):
+            self._spawn_worker()
+        self._missing = 0
+
+    def _stop_worker(self, worker: _Worker) -> bool:
+        """Остановить воркер; False — пришёл SIGTERM, воркер дожмёт _shutdown."""
+
+        worker.process.terminate()
+        deadline = time.monotonic() + _stop_timeout()
+        while worker.process.is_alive() and time.monotonic() < deadline:
+            if self._stop_requested():
+                return False
+            worker.process.join(_POLL_INTERVAL)
+        if worker.process.is_alive():
+            logger.warning("Worker %s did not stop in time, killing", worker.pid)
+            worker.process.kill()
+            worker.process.join()
+        return True
+
+    def _rolling_restart(self) -> None:
+        # SIGHUP — явная команда оператора: перезапуск после серии падений снова разрешён
+        self._rapid_exits = 0
+        self._respawn_at = 0.0
+        self._respawn_blocked = False
+        logger.info("Rolling restart of %d workers", len(self.workers))
+        for pid, old in list(self.workers.items()):
+            if self._stop_requested():
+                return
+            new = self._spawn_worker()
+            if not new.wait_ready(settings.server_worker_start_timeout, self._stop_requested):
+                if self._stop_requested():
+                    return
+                # Новый код не стартует — оставляем старые воркеры работать
+                logger.error("Worker %s failed to start, rolling restart aborted", new.pid)
+                if self._stop_worker(new):
+                    self.workers.pop(new.pid, None)
+                    _mark_process_dead(new.pid)
+                return
+            if not self._stop_worker(old):
+                return
+            self.workers.pop(pid, None)
+            _mark_process_dead(pid)
+
+    def _shutdown(self) -> None:
+        self._stopping = True
+        logger.info("Stopping %d workers", len(self.workers))
+        for worker in self.workers.values():
+            worker.process.terminate()
+        deadline = time.monotonic() + _stop_timeout()
+        for worker in self.workers.values():
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+        self.workers.clear()
+        self.socket.close()
+
+    def run(self) -> None:
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(signum, self._on_signal)
+        logger.info(
+            "Listening on %s:%d with %d workers (loop=%s, http=%s)",
+            settings.server_host,
+            settings.server_port,
+            self.workers_count,
+            self.options["loop"],
+            self.options["http"],
+        )
+        for _ in range(self.workers_count):
+            self._spawn_worker()
+
+        while True:
+            while self._signals:
+                signum = self._signals.popleft()
+                if signum == signal.SIGHUP:
+                    self._rolling_restart()
+                else:
+                    self._shutdown()
+                    return
+            self._reap()
+            time.sleep(_POLL_INTERVAL)
+
+
+def _reset_metrics_dir() -> None:
+    # Файлы прошлого запуска исказили бы счётчики и live-gauge
+    directory = settings.metrics_multiproc_dir
+    if directory and os.path.isdir(directory):
+        shutil.rmtree(directory)
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(process)d] %(levelname)s %(name)s: %(message)s")
+    workers = settings.server_workers or available_cpus()
+    _reset_metrics_dir()
+    if workers == 1:
+        # Один процесс — без мастера, как обычный uvicorn
+        config = uvicorn.Config(APP, host=settings.server_host, port=settings.server_port, **_uvicorn_options())
+        _WorkerServer(config).run()
+        return
+    if not settings.metrics_multiproc_dir:
+        logger.warning("metrics_multiproc_dir is not set: /metrics will report a single worker")
+    Master(APP, workers).run()
+
+
+if __name__ == "__main__":
+    main()
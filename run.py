@@ -1,27 +1,11 @@
 #!/usr/bin/env python3
 """
-Скрипт для быстрого запуска Shared Hosting API
+Скрипт для запуска Shared Hosting API
+
+Число воркеров, адрес и таймауты задаются параметрами server_* в .env
+(см. app/server.py).
 """
-import uvicorn
-from app.main import app
+from app.server import main
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "app.main:app",
-        host="0.0.0.0",
-        port=8009,
-        reload=False,
-        log_level="info",
-        reload_excludes=[
-            "*.log",
-            "logs/*",
-            "logs/**/*",
-            "__pycache__/*",
-            "**/__pycache__/*",
-            "*.pyc",
-            "**/*.pyc",
-            ".git/*",
-            ".idea/*",
-            ".venv/*"
-        ]
-    ) 
\ No newline at end of file
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Задержка загрузки главной страницы кабинета: четыре вызова против одного.
+
+До GET /dashboard/summary страница запрашивала /users/me, /domains,
+/hosting/sites и /hosting/account/ftp — каждый вызов заново проверяет JWT
+и загружает пользователя (два запроса к БД из-за selectinload
+hosting_account). Сводка проверяет только JWT и делает один запрос.
+
+Запросы проходят через всё приложение по ASGI с настоящим токеном. Сессия
+БД заменена заглушкой, которая на каждый запрос ждёт --rtt-ms (сетевой
+обмен с PostgreSQL) плюс --query-ms (выполнение), а строки отдаёт из
+памяти. Старые вызовы выполняются параллельно, как Promise.all во
+фронтенде, и последовательно.
+
+Запуск из корня репозитория:
+    python scripts/bench_dashboard_summary.py [--rtt-ms 0.5] [--query-ms 0.3] [--loads 200]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from sqlalchemy.sql import Select  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.core.db import get_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.modules.auth.models import AuthUsers  # noqa: E402
+from app.modules.dashboard.routes import DASHBOARD_SUMMARY_QUERY  # noqa: E402
+from app.modules.domains.models import Domain  # noqa: E402
+from app.modules.hosting.models import HostingAccount, HostingSite  # noqa: E402
+from app.modules.security.security import create_access_token  # noqa: E402
+
+LEGACY_PATHS = ("/users/me", "/domains", "/hosting/sites", "/hosting/account/ftp")
+CREATED_AT = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeResult:
+    def __init__(self, scalar=None, rows=()):
+        self._scalar = scalar
+        self._rows = list(rows)
+
+    def scalar_one_or_none(self):
+        return self._scalar
+
+    def mappings(self):
+        return self
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def one_or_none(self):
+        return self._rows[0] if self._rows else None
+
+
+class FakeSession:
+    """Каждый execute — обмен с БД; загрузка пользователя с selectinload — два."""
+
+    def __init__(self, args):
+        self.delay = (args.rtt_ms + args.query_ms) / 1000
+        self.round_trips = 0
+        self.domains = [
+            {
+                "id": index,
+                "name": f"site-{index}.example.com",
+                "status": "active",
+                "registered_at": CREATED_AT + timedelta(days=index),
+                "expires_at": None,
+                "auto_renew": True,
+                "nameservers": None,
+                "isp_domain_id": None,
+            }
+            for index in range(1, args.domains + 1)
+        ]
+        self.sites = [
+            {
+                "id": index,
+                "domain_id": index,
+                "root_path": f"/var/www/clients/bench/site-{index}",
+                "status": "active",
+                "isp_site_id": None,
+                "created_at": CREATED_AT + timedelta(days=index),
+            }
+            for index in range(1, args.sites + 1)
+        ]
+        self.summary = self._summary_row(args.latest)
+
+    def _user(self) -> AuthUsers:
+        user = AuthUsers(
+            id=1,
+            email="bench@example.com",
+            username="bench",
+            email_verified=True,
+            phone_verified=False,
+            created_at=CREATED_AT,
+        )
+        user.hosting_account = HostingAccount(
+            ftp_username="bench", ftp_password="secret", home_directory="/var/www/clients/bench"
+        )
+        return user
+
+    def _summary_row(self, latest: int) -> dict:
+        # Так строку отдаёт asyncpg: json-колонки уже разобраны, даты — строки ISO
+        def iso(value):
+            return value.isoformat() if isinstance(value, datetime) else value
+
+        account = {"ftp_username": "bench", "home_directory": "/var/www/clients/bench"}
+        return {
+            "profile": {
+                "id": 1,
+                "email": "bench@example.com",
+                "username": "bench",
+                "first_name": None,
+                "last_name": None,
+                "phone": None,
+                "email_verified": True,
+                "phone_verified": False,
+                "isp_account_id": None,
+                "created_at": CREATED_AT.isoformat(),
+                "hosting_account": account,
+            },
+            "ftp_account": dict(account, ftp_password="secret"),
+            "counts": {"domains": len(self.domains), "sites": len(self.sites), "dns_records": 0},
+            "latest_domains": [
+                {key: iso(row[key]) for key in ("id", "name", "status", "registered_at", "expires_at")}
+                for row in self.domains[:latest]
+            ],
+            "latest_sites": [
+                {key: iso(row[key]) for key in ("id", "domain_id", "root_path", "status", "created_at")}
+                for row in self.sites[:latest]
+            ],
+            "latest_dns_changes": [],
+        }
+
+    async def _round_trip(self, count: int = 1) -> None:
+        self.round_trips += count
+        await asyncio.sleep(self.delay * count)
+
+    async def execute(self, statement, params=None):
+        if statement is DASHBOARD_SUMMARY_QUERY:
+            await self._round_trip()
+            return FakeResult(rows=[self.summary])
+        if params and "resource" in params:
+            await self._round_trip()
+            return FakeResult(scalar=1)
+        if isinstance(statement, Select):
+            entity = statement.column_descriptions[0]["entity"]
+            if entity is AuthUsers:
+                await self._round_trip(2)
+                return FakeResult(scalar=self._user())
+            await self._round_trip()
+            return FakeResult(rows=self.domains if entity is Domain else self.sites)
+        raise AssertionError(f"unexpected statement: {statement}")
+
+    async def close(self) -> None:
+        pass
+
+
+async def run(args) -> None:
+    session = FakeSession(args)
+
+    async def fake_db():
+        yield session
+
+    app.dependency_overrides[get_db] = fake_db
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': '1', 'email': 'bench@example.com'})}"}
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+
+        async def legacy_parallel():
+            responses = await asyncio.gather(*(client.get(path) for path in LEGACY_PATHS))
+            return responses
+
+        async def legacy_sequential():
+            return [await client.get(path) for path in LEGACY_PATHS]
+
+        async def summary():
+            return [await client.get("/dashboard/summary", params={"limit": args.latest})]
+
+        for name, load in (
+            ("4 calls, sequential", legacy_sequential),
+            ("4 calls, parallel", legacy_parallel),
+            ("/dashboard/summary", summary),
+        ):
+            await load()
+            session.round_trips = 0
+            samples = []
+            for _ in range(args.loads):
+                started = time.perf_counter()
+                responses = await load()
+                samples.append(time.perf_counter() - started)
+                assert all(response.status_code == 200 for response in responses), [r.text for r in responses]
+            samples.sort()
+            print(
+                f"{name:<20} p50 {statistics.median(samples) * 1000:6.2f} ms  "
+                f"p95 {samples[int(len(samples) * 0.95) - 1] * 1000:6.2f} ms  "
+                f"round trips/load {session.round_trips / args.loads:.0f}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rtt-ms", type=float, default=0.5, help="сетевой обмен с БД, мс")
+    parser.add_argument("--query-ms", type=float, default=0.3, help="выполнение одного запроса, мс")
+    parser.add_argument("--domains", type=int, default=20)
+    parser.add_argument("--sites", type=int, default=5)
+    parser.add_argument("--latest", type=int, default=5, help="последних записей в сводке")
+    parser.add_argument("--loads", type=int, default=200)
+    args = parser.parse_args()
+
+    settings.admission_enabled = False
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    print(f"DB round trip {args.rtt_ms} ms + query {args.query_ms} ms, {args.loads} page loads")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Пропускная способность распаковки архива сайта с множеством мелких файлов.
+
+deploy_archive (проверка путей, лимиты, staging и подмена каталога)
+сравнивается с extractall стандартной библиотеки на том же архиве. Архивы
+генерируются во временном каталоге; --dir задаёт каталог на нужной
+файловой системе.
+
+Запуск из корня репозитория:
+    python scripts/bench_deploy_extract.py [--files 20000] [--size 2048]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.modules.hosting.archive import deploy_archive  # noqa: E402
+
+
+def member_names(count: int):
+    # Дерево как у типичного сайта: до трёх уровней по 20 каталогов
+    for index in range(count):
+        yield f"d{index % 20}/s{index // 20 % 20}/f{index}.html"
+
+
+def build_archives(directory: str, files: int, size: int, seed: int):
+    rng = random.Random(seed)
+    payloads = [rng.randbytes(size // 2) * 2 for _ in range(64)]
+    zip_path = os.path.join(directory, "site.zip")
+    tar_path = os.path.join(directory, "site.tar.gz")
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as bundle:
+        for index, name in enumerate(member_names(files)):
+            bundle.writestr(name, payloads[index % len(payloads)])
+    with tarfile.open(tar_path, "w:gz") as bundle:
+        with zipfile.ZipFile(zip_path) as source:
+            for info in source.infolist():
+                member = tarfile.TarInfo(info.filename)
+                member.size = info.file_size
+                with source.open(info) as data:
+                    bundle.addfile(member, data)
+    return zip_path, tar_path
+
+
+def stdlib_extract(archive: str, target: str) -> None:
+    if archive.endswith(".zip"):
+        with zipfile.ZipFile(archive) as bundle:
+            bundle.extractall(target)
+    else:
+        with tarfile.open(archive) as bundle:
+            bundle.extractall(target, filter="data")
+
+
+def measure(label: str, func, archive: str, files: int, size: int, repeats: int) -> None:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func(archive)
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+    print(
+        f"{label:<28} {best:7.2f}s  {files / best:9.0f} files/s  {files * size / best / 1024 / 1024:7.1f} MiB/s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--size", type=int, default=2048, help="размер файла, байт")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--dir", default=None, help="рабочий каталог (по умолчанию временный)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-deploy-", dir=args.dir)
+    try:
+        zip_path, tar_path = build_archives(workdir, args.files, args.size, args.seed)
+        print(
+            f"{args.files} files x {args.size} B; zip {os.path.getsize(zip_path) / 1024 / 1024:.1f} MiB, "
+            f"tar.gz {os.path.getsize(tar_path) / 1024 / 1024:.1f} MiB"
+        )
+        home = os.path.join(workdir, "home")
+        os.makedirs(home)
+        limits = {"max_files": args.files, "max_bytes": args.files * args.size * 2}
+
+        def stdlib(archive: str) -> None:
+            target = os.path.join(workdir, "stdlib")
+            shutil.rmtree(target, ignore_errors=True)
+            stdlib_extract(archive, target)
+
+        for archive in (zip_path, tar_path):
+            name = os.path.basename(archive)
+            measure(f"{name} extractall", stdlib, archive, args.files, args.size, args.repeats)
+            # Повторные прогоны идут поверх существующего сайта: входят подмена и удаление старой версии
+            measure(
+                f"{name} deploy_archive",
+                lambda path: deploy_archive(path, home, "site", **limits),
+                archive,
+                args.files,
+                args.size,
+                args.repeats,
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
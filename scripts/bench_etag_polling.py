@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Опрос GET /domains клиентом, который повторяет запрос с If-None-Match.
+
+Запросы проходят через всё приложение (middleware, зависимости, маршрут)
+по ASGI. Сессия БД заменена заглушкой: счётчик tenant_versions и строки
+доменов берутся из памяти, поэтому замер показывает байты и процессорное
+время сервера без учёта задержки БД. Счётчик меняется с вероятностью
+--change-rate на опрос. Сравниваются клиент без If-None-Match (каждый
+раз 200 со списком) и клиент, отправляющий последний ETag (304, пока
+список не изменился).
+
+Запуск из корня репозитория:
+    python scripts/bench_etag_polling.py [--domains 100] [--polls 2000] [--change-rate 0.05]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.core.db import get_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.modules.auth.routes import get_current_user  # noqa: E402
+
+
+class FakeResult:
+    def __init__(self, scalar=None, rows=()):
+        self._scalar = scalar
+        self._rows = rows
+
+    def scalar_one_or_none(self):
+        return self._scalar
+
+    def mappings(self):
+        return iter(self._rows)
+
+
+class FakeSession:
+    """Отвечает на чтение версии и выборку доменов; SQL не выполняется."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.version = 1
+        self.row_queries = 0
+
+    async def execute(self, statement, params=None):
+        if params and "resource" in params:
+            return FakeResult(scalar=self.version)
+        self.row_queries += 1
+        return FakeResult(rows=self.rows)
+
+
+def build_rows(count: int):
+    registered_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": index,
+            "name": f"site-{index}.example.com",
+            "status": "active",
+            "registered_at": registered_at + timedelta(minutes=index),
+            "expires_at": date(2027, 1, 1),
+            "auto_renew": True,
+            "nameservers": ["ns1.example.net", "ns2.example.net"],
+            "isp_domain_id": str(100_000 + index),
+        }
+        for index in range(1, count + 1)
+    ]
+
+
+async def poll(session: FakeSession, args, conditional: bool) -> dict:
+    rng = random.Random(42)
+    transport = httpx.ASGITransport(app=app)
+    statuses = {200: 0, 304: 0}
+    body_bytes = 0
+    etag = None
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.process_time()
+        for _ in range(args.polls):
+            if rng.random() < args.change_rate:
+                session.version += 1
+            headers = {"If-None-Match": etag} if conditional and etag else {}
+            response = await client.get("/domains", headers=headers)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            body_bytes += len(response.content)
+            etag = response.headers.get("etag", etag)
+        elapsed = time.process_time() - started
+    return {"statuses": statuses, "bytes": body_bytes, "cpu_ms": elapsed * 1000 / args.polls}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--domains", type=int, default=100)
+    parser.add_argument("--polls", type=int, default=2000)
+    parser.add_argument("--change-rate", type=float, default=0.05, help="доля опросов, между которыми список изменился")
+    args = parser.parse_args()
+
+    settings.admission_enabled = False
+    # Строка лога на каждый запрос клиента исказила бы замер
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    session = FakeSession(build_rows(args.domains))
+
+    async def fake_db():
+        yield session
+
+    app.dependency_overrides[get_db] = fake_db
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=1)
+
+    print(f"{args.domains} domains, {args.polls} polls, change rate {args.change_rate:.0%}")
+    for name, conditional in (("always 200", False), ("If-None-Match", True)):
+        session.row_queries = 0
+        result = asyncio.run(poll(session, args, conditional))
+        print(
+            f"{name:<14} {result['cpu_ms']:6.2f} ms CPU/poll  {result['bytes'] / args.polls:9.0f} B/poll  "
+            f"row queries {session.row_queries:<5} statuses {result['statuses']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Симуляция: задержка вызовов ISPmanager у «лёгких» пользователей, пока один
+пользователь заваливает панель сотнями вызовов.
+
+Сравниваются общий FIFO-семафор и FairScheduler с тем же лимитом. Сеть не
+используется — вызов панели заменён asyncio.sleep.
+
+Запуск из корня репозитория:
+    python scripts/bench_isp_scheduler.py [--capacity 16] [--heavy 500]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from contextlib import asynccontextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.integrations.scheduler import FairScheduler  # noqa: E402
+
+
+class FifoLimiter:
+    """Прежнее поведение: общий лимит без очередей по пользователям."""
+
+    def __init__(self, capacity: int):
+        self._semaphore = asyncio.Semaphore(capacity)
+
+    @asynccontextmanager
+    async def slot(self, tenant):
+        async with self._semaphore:
+            yield
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def simulate(limiter, args) -> dict:
+    rng = random.Random(args.seed)
+    latencies = {"heavy": [], "light": []}
+
+    async def call(tenant: str, kind: str) -> None:
+        started = time.perf_counter()
+        async with limiter.slot(tenant):
+            await asyncio.sleep(rng.uniform(args.service_ms * 0.5, args.service_ms * 1.5) / 1000)
+        latencies[kind].append(time.perf_counter() - started)
+
+    async def light_user(index: int) -> None:
+        for _ in range(args.light_calls):
+            await asyncio.sleep(rng.expovariate(1000 / args.light_interval_ms))
+            await call(f"light-{index}", "light")
+
+    heavy = [call("heavy", "heavy") for _ in range(args.heavy)]
+    light = [light_user(index) for index in range(args.light_users)]
+    await asyncio.gather(*heavy, *light)
+    return latencies
+
+
+def report(name: str, latencies: dict) -> None:
+    for kind, values in latencies.items():
+        print(
+            f"{name:<6} {kind:<5} n={len(values):<4} "
+            f"p50={statistics.median(values) * 1000:8.1f} ms  "
+            f"p99={percentile(values, 0.99) * 1000:8.1f} ms  "
+            f"max={max(values) * 1000:8.1f} ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--capacity", type=int, default=16)
+    parser.add_argument("--heavy", type=int, default=500, help="вызовов тяжёлого пользователя разом")
+    parser.add_argument("--light-users", type=int, default=8)
+    parser.add_argument("--light-calls", type=int, default=20)
+    parser.add_argument("--light-interval-ms", type=float, default=100.0)
+    parser.add_argument("--service-ms", type=float, default=50.0, help="среднее время ответа панели")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    report("fifo", asyncio.run(simulate(FifoLimiter(args.capacity), args)))
+    fair = FairScheduler(args.capacity, queue_limit=args.heavy)
+    report("fair", asyncio.run(simulate(fair, args)))
+
+
+if __name__ == "__main__":
+    main()
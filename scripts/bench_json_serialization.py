@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Процессорное время сериализации списка доменов (GET /domains).
+
+Сравниваются пути от результата выборки до байтов ответа, без БД:
+
+- response_model: ORM-объекты Domain -> serialize_response FastAPI
+  (валидация from_attributes и jsonable_encoder) -> JSONResponse;
+- то же, но с ORJSONResponse вместо JSONResponse;
+- rows_response: строки выборки (mappings) -> одна валидация TypeAdapter
+  -> JSON из pydantic-core, как сейчас в маршруте.
+
+Запуск из корня репозитория:
+    python scripts/bench_json_serialization.py [--domains 1000] [--repeat 200]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+import app.main  # noqa: E402,F401  регистрирует все модели для связей Domain
+from app.core.responses import rows_response  # noqa: E402
+from app.modules.domains.models import Domain  # noqa: E402
+from app.modules.domains.schemas import DomainResponse  # noqa: E402
+
+
+def build_rows(count: int) -> List[dict]:
+    registered_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": index,
+            "name": f"site-{index}.example.com",
+            "status": "active",
+            "registered_at": registered_at + timedelta(minutes=index),
+            "expires_at": date(2027, 1, 1) + timedelta(days=index % 365),
+            "auto_renew": index % 3 != 0,
+            "nameservers": ["ns1.example.net", "ns2.example.net"],
+            "isp_domain_id": str(100_000 + index),
+        }
+        for index in range(1, count + 1)
+    ]
+
+
+def measure(render, repeat: int) -> tuple:
+    render()
+    samples = []
+    size = 0
+    for _ in range(repeat):
+        started = time.process_time()
+        size = len(render())
+        samples.append(time.process_time() - started)
+    return statistics.median(samples) * 1000, size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--domains", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = build_rows(args.domains)
+    entities = [Domain(user_id=1, **row) for row in rows]
+    field = create_response_field(name="Response_get_user_domains", type_=List[DomainResponse], mode="serialization")
+    loop = asyncio.new_event_loop()
+
+    def response_model(response_class):
+        def render() -> bytes:
+            content = loop.run_until_complete(serialize_response(field=field, response_content=entities))
+            return response_class(content=content).body
+
+        return render
+
+    cases = [
+        ("response_model + JSONResponse", response_model(JSONResponse)),
+        ("response_model + ORJSONResponse", response_model(ORJSONResponse)),
+        ("rows_response", lambda: rows_response(DomainResponse, rows).body),
+    ]
+    print(f"{args.domains} domains, median of {args.repeat} runs, CPU time")
+    baseline = None
+    for name, render in cases:
+        elapsed, size = measure(render, args.repeat)
+        baseline = baseline or elapsed
+        print(f"{name:<32} {elapsed:8.2f} ms  x{baseline / elapsed:5.2f}  {size} bytes")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Пропускная способность публикации событий outbox с подтверждениями брокера.
+
+RabbitMQ заменён обменником в процессе: publish ждёт подтверждения
+--confirm-ms, а брокер обрабатывает сообщения по одному с затратой
+--broker-us на сообщение, как канал с publisher confirms. Сравниваются
+пачки разного размера в RabbitMQPublisher.publish_batch (конвейер
+публикаций, подтверждения собираются разом) и публикация по одному
+сообщению с ожиданием подтверждения. Сборка сообщений (_to_message,
+aio_pika.Message, JSON) — настоящая; БД не используется.
+
+Запуск из корня репозитория:
+    python scripts/bench_outbox_publish.py [--events 20000] [--confirm-ms 1.0]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.integrations.rabbitmq import RabbitMQPublisher  # noqa: E402
+from app.modules.outbox.models import OutboxEvent  # noqa: E402
+from app.modules.outbox.publisher import _to_message  # noqa: E402
+
+
+class FakeExchange:
+    """Обменник с подтверждениями: брокер принимает сообщения последовательно."""
+
+    def __init__(self, confirm_ms: float, broker_us: float):
+        self.confirm = confirm_ms / 1000
+        self.broker = broker_us / 1_000_000
+        self.published = 0
+        self._broker_free_at = 0.0
+
+    async def publish(self, message, routing_key: str) -> None:
+        loop = asyncio.get_running_loop()
+        # Брокер пишет сообщения по очереди; подтверждение приходит через RTT после записи
+        self._broker_free_at = max(self._broker_free_at, loop.time()) + self.broker
+        await asyncio.sleep(self._broker_free_at - loop.time() + self.confirm)
+        self.published += 1
+
+
+def build_events(count: int):
+    created_at = datetime.now(timezone.utc)
+    return [
+        OutboxEvent(
+            id=index,
+            event_type="domain.created",
+            aggregate_type="domain",
+            aggregate_id=str(index),
+            payload={"user_id": index % 500, "name": f"site-{index}.example.com", "node": "isp1"},
+            created_at=created_at,
+            attempts=0,
+        )
+        for index in range(1, count + 1)
+    ]
+
+
+def make_publisher(args) -> RabbitMQPublisher:
+    publisher = RabbitMQPublisher(host="bench")
+    # connect() видит готовый обменник и не обращается к сети
+    publisher._exchange = FakeExchange(args.confirm_ms, args.broker_us)
+    return publisher
+
+
+async def run_batches(events, batch_size: int, args) -> float:
+    publisher = make_publisher(args)
+    started = time.perf_counter()
+    for index in range(0, len(events), batch_size):
+        batch = events[index:index + batch_size]
+        await publisher.publish_batch([_to_message(event) for event in batch])
+    elapsed = time.perf_counter() - started
+    assert publisher._exchange.published == len(events)
+    return elapsed
+
+
+def report(label: str, count: int, elapsed: float) -> None:
+    print(f"{label:<24} {elapsed:7.2f}s  {count / elapsed:9.0f} events/s")
+
+
+async def main_async(args) -> None:
+    events = build_events(args.events)
+    print(f"{args.events} events, confirm {args.confirm_ms} ms, broker {args.broker_us} us/message")
+    # По одному сообщению: каждое ждёт своего подтверждения
+    sequential = events[: max(1, args.events // 20)]
+    report("one by one", len(sequential), await run_batches(sequential, 1, args))
+    for batch_size in args.batch_sizes:
+        report(f"batch {batch_size}", len(events), await run_batches(events, batch_size, args))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--confirm-ms", type=float, default=1.0, help="задержка подтверждения брокера, мс")
+    parser.add_argument("--broker-us", type=float, default=20.0, help="обработка сообщения брокером, мкс")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[50, 200, 1000])
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
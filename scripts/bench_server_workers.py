@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Пропускная способность мастера app.server с разным числом воркеров.
+
+Вместо приложения запускается минимальное ASGI-приложение этого файла:
+обработчик тратит --work-ms процессорного времени (как сериализация ответа и
+логика маршрута), поэтому результат показывает масштабирование pre-fork
+воркеров на ядрах, а не задержки БД. Нагрузку дают --clients процессов,
+каждый держит --connections keep-alive соединений.
+
+Запуск из корня репозитория:
+    python scripts/bench_server_workers.py [--workers 1 2 4] [--seconds 5]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+APP = "bench_server_workers:app"
+REQUEST = b"GET /work HTTP/1.1\r\nHost: bench\r\n\r\n"
+
+
+def _burn(milliseconds: float) -> None:
+    stop = time.process_time() + milliseconds / 1000
+    while time.process_time() < stop:
+        pass
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            else:
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    _burn(float(os.environ.get("BENCH_WORK_MS", "1")))
+    body = b'{"ok":true}'
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+def run_master(workers: int, port: int) -> None:
+    from app import server
+    from app.core.config import settings
+
+    settings.server_host = "127.0.0.1"
+    settings.server_port = port
+    # Каталог метрик не нужен: бенчмарк не читает /metrics
+    server._mark_process_dead = lambda pid: None
+    server.Master(APP, workers).run()
+
+
+async def _connection(port: int, stop_at: float) -> int:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    done = 0
+    try:
+        while time.monotonic() < stop_at:
+            writer.write(REQUEST)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+            await reader.readexactly(length)
+            done += 1
+    finally:
+        writer.close()
+    return done
+
+
+def run_client(port: int, connections: int, seconds: float, results) -> None:
+    async def main():
+        stop_at = time.monotonic() + seconds
+        counts = await asyncio.gather(*(_connection(port, stop_at) for _ in range(connections)))
+        results.put(sum(counts))
+
+    asyncio.run(main())
+
+
+def wait_port(port: int, timeout: float = 30.0) -> None:
+    import socket
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def measure(workers: int, args) -> float:
+    context = multiprocessing.get_context("spawn")
+    master = context.Process(target=run_master, args=(workers, args.port))
+    master.start()
+    try:
+        wait_port(args.port)
+        # Все воркеры должны пройти startup до начала замера
+        time.sleep(1.0 + 0.3 * workers)
+        results = context.Queue()
+        clients = [
+            context.Process(target=run_client, args=(args.port, args.connections, args.seconds, results))
+            for _ in range(args.clients)
+        ]
+        for client in clients:
+            client.start()
+        total = sum(results.get() for _ in clients)
+        for client in clients:
+            client.join()
+        return total / args.seconds
+    finally:
+        os.kill(master.pid, signal.SIGTERM)
+        master.join(30)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--clients", type=int, default=2, help="процессов нагрузки")
+    parser.add_argument("--connections", type=int, default=32, help="соединений на процесс нагрузки")
+    parser.add_argument("--work-ms", type=float, default=1.0, help="процессорное время обработчика, мс")
+    parser.add_argument("--port", type=int, default=18009)
+    args = parser.parse_args()
+
+    # Воркеры читают настройки из окружения при импорте
+    os.environ["BENCH_WORK_MS"] = str(args.work_ms)
+    os.environ["SERVER_DRAIN_DELAY"] = "0"
+    os.environ["SERVER_GRACEFUL_TIMEOUT"] = "2"
+    print(f"{os.cpu_count()} CPUs, handler {args.work_ms} ms CPU, {args.clients}x{args.connections} connections")
+    baseline = None
+    for workers in args.workers:
+        rate = measure(workers, args)
+        baseline = baseline or rate
+        print(f"workers={workers:<3} {rate:9.0f} req/s  x{rate / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    main()